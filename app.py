@@ -1,7 +1,6 @@
 import os
 import streamlit as st
 from pathlib import Path
-import glob
 
 # Import components
 from components.document_qa import document_qa
@@ -11,8 +10,11 @@ from components.document_creator import document_creator
 from components.case_analyzer import case_analyzer
 
 # Import utilities
-from utils.document_processor import process_pdfs, get_available_laws
+from utils.document_processor import discover_pdf_files, iter_processed_pdfs, sync_corpus
 from utils.vector_store import VectorStore
+from utils.dense_index import create_encoder
+from utils.reranker import Reranker, create_cross_scorer
+from utils.law_catalog import LawCatalog
 
 # Set page config
 st.set_page_config(
@@ -54,14 +56,18 @@ if st.session_state.language == "English":
     process_btn_text = "Process Legal Documents"
     processing_text = "Processing documents... This may take a few minutes."
     no_docs_text = "No PDF documents found in the current directory. Please add PDF files to continue."
+    sync_btn_text = "Refresh Legal Documents"
+    syncing_text = "Updating changed documents..."
 else:  # Arabic
     st.write("مساعدك الشامل للمسائل القانونية العمانية.")
     process_btn_text = "معالجة الوثائق القانونية"
     processing_text = "جاري معالجة المستندات... قد يستغرق ذلك بضع دقائق."
     no_docs_text = "لم يتم العثور على مستندات PDF في الدليل الحالي. يرجى إضافة ملفات PDF للمتابعة."
+    sync_btn_text = "تحديث الوثائق القانونية"
+    syncing_text = "جاري تحديث المستندات المعدلة..."
 
 # Find PDF files in the current directory
-pdf_files = glob.glob("*.pdf") + glob.glob("**/*.pdf", recursive=True)
+pdf_files = discover_pdf_files(".")
 
 # Create a sample PDF file if none are found
 if not pdf_files:
@@ -153,23 +159,100 @@ if not pdf_files:
         pdf_files = ["oman_labor_law_sample.pdf"]
         st.info("Created a sample PDF file for demonstration purposes.")
 
+# List the available laws from the catalog so they can be selected before
+# the documents are processed
+if "law_catalog" not in st.session_state:
+    st.session_state.law_catalog = LawCatalog()
+    st.session_state.law_catalog.refresh(pdf_files)
+if not st.session_state.processed_docs:
+    st.session_state.available_laws = st.session_state.law_catalog.law_names()
+
+def create_reranker():
+    """
+    Build the reranker of question answering and case analysis.
+    
+    RERANK_MODEL names a local cross-encoder model ("default" for the
+    built-in choice, "none" to rerank with the cheap features only) and
+    RERANK_BUDGET_MS the milliseconds it may spend per query.
+    """
+    try:
+        cross_scorer = create_cross_scorer(os.getenv("RERANK_MODEL", "none"))
+    except Exception as e:
+        print(f"Error loading the reranking model: {str(e)}")
+        cross_scorer = None
+    return Reranker(
+        cross_scorer=cross_scorer,
+        latency_budget=float(os.getenv("RERANK_BUDGET_MS", "50")) / 1000
+    )
+
+# INDEX_SNAPSHOT is the directory of the saved search index; a restart loads
+# it instead of processing the documents again
+index_snapshot = os.getenv("INDEX_SNAPSHOT", os.path.join(".cache", "index"))
+if st.session_state.vector_store is None and os.path.isdir(index_snapshot):
+    try:
+        st.session_state.vector_store = VectorStore.load(
+            index_snapshot,
+            engine=os.getenv("SEARCH_ENGINE", "inverted"),
+            encoder=create_encoder(os.getenv("SEMANTIC_ENCODER", "hashing")),
+            reranker=create_reranker()
+        )
+        st.session_state.law_catalog.update_from_store(st.session_state.vector_store)
+        st.session_state.available_laws = st.session_state.vector_store.law_names()
+        st.session_state.processed_docs = True
+    except (OSError, ValueError) as e:
+        print(f"Error loading index snapshot: {e}")
+
+def save_index(vector_store):
+    """Save the search index so the next start can load it"""
+    try:
+        vector_store.save(index_snapshot)
+    except OSError as e:
+        print(f"Error saving index snapshot: {e}")
+
 # Process PDF files if available
 if pdf_files:
     if not st.session_state.processed_docs:
         if st.button(process_btn_text):
             with st.spinner(processing_text):
-                # Process PDFs and create vector store
-                documents = process_pdfs(pdf_files)
-                st.session_state.vector_store = VectorStore(documents)
-                st.session_state.available_laws = get_available_laws(documents)
+                # SEARCH_ENGINE selects the scoring engine ("inverted" or "sparse") and
+                # SEMANTIC_ENCODER the embeddings of semantic search ("hashing",
+                # "sentence-transformers" or "none")
+                vector_store = VectorStore(
+                    [],
+                    engine=os.getenv("SEARCH_ENGINE", "inverted"),
+                    encoder=create_encoder(os.getenv("SEMANTIC_ENCODER", "hashing")),
+                    reranker=create_reranker()
+                )
+                # Process PDFs and index every file as soon as it is done, so only
+                # a few files' chunks are held besides the index
+                # INGEST_WORKERS sets the number of ingestion processes (default: one per core)
+                ingest_workers = int(os.getenv("INGEST_WORKERS", "0")) or None
+                for _, file_documents in iter_processed_pdfs(pdf_files, max_workers=ingest_workers):
+                    if file_documents:
+                        vector_store.add_documents(file_documents)
+                st.session_state.vector_store = vector_store
+                st.session_state.law_catalog.update_from_store(vector_store)
+                st.session_state.available_laws = vector_store.law_names()
                 st.session_state.processed_docs = True
+                save_index(st.session_state.vector_store)
                 st.rerun()
+    elif st.button(sync_btn_text):
+        with st.spinner(syncing_text):
+            # Only process new or changed files and drop deleted ones
+            ingest_workers = int(os.getenv("INGEST_WORKERS", "0")) or None
+            sync_corpus(st.session_state.vector_store, pdf_files, max_workers=ingest_workers)
+            st.session_state.law_catalog.refresh(pdf_files)
+            st.session_state.law_catalog.update_from_store(st.session_state.vector_store)
+            st.session_state.available_laws = st.session_state.vector_store.law_names()
+            save_index(st.session_state.vector_store)
+            st.rerun()
 else:
     st.warning(no_docs_text)
     st.stop()
 
-# Only show features if documents are processed
-if st.session_state.processed_docs:
+# Show features once documents are processed; the law selectors are
+# available from the catalog before that
+if st.session_state.processed_docs or st.session_state.available_laws:
     # Main navigation tabs
     if st.session_state.language == "English":
         tabs = st.tabs(["Document Q&A", "Article Summarizer", "Law Comparison", "Document Creator", "Case Analyzer"])
@@ -18,6 +18,7 @@ def article_summarizer(vector_store, available_laws, language):
     # Set up the UI based on language
     if language == "English":
         st.header("Article Summarizer")
+        not_processed_text = "Please process the legal documents first."
         law_select_label = "Select a Law"
         article_input_label = "Article Number"
         button_text = "Summarize Article"
@@ -26,6 +27,7 @@ def article_summarizer(vector_store, available_laws, language):
         example_placeholder = "Example: 5"
     else:  # Arabic
         st.header("ملخص المادة")
+        not_processed_text = "يرجى معالجة الوثائق القانونية أولاً."
         law_select_label = "اختر القانون"
         article_input_label = "رقم المادة"
         button_text = "تلخيص المادة"
@@ -58,9 +60,16 @@ def article_summarizer(vector_store, available_laws, language):
         if not article_number or not selected_law:
             return
         
+        if vector_store is None:
+            st.info(not_processed_text)
+            return
+        
         with st.spinner(loading_text):
             # Get the article text
-            article_text = extract_article_by_number(vector_store.documents, selected_law, article_number)
+            article_text = extract_article_by_number(
+                vector_store.documents, selected_law, article_number,
+                article_index=vector_store.article_index
+            )
             
             if not article_text:
                 st.warning(not_found_text)
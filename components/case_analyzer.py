@@ -20,6 +20,7 @@ def case_analyzer(vector_store, language):
     # Set up the UI based on language
     if language == "English":
         st.header("Legal Case Analysis")
+        not_processed_text = "Please process the legal documents first."
         case_input_label = "Describe the Legal Situation or Case"
         analyze_button_text = "Analyze Case"
         loading_text = "Analyzing the legal case..."
@@ -33,6 +34,7 @@ def case_analyzer(vector_store, language):
         """
     else:  # Arabic
         st.header("تحليل الحالة القانونية")
+        not_processed_text = "يرجى معالجة الوثائق القانونية أولاً."
         case_input_label = "وصف الحالة أو القضية القانونية"
         analyze_button_text = "تحليل القضية"
         loading_text = "جاري تحليل القضية القانونية..."
@@ -101,20 +103,25 @@ def case_analyzer(vector_store, language):
         if not case_description:
             return
         
+        if vector_store is None:
+            st.info(not_processed_text)
+            return
+        
         with st.spinner(loading_text):
-            # Search for relevant legal context
-            search_results = vector_store.search(case_description, k=7)
+            # Search for relevant legal context with keyword and semantic
+            # retrieval, then rerank the candidates so only the best chunks
+            # reach the LLM
+            search_results = vector_store.reranked_search(case_description, k=5)
             
             # Gather context from search results
             legal_context = ""
+            # The reranker already dropped the weak matches
             for doc, score in search_results:
-                # Only include relevant results
-                if score > 0.2:
-                    # Add metadata about the source
-                    law_name = doc.metadata.get("law_name", "Unknown Law")
-                    
-                    # Add to context
-                    legal_context += f"\nFrom {law_name}:\n{doc.page_content}\n"
+                # Add metadata about the source
+                law_name = doc.metadata.get("law_name", "Unknown Law")
+                
+                # Add to context
+                legal_context += f"\nFrom {law_name}:\n{doc.page_content}\n"
             
             # Generate analysis
             analysis = llm_manager.analyze_legal_case(case_description, legal_context, language)
@@ -19,6 +19,7 @@ def document_qa(vector_store, language):
     # Set up the UI based on language
     if language == "English":
         st.header("Ask Questions about Omani Laws")
+        not_processed_text = "Please process the legal documents first."
         query_placeholder = "What is the penalty for theft under Omani law?"
         button_text = "Ask Question"
         loading_text = "Searching legal documents..."
@@ -27,6 +28,7 @@ def document_qa(vector_store, language):
         transcribing_text = "Transcribing audio..."
     else:  # Arabic
         st.header("اسأل عن القوانين العمانية")
+        not_processed_text = "يرجى معالجة الوثائق القانونية أولاً."
         query_placeholder = "ما هي عقوبة السرقة بموجب القانون العماني؟"
         button_text = "اسأل السؤال"
         loading_text = "جاري البحث في الوثائق القانونية..."
@@ -89,9 +91,14 @@ def document_qa(vector_store, language):
         if not query:
             return
         
+        if vector_store is None:
+            st.info(not_processed_text)
+            return
+        
         with st.spinner(loading_text):
-            # Search for relevant documents
-            search_results = vector_store.search(query, k=5)
+            # Search for relevant documents with keyword and semantic retrieval,
+            # then rerank the candidates so only the best chunks reach the LLM
+            search_results = vector_store.reranked_search(query, k=4)
             
             if not search_results:
                 st.warning(no_results_text)
@@ -99,15 +106,14 @@ def document_qa(vector_store, language):
             
             # Gather context from search results
             context = ""
+            # The reranker already dropped the weak matches
             for doc, score in search_results:
-                # Only include relevant results (adjust threshold if needed)
-                if score > 0.2:
-                    # Add metadata about the source
-                    law_name = doc.metadata.get("law_name", "Unknown Law")
-                    source = doc.metadata.get("source", "Unknown Source")
-                    
-                    # Add to context
-                    context += f"\nFrom {law_name} ({source}):\n{doc.page_content}\n"
+                # Add metadata about the source
+                law_name = doc.metadata.get("law_name", "Unknown Law")
+                source = doc.metadata.get("source", "Unknown Source")
+                
+                # Add to context
+                context += f"\nFrom {law_name} ({source}):\n{doc.page_content}\n"
             
             # Use the LLM to answer based on context
             answer = llm_manager.answer_legal_question(query, context, language)
@@ -16,6 +16,7 @@ def law_comparison(vector_store, available_laws, language):
     # Set up the UI based on language
     if language == "English":
         st.header("Law Comparison")
+        not_processed_text = "Please process the legal documents first."
         first_law_label = "First Law"
         second_law_label = "Second Law"
         text_input_label = "Comparison Query"
@@ -25,6 +26,7 @@ def law_comparison(vector_store, available_laws, language):
         query_placeholder = "How do these laws differ in their approach to penalties?"
     else:  # Arabic
         st.header("مقارنة القوانين")
+        not_processed_text = "يرجى معالجة الوثائق القانونية أولاً."
         first_law_label = "القانون الأول"
         second_law_label = "القانون الثاني"
         text_input_label = "استعلام المقارنة"
@@ -51,23 +53,19 @@ def law_comparison(vector_store, available_laws, language):
             st.warning(no_laws_text)
             return
         
+        if vector_store is None:
+            st.info(not_processed_text)
+            return
+        
         with st.spinner(loading_text):
-            # Extract content for the first law
-            first_law_docs = [doc for doc in vector_store.documents 
-                             if doc.metadata.get("law_name") == first_law]
-            first_law_content = "\n".join([doc.page_content for doc in first_law_docs])
-            
-            # Extract content for the second law
-            second_law_docs = [doc for doc in vector_store.documents 
-                              if doc.metadata.get("law_name") == second_law]
-            second_law_content = "\n".join([doc.page_content for doc in second_law_docs])
-            
-            # If the content is too long, use a summarized version
+            # Read only the chunks of the two laws, up to the context limit
             max_content_length = 8000  # Adjust based on LLM context limits
             
+            first_law_content = vector_store.law_text(first_law, max_content_length + 1)
             if len(first_law_content) > max_content_length:
                 first_law_content = first_law_content[:max_content_length] + "..."
             
+            second_law_content = vector_store.law_text(second_law, max_content_length + 1)
             if len(second_law_content) > max_content_length:
                 second_law_content = second_law_content[:max_content_length] + "..."
             
@@ -0,0 +1,16 @@
+import fitz  # PyMuPDF
+import pytest
+
+@pytest.fixture
+def write_pdf(tmp_path):
+    """Return a function that writes a PDF with one page per text and returns its path"""
+    def write(name, pages):
+        path = str(tmp_path / name)
+        pdf = fitz.open()
+        for text in pages:
+            page = pdf.new_page()
+            page.insert_textbox(fitz.Rect(50, 50, page.rect.width - 50, page.rect.height - 50), text, fontsize=9)
+        pdf.save(path)
+        pdf.close()
+        return path
+    return write
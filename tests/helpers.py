@@ -0,0 +1,59 @@
+import random
+
+from langchain.schema import Document
+from utils.segmented_index import SegmentedIndex
+
+def article_pages(law_name, articles):
+    """
+    Build the pages of a law with one article per page, each long enough
+    to be chunked on its own.
+    
+    Args:
+        law_name: Title written on the first page
+        articles: List of (article number, text) tuples
+    
+    Returns:
+        List of page texts
+    """
+    pages = []
+    for position, (number, text) in enumerate(articles):
+        title = f"{law_name}\n" if position == 0 else ""
+        pages.append(f"{title}Article {number}\n" + " ".join([text] * 12))
+    return pages
+
+def make_document(source, law_name, text, chunk=0):
+    """Build a chunk Document the way process_pdfs does, without a PDF"""
+    return Document(page_content=text, metadata={
+        "source": source,
+        "law_name": law_name,
+        "has_arabic": False,
+        "chunk": chunk,
+        "article_spans": [],
+        "file_hash": source
+    })
+
+def random_index(index, deleted=0):
+    """
+    Fill an index with random documents over a skewed vocabulary. A
+    SegmentedIndex ends up with sealed segments and a partly filled
+    write buffer.
+    
+    Args:
+        index: Empty InvertedIndex or SegmentedIndex
+        deleted: Number of random documents removed afterwards
+    
+    Returns:
+        The index and a list of random queries
+    """
+    generator = random.Random(7)
+    vocabulary = [f"term{number}" for number in range(300)]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    documents = {}
+    for doc_id in range(1500):
+        documents[doc_id] = generator.choices(vocabulary, weights, k=generator.randint(5, 60))
+        index.add(doc_id, documents[doc_id])
+    for doc_id in generator.sample(sorted(documents), deleted):
+        index.remove(doc_id, documents[doc_id])
+    if isinstance(index, SegmentedIndex):
+        index.wait_for_merges()
+    return index, [generator.choices(vocabulary[:100], k=generator.randint(2, 4)) for _ in range(40)]
@@ -0,0 +1,78 @@
+import pytest
+
+from helpers import article_pages
+from utils import document_processor
+from utils.document_processor import (
+    process_pdf, process_pdfs, iter_processed_pdfs, sync_corpus, extract_article_by_number
+)
+from utils.vector_store import VectorStore
+
+def test_sync_keeps_the_indexed_version_of_a_failing_file(write_pdf, tmp_path):
+    labor = write_pdf("labor.pdf", article_pages("Labor Law", [(1, "Workers are entitled to annual leave.")]))
+    banking = write_pdf("banking.pdf", article_pages("Banking Law", [(1, "Banks must hold reserves.")]))
+    store = VectorStore(process_pdfs([labor, banking], max_workers=1, cache_dir=None))
+    
+    # The labor law is overwritten with a corrupt file and a corrupt new file appears
+    with open(labor, "wb") as f:
+        f.write(b"%PDF-1.7 truncated")
+    broken = str(tmp_path / "broken.pdf")
+    with open(broken, "wb") as f:
+        f.write(b"not a pdf")
+    
+    changes = sync_corpus(store, [labor, banking, broken], max_workers=1, cache_dir=None)
+    assert changes == {"added": [], "updated": [], "removed": [], "failed": [labor, broken]}
+    assert store.search_by_law("annual leave", "Labor Law")
+    
+    # Failed files are not processed again until they change
+    changes = sync_corpus(store, [labor, banking, broken], max_workers=1, cache_dir=None)
+    assert changes == {"added": [], "updated": [], "removed": [], "failed": []}
+    
+    write_pdf("labor.pdf", article_pages("Labor Law", [(1, "Workers are entitled to sick leave.")]))
+    changes = sync_corpus(store, [labor, banking], max_workers=1, cache_dir=None)
+    assert changes == {"added": [], "updated": [labor], "removed": [], "failed": []}
+    assert store.search_by_law("sick leave", "Labor Law")
+    assert store.failed_files == {}
+
+def test_arabic_indic_article_numbers_are_found_before_and_after_loading(monkeypatch, tmp_path):
+    # The base PDF fonts have no Arabic glyphs, so the extracted pages are given directly
+    pages = [
+        f"المادة {number}\n" + " ".join([f"يستحق العامل اجازة سنوية مدفوعة الاجر رقم {number}."] * 12)
+        for number in ("٤", "٥", "٠٦")
+    ]
+    monkeypatch.setattr(document_processor, "iter_pdf_pages", lambda pdf_path: enumerate(pages, 1))
+    documents = process_pdf("labor.pdf")
+    for doc in documents:
+        doc.metadata["file_hash"] = "labor.pdf"
+    law_name = documents[0].metadata["law_name"]
+    
+    store = VectorStore(documents)
+    path = str(tmp_path / "index")
+    store.save(path)
+    for current in (store, VectorStore.load(path)):
+        for number in ("5", "6"):
+            article = extract_article_by_number(
+                current.documents, law_name, number, article_index=current.article_index
+            )
+            assert article is not None, number
+            assert article.startswith(f"المادة {number}")
+            assert "[ARTICLE_" not in article
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_processed_files_are_yielded_one_by_one_in_order(write_pdf, tmp_path, max_workers):
+    paths = [
+        write_pdf(f"law{number}.pdf", article_pages(f"Law {number}", [(1, f"Rule number {number} of this law.")]))
+        for number in range(5)
+    ]
+    broken = str(tmp_path / "broken.pdf")
+    with open(broken, "wb") as f:
+        f.write(b"not a pdf")
+    paths.insert(2, broken)
+    cache_dir = str(tmp_path / "cache")
+    
+    # The second run reads every file from the cache
+    for _ in range(2):
+        processed = list(iter_processed_pdfs(paths, max_workers=max_workers, cache_dir=cache_dir))
+        assert [path for path, _ in processed] == paths
+        for path, documents in processed:
+            assert bool(documents) == (path != broken)
+            assert all(doc.metadata["source"] == path and doc.metadata["file_hash"] for doc in documents)
@@ -0,0 +1,21 @@
+import pytest
+from utils.fuzzy_index import TrigramIndex, bounded_edit_distance
+
+@pytest.mark.parametrize("term, variant", [
+    ("abcdef", "abdcef"),  # swap inside the word
+    ("abcdef", "bacdef"),  # swap at the start
+    ("abcdef", "abcdfe"),  # swap at the end
+    ("عمال", "عامل"),
+    ("عقبوه", "عقوبه")
+])
+def test_expand_finds_swapped_letters(term, variant):
+    index = TrigramIndex([variant, "unrelated", "قانون"])
+    assert index.expand(term, max_edits=1) == [(variant, 1)]
+
+def test_expand_orders_variants_by_distance():
+    index = TrigramIndex(["permit", "permits", "permut", "hermits"])
+    assert index.expand("permit", max_edits=2) == [("permit", 0), ("permits", 1), ("permut", 1), ("hermits", 2)]
+
+def test_bounded_edit_distance_stops_beyond_the_limit():
+    assert bounded_edit_distance("abcdef", "abdcef", 1) == 1
+    assert bounded_edit_distance("abcdef", "badcfe", 2) == 3
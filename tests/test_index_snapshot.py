@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+from helpers import make_document
+from utils import index_snapshot
+from utils.vector_store import VectorStore
+
+def build_store():
+    """Index a few chunks of two laws"""
+    return VectorStore([
+        make_document("a.pdf", "Law A", "Licensed banks must hold reserves with the Central Bank.", 0),
+        make_document("a.pdf", "Law A", "The Central Bank may suspend the license of a bank.", 1),
+        make_document("b.pdf", "Law B", "Fishing vessels must carry a valid permit at sea.", 0)
+    ])
+
+def snapshot_file(path):
+    """Return the path of the largest file the manifest of a snapshot lists"""
+    files = [
+        os.path.join(root, name)
+        for root, _, names in os.walk(path)
+        for name in names
+        if name != index_snapshot.MANIFEST_FILE
+    ]
+    return max(files, key=os.path.getsize)
+
+def test_saved_store_loads_with_the_same_results(tmp_path):
+    store = build_store()
+    path = str(tmp_path / "index")
+    store.save(path)
+    
+    loaded = VectorStore.load(path)
+    for query in ("Central Bank license", "fishing permit", "reserves"):
+        expected = [(doc.page_content, score) for doc, score in store.search(query, k=3)]
+        assert [(doc.page_content, score) for doc, score in loaded.search(query, k=3)] == expected
+    assert loaded.law_names() == store.law_names()
+
+def test_untouched_snapshot_loads_without_hashing_its_files(tmp_path, monkeypatch):
+    path = str(tmp_path / "index")
+    build_store().save(path)
+    
+    hashed = []
+    checksum = index_snapshot.file_checksum
+    monkeypatch.setattr(index_snapshot, "file_checksum", lambda path: hashed.append(path) or checksum(path))
+    index_snapshot.read_manifest(path)
+    assert hashed == []
+    
+    index_snapshot.read_manifest(path, verify="full")
+    assert hashed
+
+def test_modified_snapshot_file_is_rejected(tmp_path):
+    path = str(tmp_path / "index")
+    build_store().save(path)
+    
+    target = snapshot_file(path)
+    with open(target, "r+b") as f:
+        first = f.read(1)
+        f.seek(0)
+        f.write(bytes([first[0] ^ 0xFF]))
+    stat = os.stat(target)
+    os.utime(target, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    
+    with pytest.raises(ValueError, match="corrupt"):
+        VectorStore.load(path)
@@ -0,0 +1,38 @@
+import heapq
+
+import pytest
+
+from helpers import random_index
+from utils.inverted_index import InvertedIndex
+from utils.segmented_index import SegmentedIndex
+
+INDEX_TYPES = [InvertedIndex, lambda: SegmentedIndex(buffer_docs=200)]
+
+def exhaustive_search(index, query, k, doc_ranges=None):
+    """Select the k best documents from the unpruned scores, as search normalizes them"""
+    scores = index.score(query, doc_ranges)
+    max_score = index.max_score(query) or 1.0
+    top = heapq.nlargest(k, scores.items(), key=lambda item: (item[1], -item[0]))
+    return [(doc_id, score / max_score) for doc_id, score in top]
+
+@pytest.mark.parametrize("make_index", INDEX_TYPES)
+@pytest.mark.parametrize("deleted", [0, 200])
+@pytest.mark.parametrize("doc_ranges", [None, [(100, 400), (700, 720), (1300, 1500)]])
+def test_search_matches_exhaustive_scoring(make_index, deleted, doc_ranges):
+    index, queries = random_index(make_index(), deleted)
+    for query in queries:
+        for k in (1, 5, 20):
+            assert index.search(query, k=k, doc_ranges=doc_ranges) == exhaustive_search(index, query, k, doc_ranges)
+
+@pytest.mark.parametrize("make_index", INDEX_TYPES)
+def test_pool_keeps_every_result_rescoring_could_lift_into_the_top_k(make_index):
+    index, queries = random_index(make_index(), deleted=100)
+    
+    headroom = 0.3
+    for query in queries:
+        exhaustive = exhaustive_search(index, query, 50)
+        pooled = dict(index.search(query, k=5, pool=50, headroom=headroom))
+        kth_score = exhaustive[4][1]
+        for doc_id, score in exhaustive:
+            if score + headroom * (1.0 - score) >= kth_score:
+                assert pooled.get(doc_id) == pytest.approx(score), query
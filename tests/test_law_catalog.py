@@ -0,0 +1,23 @@
+from helpers import article_pages
+from utils.document_processor import process_pdfs
+from utils.law_catalog import LawCatalog
+from utils.vector_store import VectorStore
+
+def test_update_from_store_fills_in_processed_files(write_pdf, tmp_path):
+    labor = write_pdf("labor.pdf", article_pages("Labor Law", [(1, "Workers are entitled to leave."), (2, "Wages are paid monthly.")]))
+    banking = write_pdf("banking.pdf", article_pages("Banking Law", [(7, "Banks must hold reserves.")]))
+    catalog = LawCatalog(str(tmp_path / "catalog.json"))
+    catalog.refresh([labor, banking])
+    assert catalog.entries[labor]["article_count"] is None
+    
+    store = VectorStore(process_pdfs([labor], max_workers=1, cache_dir=None))
+    catalog.update_from_store(store)
+    assert catalog.entries[labor]["article_count"] == 2
+    assert catalog.entries[banking]["article_count"] is None
+    
+    # Reloaded from disk, only files not filled in yet are looked up
+    catalog = LawCatalog(str(tmp_path / "catalog.json"))
+    store.add_documents(process_pdfs([banking], max_workers=1, cache_dir=None))
+    catalog.update_from_store(store)
+    assert catalog.entries[labor]["article_count"] == 2
+    assert catalog.entries[banking]["article_count"] == 1
@@ -0,0 +1,57 @@
+import time
+
+from helpers import make_document
+from utils.reranker import Reranker
+from utils.vector_store import VectorStore
+
+class SlowScorer:
+    """Cross-scorer that takes longer than the reranker's whole budget"""
+    
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.scored = 0
+    
+    def score(self, query, texts):
+        time.sleep(self.seconds)
+        self.scored += len(texts)
+        return [1.0] * len(texts)
+
+def test_slow_cross_scorer_falls_back_to_the_first_stage_order():
+    store = VectorStore([
+        make_document("a.pdf", "Law A", f"The worker is entitled to {days} days of paid annual leave.", chunk)
+        for chunk, days in enumerate(range(20, 60))
+    ])
+    candidates = [(chunk_id, 1.0 - chunk_id / 100) for chunk_id in range(40)]
+    query = "paid annual leave"
+    expected = Reranker(min_relative_score=0.0).rerank(store, query, candidates, k=10)
+    
+    scorer = SlowScorer(0.05)
+    reranker = Reranker(cross_scorer=scorer, latency_budget=0.01, min_relative_score=0.0)
+    reranker.rerank(store, query, candidates, k=10)
+    # The first query at most measures the scorer on a single candidate
+    assert scorer.scored <= 1
+    scored = scorer.scored
+    
+    timings = {}
+    assert reranker.rerank(store, query, candidates, k=10, timings=timings) == expected
+    assert timings["cross_scored"] == 0
+    assert scorer.scored == scored
+
+def test_heading_feature_matches_the_article_a_query_names():
+    texts = [
+        "[ARTICLE_5] Annual leave\nThe worker is entitled to paid leave.",
+        "[ARTICLE_6] Notice\nEither party may end the contract."
+    ]
+    documents = []
+    for chunk, text in enumerate(texts):
+        document = make_document("a.pdf", "Law A", text, chunk)
+        document.metadata["article_spans"] = [[str(chunk + 5), 0, len(text)]]
+        documents.append(document)
+    store = VectorStore(documents)
+    candidates = [(0, 1.0), (1, 1.0)]
+    
+    reranker = Reranker()
+    assert reranker.features(store, "article 05 contract", candidates)["heading"] == [1.0, 0.0]
+    assert reranker.features(store, "الماده (6)", candidates)["heading"] == [0.0, 1.0]
+    # A reference inside a longer word names no article
+    assert reranker.features(store, "subsection 5 contract", candidates)["heading"] == [0.0, 0.0]
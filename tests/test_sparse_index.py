@@ -0,0 +1,28 @@
+import pytest
+
+from helpers import random_index
+from utils.inverted_index import InvertedIndex
+from utils.segmented_index import SegmentedIndex
+from utils.sparse_index import SparseIndex
+
+# Ranges that start and end between, on and past the indexed doc ids
+DOC_RANGES = [None, [(0, 1)], [(100, 400), (700, 720), (1300, 1500)], [(-5, 3), (1499, 2000)], [(2000, 3000)]]
+
+def assert_same_results(results, expected):
+    """Check doc ids exactly and scores up to rounding"""
+    assert [doc_id for doc_id, _ in results] == [doc_id for doc_id, _ in expected]
+    assert [score for _, score in results] == pytest.approx([score for _, score in expected])
+
+@pytest.mark.parametrize("make_index", [InvertedIndex, lambda: SegmentedIndex(buffer_docs=200)])
+@pytest.mark.parametrize("deleted", [0, 200])
+@pytest.mark.parametrize("doc_ranges", DOC_RANGES)
+def test_sparse_index_matches_the_inverted_index(make_index, deleted, doc_ranges):
+    index, queries = random_index(make_index(), deleted)
+    sparse_index = SparseIndex.from_inverted_index(index)
+    
+    for k in (1, 5, 20):
+        expected = [index.search(query, k=k, doc_ranges=doc_ranges) for query in queries]
+        for query, query_expected in zip(queries, expected):
+            assert_same_results(sparse_index.search(query, k=k, doc_ranges=doc_ranges), query_expected)
+        for results, query_expected in zip(sparse_index.search_many(queries, k=k, doc_ranges=doc_ranges), expected):
+            assert_same_results(results, query_expected)
@@ -0,0 +1,103 @@
+import pytest
+
+from helpers import article_pages, make_document
+from utils.document_processor import process_pdfs
+from utils.vector_store import VectorStore, SEARCH_ENGINES
+
+LABOR_ARTICLES = [
+    (4, "The employer shall keep a record of the wages paid to every worker."),
+    (5, "The worker is entitled to paid annual leave after six months of service."),
+    (6, "Either party may end the contract after giving thirty days of notice.")
+]
+
+def build_store(write_pdf, name="labor.pdf", law_name="Labor Law", articles=LABOR_ARTICLES):
+    """Process a generated law PDF and index it"""
+    documents = process_pdfs([write_pdf(name, article_pages(law_name, articles))], max_workers=1, cache_dir=None)
+    return VectorStore(documents)
+
+def article_numbers(doc):
+    """Return the numbers of the articles that start in a chunk"""
+    return {article for article, start, _ in doc.metadata["article_spans"] if doc.page_content.startswith("[ARTICLE_", start)}
+
+def test_article_number_queries_find_the_article(write_pdf):
+    store = build_store(write_pdf)
+    for query in ("Article 5", "article 5", "Art. 5", "المادة 5", "المادة (5)", '"المادة 5"'):
+        results = store.search(query, k=1)
+        assert results, query
+        assert article_numbers(results[0][0]) == {"5"}, query
+
+BOILERPLATE = "This law shall be published in the Official Gazette and comes into force on the day after its publication."
+
+def test_law_filters_find_text_repeated_in_other_laws():
+    store = VectorStore([
+        make_document("a.pdf", "Law A", "Licensed banks must hold reserves with the Central Bank.", 0),
+        make_document("a.pdf", "Law A", BOILERPLATE, 1),
+        make_document("b.pdf", "Law B", "Fishing vessels must carry a valid permit at sea.", 0),
+        make_document("b.pdf", "Law B", BOILERPLATE, 1)
+    ])
+    
+    for results in (
+        store.search("published in the Official Gazette", filters={"law_name": "Law B"}),
+        store.search_by_law("published in the Official Gazette", "Law B")
+    ):
+        assert results
+        assert results[0][0].page_content == BOILERPLATE
+        assert results[0][0].metadata["law_name"] == "Law B"
+
+def test_near_duplicates_within_a_law_are_returned_once():
+    store = VectorStore([
+        make_document("a.pdf", "Law A", BOILERPLATE, 0),
+        make_document("a.pdf", "Law A", "Licensed banks must hold reserves with the Central Bank.", 1),
+        make_document("a.pdf", "Law A", BOILERPLATE, 2)
+    ])
+    
+    results = store.search("published in the Official Gazette", k=5)
+    assert [doc.metadata["chunk"] for doc, _ in results] == [0]
+
+def test_fuzzy_search_matches_swapped_letters():
+    store = VectorStore([
+        make_document("a.pdf", "Law A", "تفرض عقوبة السجن على كل من يخالف احكام هذا القانون", 0),
+        make_document("a.pdf", "Law A", "Licensed banks must hold reserves with the Central Bank.", 1)
+    ])
+    
+    assert store.fuzzy_search("عقبوة", k=1)[0][0].metadata["chunk"] == 0
+    assert store.fuzzy_search("licnesed", k=1)[0][0].metadata["chunk"] == 1
+
+def test_law_text_joins_the_chunks_of_one_law():
+    documents = [
+        make_document("a.pdf", "Law A", "First chunk of law A.", 0),
+        make_document("b.pdf", "Law B", "Only chunk of law B.", 0),
+        make_document("a.pdf", "Law A", "Second chunk of law A.", 1)
+    ]
+    store = VectorStore(documents)
+    
+    assert store.law_text("Law A") == "First chunk of law A.\nSecond chunk of law A."
+    assert store.law_text("Law A", max_length=5) == "First"
+    assert store.law_text("Law C") == ""
+
+@pytest.mark.parametrize("engine", SEARCH_ENGINES)
+@pytest.mark.parametrize("workers", [1, 2])
+def test_search_many_matches_search(engine, workers):
+    documents = [
+        make_document("a.pdf", "Law A", "Licensed banks must hold reserves with the Central Bank.", 0),
+        make_document("a.pdf", "Law A", "The Central Bank may suspend the license of a bank that breaks this law.", 1),
+        make_document("a.pdf", "Law A", "Banks publish their reserves every quarter.", 2),
+        make_document("b.pdf", "Law B", "Fishing vessels must carry a valid permit at sea.", 0),
+        make_document("b.pdf", "Law B", "A permit is issued by the ministry for one year and the bank fee is paid once.", 1),
+        make_document("b.pdf", "Law B", BOILERPLATE, 2)
+    ]
+    queries = [
+        "Central Bank reserves", "permit", '"valid permit"', "bank permit fee",
+        "Official Gazette publication", "Central Bank reserves", "no such words"
+    ]
+    
+    # Separate stores, so neither reads results the other cached
+    store = VectorStore(documents, engine=engine)
+    batch_store = VectorStore(documents, engine=engine)
+    for filters in (None, {"law_name": "Law B"}):
+        expected = [
+            [(doc.page_content, score) for doc, score in store.search(query, k=3, filters=filters)]
+            for query in queries
+        ]
+        batched = batch_store.search_many(queries, k=3, filters=filters, workers=workers)
+        assert [[(doc.page_content, score) for doc, score in results] for results in batched] == expected
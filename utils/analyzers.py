@@ -0,0 +1,163 @@
+import re
+from functools import lru_cache
+
+# Tokens of a normalized text: runs of letters and digits
+TOKEN_PATTERN = re.compile(r'\w+')
+
+# Article references in normalized text ("article 5", "art. 5", "section 5",
+# "الماده 5", "الماده (5)", "القسم 5"). Ingest replaces them with the
+# [ARTICLE_5] markup, which tokenizes as the single term article_5, so
+# references written in queries are rewritten the same way.
+ARTICLE_REFERENCE_PATTERN = re.compile(r'(?<!\w)(?:article|art\.|section|الماده|ماده|القسم)\s*\(?\s*(\d+)\s*\)?')
+
+# Any character of the Arabic block
+ARABIC_CHAR_PATTERN = re.compile(r'[؀-ۿ]')
+
+# Common English function words
+ENGLISH_STOPWORDS = frozenset("""
+a an and are as at be been but by for from had has have he her his if in into is it its
+of on or she such that the their then there these they this to was were which who will with
+""".split())
+
+# Common Arabic function words, in normalized form (see normalize_text)
+ARABIC_STOPWORDS = frozenset("""
+في من على الى عن ان او ثم قد كل مع بين عند حتى اذا لم لن هذا هذه ذلك تلك التي الذي الذين
+هو هي هم كان كانت وفي ومن وعلى والى او اي غير بعد قبل ما لا
+""".split())
+
+# Affixes removed by the Arabic light stemmer (Light10 style), as groups of
+# (affixes, shortest stem left after removal), longest affixes first. Forms
+# follow normalize_text, so taa marbuta is written as haa.
+ARABIC_PREFIXES = (
+    (("وال", "بال", "كال", "فال", "ولل"), 2),
+    (("ال", "لل"), 2),
+    (("و",), 4)
+)
+ARABIC_SUFFIXES = (
+    (("ها",), 4),
+    (("ان", "ات", "ون", "ين", "يه"), 4),
+    (("ه", "ي"), 3)
+)
+
+def tokenize(text):
+    """
+    Split a normalized text into tokens, turning every article reference
+    into the article_<number> token of the article markup.
+    
+    Args:
+        text: Text normalized with normalize_text
+    
+    Returns:
+        List of tokens in text order
+    """
+    # Numbers are written as in the markup, without leading zeros
+    return TOKEN_PATTERN.findall(ARTICLE_REFERENCE_PATTERN.sub(lambda match: f" article_{int(match.group(1))} ", text))
+
+@lru_cache(maxsize=100000)
+def stem_arabic(word):
+    """
+    Light-stem an Arabic word.
+    
+    The definite article and attached conjunctions or prepositions
+    (ال, وال, بال, لل, ...) are removed from the front, then the pronoun
+    ها, the sound plural and dual endings (ون/ين/ات/ان) and the feminine
+    and adjective endings (ه/يه/ي) from the back. Affixes are only
+    removed when the remaining stem is long enough, so short words are
+    left intact.
+    
+    Args:
+        word: Normalized Arabic word
+    
+    Returns:
+        The stem
+    """
+    for prefixes, min_stem in ARABIC_PREFIXES:
+        if word.startswith(prefixes):
+            length = len(next(prefix for prefix in prefixes if word.startswith(prefix)))
+            if len(word) - length >= min_stem:
+                word = word[length:]
+                break
+    
+    # At most one suffix of each group, outermost first
+    for suffixes, min_stem in ARABIC_SUFFIXES:
+        if word.endswith(suffixes):
+            length = len(next(suffix for suffix in suffixes if word.endswith(suffix)))
+            if len(word) - length >= min_stem:
+                word = word[:-length]
+    
+    return word
+
+@lru_cache(maxsize=100000)
+def stem_english(word):
+    """
+    Light-stem an English word by removing common inflectional suffixes.
+    
+    Args:
+        word: Lowercase English word
+    
+    Returns:
+        The stem
+    """
+    if len(word) <= 3 or word.isdigit():
+        return word
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith(("sses", "shes", "ches", "xes")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        word = word[:-1]
+    if word.endswith("ing") and len(word) > 5:
+        return word[:-3]
+    if word.endswith("ed") and len(word) > 4:
+        return word[:-2]
+    return word
+
+class Analyzer:
+    """Base class of the analyzers that turn normalized text into index terms"""
+    
+    def analyze(self, text):
+        """
+        Turn a normalized text into index terms.
+        
+        Args:
+            text: Text normalized with normalize_text
+        
+        Returns:
+            List of terms in text order
+        """
+        return tokenize(text)
+
+class EnglishAnalyzer(Analyzer):
+    """Analyzer with English stopword removal and light stemming"""
+    
+    def analyze(self, text):
+        return [
+            stem_english(token) for token in tokenize(text)
+            if token not in ENGLISH_STOPWORDS
+        ]
+
+class ArabicAnalyzer(Analyzer):
+    """Analyzer with Arabic stopword removal and light stemming"""
+    
+    def analyze(self, text):
+        return [
+            stem_arabic(token) for token in tokenize(text)
+            if token not in ARABIC_STOPWORDS
+        ]
+
+class MultilingualAnalyzer(Analyzer):
+    """
+    Analyzer for mixed Arabic and English text. Each token is handled by
+    the Arabic or English rules depending on its script; numbers are kept
+    as they are so article and decree numbers stay searchable.
+    """
+    
+    def analyze(self, text):
+        terms = []
+        for token in tokenize(text):
+            if ARABIC_CHAR_PATTERN.search(token):
+                if token not in ARABIC_STOPWORDS:
+                    terms.append(stem_arabic(token))
+            elif token not in ENGLISH_STOPWORDS:
+                terms.append(stem_english(token))
+        return terms
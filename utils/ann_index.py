@@ -0,0 +1,324 @@
+import os
+import json
+import numpy as np
+from utils.dense_index import select_top_k
+
+# Number of coarse clusters probed per query; higher means better recall
+# and slower queries
+DEFAULT_NPROBE = 16
+
+# k-means settings shared by the coarse quantizer and product quantization
+KMEANS_ITERATIONS = 15
+KMEANS_SAMPLE_PER_CLUSTER = 64
+KMEANS_SEED = 0
+
+# Codes per product quantization subspace (one byte per subspace)
+PQ_CENTROIDS = 256
+
+# Product quantized candidates re-scored with the exact vectors, per result
+RERANK_FACTOR = 10
+
+# Rows assigned to clusters at a time, which bounds temporary memory
+ASSIGN_BLOCK_ROWS = 16384
+
+# File names of a saved IVF index
+IVF_INFO_FILE = "ivf_index.json"
+IVF_ARRAYS = ("centroids", "assignments", "codebooks", "codes")
+
+def _assign(vectors, centroids, spherical=True):
+    """
+    Assign each vector to its nearest centroid.
+    
+    Args:
+        vectors: Array of shape (n, d)
+        centroids: Array of shape (clusters, d)
+        spherical: Use the largest dot product (unit-length vectors) instead
+            of the smallest Euclidean distance
+    
+    Returns:
+        int64 array of n cluster numbers
+    """
+    centroids = np.asarray(centroids, dtype=np.float32)
+    # argmin |x - c|^2 == argmax (x.c - |c|^2 / 2)
+    offsets = 0.0 if spherical else (centroids * centroids).sum(axis=1) / 2
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), ASSIGN_BLOCK_ROWS):
+        block = np.asarray(vectors[start:start + ASSIGN_BLOCK_ROWS], dtype=np.float32)
+        assignments[start:start + len(block)] = np.argmax(block @ centroids.T - offsets, axis=1)
+    return assignments
+
+def kmeans(vectors, n_clusters, spherical=True, iterations=KMEANS_ITERATIONS, seed=KMEANS_SEED):
+    """
+    Cluster vectors with Lloyd's k-means on a random sample.
+    
+    Args:
+        vectors: Array of shape (n, d)
+        n_clusters: Number of clusters, at most n
+        spherical: Cluster by cosine similarity and keep centroids unit length
+        iterations: Number of k-means iterations
+        seed: Seed of the random generator, so builds are reproducible
+    
+    Returns:
+        float32 array of shape (n_clusters, d) of centroids
+    """
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), n_clusters * KMEANS_SAMPLE_PER_CLUSTER)
+    sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))], dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), n_clusters, replace=False)].copy()
+    
+    for _ in range(iterations):
+        assignments = _assign(sample, centroids, spherical)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        # Sum the members of each cluster over the sample sorted by cluster
+        order = np.argsort(assignments, kind="stable")
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        sums = np.zeros_like(centroids)
+        filled = counts > 0
+        sums[filled] = np.add.reduceat(sample[order], starts[filled], axis=0)
+        
+        # Empty clusters restart from a random sample vector
+        empty = counts == 0
+        centroids = sums / np.maximum(counts, 1)[:, None]
+        if empty.any():
+            centroids[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        if spherical:
+            norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+            centroids /= np.where(norms == 0, 1.0, norms)
+    
+    return centroids
+
+class IVFIndex:
+    """
+    Inverted file (IVF) approximate nearest neighbour index over the rows
+    of a DenseIndex.
+    
+    k-means splits the embedding space into n_lists clusters. A query is
+    only compared with the vectors of the nprobe clusters whose centroids
+    are closest to it, so with about sqrt(n) clusters the work per query
+    grows with the square root of the corpus size. With product
+    quantization (pq_subspaces > 0) candidates are first scored from one
+    byte per subspace, and only the best few are re-scored with the exact
+    vectors.
+    
+    Rows added to the dense index after training are assigned to the
+    existing clusters on the next search; the clusters themselves are only
+    recomputed by building a new index.
+    """
+    
+    def __init__(self, dense_index, centroids, nprobe=DEFAULT_NPROBE, codebooks=None):
+        """
+        Initialize the index from trained parts. Use build to train one.
+        
+        Args:
+            dense_index: DenseIndex whose rows are searched
+            centroids: Array of shape (n_lists, dimension) of cluster centroids
+            nprobe: Number of clusters searched per query
+            codebooks: Optional array of shape (subspaces, codes, dimension /
+                subspaces) of product quantization centroids
+        """
+        self.dense_index = dense_index
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.nprobe = nprobe
+        self.codebooks = codebooks
+        
+        # Cluster and product quantization codes of each dense row
+        self.assignments = np.empty(0, dtype=np.int64)
+        self.codes = np.empty((0, self.pq_subspaces), dtype=np.uint8)
+        # Rows ordered by cluster; the rows of cluster c are
+        # list_rows[list_offsets[c]:list_offsets[c + 1]]
+        self.list_rows = None
+        self.list_offsets = None
+        self.generation = dense_index.generation
+    
+    @property
+    def n_lists(self):
+        """Number of clusters"""
+        return len(self.centroids)
+    
+    @property
+    def pq_subspaces(self):
+        """Number of product quantization subspaces, 0 without quantization"""
+        return 0 if self.codebooks is None else len(self.codebooks)
+    
+    @classmethod
+    def build(cls, dense_index, n_lists=None, nprobe=DEFAULT_NPROBE, pq_subspaces=0):
+        """
+        Train an index on the live rows of a dense index.
+        
+        Args:
+            dense_index: DenseIndex to index
+            n_lists: Number of clusters (default: about sqrt(rows))
+            nprobe: Number of clusters searched per query
+            pq_subspaces: Number of product quantization subspaces, which
+                must divide the dimension; 0 disables quantization
+        
+        Returns:
+            The trained IVFIndex
+        """
+        vectors = dense_index.matrix[dense_index.live]
+        if not len(vectors):
+            raise ValueError("Cannot build an ANN index without vectors")
+        if pq_subspaces and dense_index.dimension % pq_subspaces:
+            raise ValueError(f"pq_subspaces must divide the dimension {dense_index.dimension}")
+        
+        n_lists = min(n_lists or max(1, int(np.sqrt(len(vectors)))), len(vectors))
+        centroids = kmeans(vectors, n_lists)
+        
+        codebooks = None
+        if pq_subspaces:
+            # Quantize the residuals to the cluster centroids, which are much
+            # smaller than the vectors themselves
+            residuals = vectors.astype(np.float32) - centroids[_assign(vectors, centroids)]
+            width = dense_index.dimension // pq_subspaces
+            n_codes = min(PQ_CENTROIDS, len(vectors))
+            codebooks = np.stack([
+                kmeans(residuals[:, j * width:(j + 1) * width], n_codes, spherical=False, seed=KMEANS_SEED + j + 1)
+                for j in range(pq_subspaces)
+            ])
+        
+        index = cls(dense_index, centroids, nprobe=nprobe, codebooks=codebooks)
+        index.sync()
+        return index
+    
+    def _encode(self, vectors, assignments):
+        """Return the product quantization codes of vectors in their clusters"""
+        residuals = np.asarray(vectors, dtype=np.float32) - self.centroids[assignments]
+        width = self.dense_index.dimension // self.pq_subspaces
+        codes = np.empty((len(vectors), self.pq_subspaces), dtype=np.uint8)
+        for j, codebook in enumerate(self.codebooks):
+            codes[:, j] = _assign(residuals[:, j * width:(j + 1) * width], codebook, spherical=False)
+        return codes
+    
+    def sync(self):
+        """Assign the dense rows that are not in the index yet"""
+        dense_index = self.dense_index
+        if self.generation != dense_index.generation:
+            # Rows were renumbered; assign everything again
+            self.assignments = np.empty(0, dtype=np.int64)
+            self.codes = np.empty((0, self.pq_subspaces), dtype=np.uint8)
+            self.generation = dense_index.generation
+        
+        start = len(self.assignments)
+        if start < len(dense_index.doc_ids):
+            new_vectors = dense_index.matrix[start:]
+            new_assignments = _assign(new_vectors, self.centroids)
+            self.assignments = np.concatenate([self.assignments, new_assignments])
+            if self.pq_subspaces:
+                self.codes = np.concatenate([self.codes, self._encode(new_vectors, new_assignments)])
+            self.list_rows = None
+        
+        if self.list_rows is None:
+            self.list_rows = np.argsort(self.assignments, kind="stable")
+            self.list_offsets = np.zeros(self.n_lists + 1, dtype=np.int64)
+            self.list_offsets[1:] = np.cumsum(np.bincount(self.assignments, minlength=self.n_lists))
+    
+    def _candidates(self, query_vector, nprobe):
+        """
+        Return the live rows of the nprobe clusters closest to the query,
+        and the query's dot product with every centroid.
+        """
+        nprobe = min(nprobe, self.n_lists)
+        centroid_scores = self.centroids @ query_vector
+        probed = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        rows = np.concatenate([
+            self.list_rows[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probed
+        ])
+        return rows[self.dense_index.live[rows]], centroid_scores
+    
+    def _exact_scores(self, rows, query_vector):
+        """Score rows with their exact float16 vectors"""
+        # Rows are read in file order, which is kinder to a memory map
+        order = np.argsort(rows)
+        scores = np.empty(len(rows), dtype=np.float32)
+        scores[order] = self.dense_index.matrix[rows[order]].astype(np.float32) @ query_vector
+        return scores
+    
+    def search(self, query_vector, k=5, nprobe=None):
+        """
+        Find approximately the k documents most similar to a query.
+        
+        Args:
+            query_vector: Unit-length query embedding
+            k: Number of results to return
+            nprobe: Number of clusters to search (default: the index's nprobe)
+        
+        Returns:
+            List of (doc_id, cosine similarity) tuples, best first
+        """
+        self.sync()
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        rows, centroid_scores = self._candidates(query_vector, nprobe or self.nprobe)
+        if not len(rows) or k <= 0:
+            return []
+        
+        if self.pq_subspaces:
+            # Score every candidate as its centroid's score plus the residual
+            # score from its codes, looked up in a table of the query's dot
+            # product with each subspace centroid, then re-score the best
+            # few exactly
+            width = self.dense_index.dimension // self.pq_subspaces
+            table = np.einsum(
+                "jcw,jw->jc", self.codebooks, query_vector.reshape(self.pq_subspaces, width)
+            )
+            approximate = centroid_scores[self.assignments[rows]] + table[
+                np.arange(self.pq_subspaces), self.codes[rows]
+            ].sum(axis=1)
+            shortlist = min(len(rows), k * RERANK_FACTOR)
+            rows = rows[np.argpartition(-approximate, shortlist - 1)[:shortlist]]
+        
+        scores = self._exact_scores(rows, query_vector)
+        positive = scores > 0
+        return select_top_k(self.dense_index.doc_ids[rows[positive]], scores[positive], k)
+    
+    def save(self, directory):
+        """
+        Save the trained index next to its dense index as .npy files.
+        
+        Args:
+            directory: Directory to write the index files to
+        """
+        self.sync()
+        os.makedirs(directory, exist_ok=True)
+        arrays = {
+            "centroids": self.centroids,
+            "assignments": self.assignments,
+            "codebooks": self.codebooks,
+            "codes": self.codes
+        }
+        for name in IVF_ARRAYS:
+            if arrays[name] is not None:
+                np.save(os.path.join(directory, f"ivf_{name}.npy"), arrays[name])
+        with open(os.path.join(directory, IVF_INFO_FILE), "w", encoding="utf-8") as f:
+            json.dump({
+                "n_lists": self.n_lists,
+                "nprobe": self.nprobe,
+                "pq_subspaces": self.pq_subspaces,
+                "rows": len(self.assignments)
+            }, f)
+    
+    @classmethod
+    def load(cls, directory, dense_index, mmap=True):
+        """
+        Load an index saved with save.
+        
+        Args:
+            directory: Directory the index was saved to
+            dense_index: The DenseIndex it was built on, as saved with it
+            mmap: Memory-map the product quantization codes
+        
+        Returns:
+            The loaded IVFIndex
+        """
+        with open(os.path.join(directory, IVF_INFO_FILE), "r", encoding="utf-8") as f:
+            info = json.load(f)
+        
+        def load_array(name, mmap_mode=None):
+            return np.load(os.path.join(directory, f"ivf_{name}.npy"), mmap_mode=mmap_mode)
+        
+        codebooks = load_array("codebooks") if info["pq_subspaces"] else None
+        index = cls(dense_index, load_array("centroids"), nprobe=info["nprobe"], codebooks=codebooks)
+        index.assignments = load_array("assignments")
+        if info["pq_subspaces"]:
+            index.codes = load_array("codes", "r" if mmap else None)
+        index.sync()
+        return index
@@ -0,0 +1,443 @@
+import os
+import json
+from array import array
+from collections.abc import Mapping, Sequence
+import numpy as np
+from langchain.schema import Document
+
+# File names of a saved chunk store
+STORE_INFO_FILE = "chunk_store.json"
+STORE_TEXT_FILE = "texts.txt"
+STORE_DELETED_FILE = "deleted.npy"
+STORE_ARRAYS = (
+    "chunk_laws", "chunk_starts", "chunk_ends", "chunk_page_starts", "chunk_page_ends",
+    "chunk_numbers", "span_offsets", "span_articles", "span_starts", "span_ends"
+)
+
+def _to_array(typecode, values):
+    """Copy an integer NumPy array into an array.array with the given type code"""
+    result = array(typecode)
+    result.frombytes(np.ascontiguousarray(values, dtype=f"i{result.itemsize}").tobytes())
+    return result
+
+class ChunkStore:
+    """
+    Compact, offset-based storage for document chunks.
+    
+    The text of each law is kept once in a single buffer, so the overlap
+    between consecutive chunks is not stored twice. Chunks are rows in
+    parallel arrays of (law_id, start, end, page_start, page_end) and the
+    metadata shared by all chunks of a law is stored once per law.
+    LangChain Document objects are only created when a chunk is requested.
+    
+    Chunk ids are stable: removing a law leaves tombstones behind instead
+    of renumbering the remaining chunks.
+    """
+    
+    def __init__(self):
+        """Initialize an empty store"""
+        # Per-law data, indexed by law_id; None once a law is removed
+        self.laws = []
+        self.texts = []
+        self.law_ids_by_source = {}
+        self.law_chunk_ids = []
+        
+        # Per-chunk records, indexed by chunk id
+        self.chunk_laws = array("l")
+        self.chunk_starts = array("q")
+        self.chunk_ends = array("q")
+        self.chunk_page_starts = array("l")
+        self.chunk_page_ends = array("l")
+        self.chunk_numbers = array("l")
+        self.deleted = bytearray()
+        
+        # Article spans of all chunks, flattened; the spans of chunk i are
+        # at positions span_offsets[i] to span_offsets[i + 1]
+        self.span_offsets = array("q", [0])
+        self.span_articles = array("q")
+        self.span_starts = array("l")
+        self.span_ends = array("l")
+        
+        # (law_name, article_number) -> list of (chunk_id, start, end)
+        self.article_spans = {}
+        
+        self._live_ids = None
+    
+    @classmethod
+    def from_documents(cls, documents):
+        """
+        Build a store from LangChain documents.
+        
+        Args:
+            documents: List of Document objects
+        
+        Returns:
+            A new ChunkStore
+        """
+        store = cls()
+        store.add_documents(documents)
+        return store
+    
+    def __len__(self):
+        """Return the number of live chunks"""
+        return len(self.live_ids())
+    
+    def save(self, directory):
+        """
+        Save the store: the law texts as one UTF-8 file, the chunk records
+        as .npy arrays and the law metadata as JSON.
+        
+        Args:
+            directory: Directory to write the store files to
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name in STORE_ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), np.asarray(getattr(self, name), dtype=np.int64))
+        np.save(os.path.join(directory, STORE_DELETED_FILE), np.frombuffer(bytes(self.deleted), dtype=np.uint8))
+        
+        texts = [text or "" for text in self.texts]
+        with open(os.path.join(directory, STORE_TEXT_FILE), "w", encoding="utf-8", newline="") as f:
+            f.write("".join(texts))
+        with open(os.path.join(directory, STORE_INFO_FILE), "w", encoding="utf-8") as f:
+            json.dump({
+                "laws": self.laws,
+                "text_lengths": [len(text) for text in texts],
+                "sources": list(self.law_ids_by_source.items())
+            }, f, ensure_ascii=False)
+    
+    @classmethod
+    def load(cls, directory):
+        """
+        Load a store saved with save.
+        
+        Args:
+            directory: Directory the store was saved to
+        
+        Returns:
+            The loaded ChunkStore
+        """
+        with open(os.path.join(directory, STORE_INFO_FILE), "r", encoding="utf-8") as f:
+            info = json.load(f)
+        with open(os.path.join(directory, STORE_TEXT_FILE), "r", encoding="utf-8", newline="") as f:
+            all_text = f.read()
+        
+        store = cls()
+        store.laws = info["laws"]
+        store.law_ids_by_source = {source: law_id for source, law_id in info["sources"]}
+        start = 0
+        for law, length in zip(store.laws, info["text_lengths"]):
+            store.texts.append(all_text[start:start + length] if law is not None else None)
+            start += length
+        
+        for name in STORE_ARRAYS:
+            values = np.load(os.path.join(directory, f"{name}.npy"))
+            setattr(store, name, _to_array(getattr(store, name).typecode, values))
+        store.deleted = bytearray(np.load(os.path.join(directory, STORE_DELETED_FILE)).tobytes())
+        
+        # Law partitions and the article lookup are derived from the records
+        store.law_chunk_ids = [array("q") for _ in store.laws]
+        for chunk_id in store.live_ids():
+            law_id = store.chunk_laws[chunk_id]
+            store.law_chunk_ids[law_id].append(chunk_id)
+            law_name = store.laws[law_id]["law_name"]
+            for i in range(store.span_offsets[chunk_id], store.span_offsets[chunk_id + 1]):
+                store.article_spans.setdefault((law_name, str(store.span_articles[i])), []).append(
+                    (chunk_id, store.span_starts[i], store.span_ends[i])
+                )
+        return store
+    
+    def add_documents(self, documents):
+        """
+        Add documents to the store. Documents of the same source must be
+        given in document order.
+        
+        Args:
+            documents: List of Document objects
+        
+        Returns:
+            List of the new chunk ids, in the order of documents
+        """
+        chunk_ids = []
+        # Per law: buffer parts, buffer length, stream end and text of the
+        # last chunk added in this call
+        buffers = {}
+        
+        for doc in documents:
+            source = doc.metadata.get("source")
+            law_id = self.law_ids_by_source.get(source)
+            if law_id is None:
+                law_id = len(self.laws)
+                self.law_ids_by_source[source] = law_id
+                self.laws.append({
+                    "source": source,
+                    "law_name": doc.metadata.get("law_name"),
+                    "has_arabic": doc.metadata.get("has_arabic", False),
+                    "file_hash": doc.metadata.get("file_hash"),
+                    "total_chunks": doc.metadata.get("total_chunks")
+                })
+                self.texts.append("")
+                self.law_chunk_ids.append(array("q"))
+            parts, buffer_length, stream_end, last_text = buffers.get(law_id) or (
+                [self.texts[law_id]], len(self.texts[law_id]), None, ""
+            )
+            
+            text = doc.page_content
+            stream_offset = doc.metadata.get("offset")
+            
+            # Chunks that overlap the previous chunk of the same law share
+            # the overlapping text in the buffer
+            overlap = 0
+            if stream_offset is not None and stream_end is not None and stream_offset < stream_end:
+                overlap = min(stream_end - stream_offset, len(text), len(last_text))
+                if not last_text.endswith(text[:overlap]):
+                    overlap = 0
+            
+            start = buffer_length - overlap
+            parts.append(text[overlap:])
+            buffer_length += len(text) - overlap
+            if stream_offset is not None:
+                stream_end = stream_offset + len(text)
+            buffers[law_id] = (parts, buffer_length, stream_end, text)
+            
+            chunk_id = self._add_chunk(law_id, start, start + len(text), doc.metadata)
+            self.law_chunk_ids[law_id].append(chunk_id)
+            chunk_ids.append(chunk_id)
+        
+        for law_id, (parts, _, _, _) in buffers.items():
+            self.texts[law_id] = "".join(parts)
+        
+        self._live_ids = None
+        return chunk_ids
+    
+    def _add_chunk(self, law_id, start, end, metadata):
+        """Append the record of a single chunk and return its id"""
+        chunk_id = len(self.chunk_laws)
+        self.chunk_laws.append(law_id)
+        self.chunk_starts.append(start)
+        self.chunk_ends.append(end)
+        self.chunk_page_starts.append(metadata.get("page_start") or 0)
+        self.chunk_page_ends.append(metadata.get("page_end") or 0)
+        self.chunk_numbers.append(metadata.get("chunk", 0))
+        self.deleted.append(0)
+        
+        law_name = self.laws[law_id]["law_name"]
+        for article_number, span_start, span_end in metadata.get("article_spans") or []:
+            self.span_articles.append(int(article_number))
+            self.span_starts.append(span_start)
+            self.span_ends.append(span_end)
+            self.article_spans.setdefault((law_name, str(int(article_number))), []).append(
+                (chunk_id, span_start, span_end)
+            )
+        self.span_offsets.append(len(self.span_articles))
+        
+        return chunk_id
+    
+    def remove_source(self, source):
+        """
+        Remove all chunks of a source file.
+        
+        Args:
+            source: Source path of the chunks to remove
+        
+        Returns:
+            List of the removed chunk ids
+        """
+        law_id = self.law_ids_by_source.pop(source, None)
+        if law_id is None:
+            return []
+        
+        removed = list(self.law_chunk_ids[law_id])
+        for chunk_id in removed:
+            self.deleted[chunk_id] = 1
+        
+        law_name = self.laws[law_id]["law_name"]
+        removed_ids = set(removed)
+        for key in [key for key in self.article_spans if key[0] == law_name]:
+            spans = [span for span in self.article_spans[key] if span[0] not in removed_ids]
+            if spans:
+                self.article_spans[key] = spans
+            else:
+                del self.article_spans[key]
+        
+        self.laws[law_id] = None
+        self.texts[law_id] = None
+        self.law_chunk_ids[law_id] = array("q")
+        self._live_ids = None
+        return removed
+    
+    def chunk_ids_for_source(self, source):
+        """Return the ids of the live chunks of a source file"""
+        law_id = self.law_ids_by_source.get(source)
+        if law_id is None:
+            return array("q")
+        return self.law_chunk_ids[law_id]
+    
+    def source_law(self, source):
+        """Return the shared metadata of a source file's law, or None if it is not stored"""
+        law_id = self.law_ids_by_source.get(source)
+        if law_id is None:
+            return None
+        return self.laws[law_id]
+    
+    def source_articles(self, source):
+        """Return the set of article numbers that occur in the chunks of a source file"""
+        articles = set()
+        for chunk_id in self.chunk_ids_for_source(source):
+            articles.update(self.span_articles[self.span_offsets[chunk_id]:self.span_offsets[chunk_id + 1]])
+        return {str(article) for article in articles}
+    
+    def live_ids(self):
+        """Return the ids of all chunks that have not been removed"""
+        if self._live_ids is None:
+            self._live_ids = array("q", (i for i, dead in enumerate(self.deleted) if not dead))
+        return self._live_ids
+    
+    def is_live(self, chunk_id):
+        """Check whether a chunk id refers to a chunk that was not removed"""
+        return 0 <= chunk_id < len(self.deleted) and not self.deleted[chunk_id]
+    
+    def text(self, chunk_id):
+        """Return the text of a chunk"""
+        law_text = self.texts[self.chunk_laws[chunk_id]]
+        return law_text[self.chunk_starts[chunk_id]:self.chunk_ends[chunk_id]]
+    
+    def law(self, chunk_id):
+        """Return the shared metadata of a chunk's law"""
+        return self.laws[self.chunk_laws[chunk_id]]
+    
+    def spans(self, chunk_id):
+        """Return the article spans of a chunk as [article, start, end] lists"""
+        return [
+            [str(self.span_articles[i]), self.span_starts[i], self.span_ends[i]]
+            for i in range(self.span_offsets[chunk_id], self.span_offsets[chunk_id + 1])
+        ]
+    
+    def metadata(self, chunk_id):
+        """
+        Build the metadata dictionary of a chunk.
+        
+        Args:
+            chunk_id: Id of the chunk
+        
+        Returns:
+            Dictionary with the same keys as produced by ingestion
+        """
+        law = self.law(chunk_id)
+        page_start = self.chunk_page_starts[chunk_id]
+        page_end = self.chunk_page_ends[chunk_id]
+        if not page_start:
+            page = "Unknown"
+        elif page_start == page_end:
+            page = str(page_start)
+        else:
+            page = f"{page_start}-{page_end}"
+        
+        article_spans = self.spans(chunk_id)
+        return {
+            "source": law["source"],
+            "law_name": law["law_name"],
+            "has_arabic": law["has_arabic"],
+            "file_hash": law["file_hash"],
+            "chunk": self.chunk_numbers[chunk_id],
+            "total_chunks": law["total_chunks"],
+            "page": page,
+            "page_start": page_start,
+            "page_end": page_end,
+            "article_start": article_spans[0][0] if article_spans else None,
+            "article_end": article_spans[-1][0] if article_spans else None,
+            "article_spans": article_spans
+        }
+    
+    def document(self, chunk_id):
+        """
+        Materialize a chunk as a LangChain Document.
+        
+        Args:
+            chunk_id: Id of the chunk
+        
+        Returns:
+            A new Document object
+        """
+        return Document(page_content=self.text(chunk_id), metadata=self.metadata(chunk_id))
+    
+    def sources(self):
+        """Return a mapping of indexed source path -> content hash"""
+        return {
+            source: self.laws[law_id]["file_hash"]
+            for source, law_id in self.law_ids_by_source.items()
+        }
+    
+    def law_names(self):
+        """Return the sorted unique names of the stored laws"""
+        return sorted({law["law_name"] for law in self.laws if law is not None})
+    
+    def memory_usage(self):
+        """
+        Estimate the memory used by the store.
+        
+        Returns:
+            Dictionary with the number of stored characters and the bytes
+            used by text buffers and chunk records
+        """
+        text_chars = sum(len(text) for text in self.texts if text is not None)
+        record_arrays = (
+            self.chunk_laws, self.chunk_starts, self.chunk_ends,
+            self.chunk_page_starts, self.chunk_page_ends, self.chunk_numbers,
+            self.span_offsets, self.span_articles, self.span_starts, self.span_ends
+        )
+        return {
+            "text_chars": text_chars,
+            "record_bytes": sum(len(a) * a.itemsize for a in record_arrays) + len(self.deleted)
+        }
+
+class DocumentsView(Sequence):
+    """Read-only sequence of the live chunks of a store as Documents"""
+    
+    def __init__(self, store):
+        """
+        Initialize the view.
+        
+        Args:
+            store: ChunkStore to expose
+        """
+        self.store = store
+    
+    def __len__(self):
+        return len(self.store.live_ids())
+    
+    def __getitem__(self, position):
+        live_ids = self.store.live_ids()
+        if isinstance(position, slice):
+            return [self.store.document(chunk_id) for chunk_id in live_ids[position]]
+        return self.store.document(live_ids[position])
+    
+    def __iter__(self):
+        for chunk_id in self.store.live_ids():
+            yield self.store.document(chunk_id)
+
+class ArticleIndexView(Mapping):
+    """
+    Article index of a store in the format of build_article_index:
+    (law_name, article_number) -> list of (Document, start, end)
+    """
+    
+    def __init__(self, store):
+        """
+        Initialize the view.
+        
+        Args:
+            store: ChunkStore to expose
+        """
+        self.store = store
+    
+    def __getitem__(self, key):
+        return [
+            (self.store.document(chunk_id), start, end)
+            for chunk_id, start, end in self.store.article_spans[key]
+        ]
+    
+    def __iter__(self):
+        return iter(self.store.article_spans)
+    
+    def __len__(self):
+        return len(self.store.article_spans)
@@ -0,0 +1,183 @@
+import os
+import hashlib
+import numpy as np
+
+# Number of words per shingle
+SHINGLE_SIZE = 5
+
+# Signature length: one BLAKE2b digest of 64 bytes gives 32 16-bit hashes
+NUM_HASHES = 32
+
+# Locality-sensitive hashing bands; signatures sharing any band become
+# candidates and are then compared in full
+NUM_BANDS = 8
+ROWS_PER_BAND = NUM_HASHES // NUM_BANDS
+
+# Estimated Jaccard similarity above which chunks count as duplicates
+DEFAULT_THRESHOLD = 0.9
+
+# Every digest is read as NUM_HASHES little-endian 16-bit hashes
+_HASH_DTYPE = np.dtype("<u2")
+
+# File names of a saved index
+KEYS_FILE = "signature_keys.npy"
+SIGNATURES_FILE = "signatures.npy"
+
+def minhash_signature(text, shingle_size=SHINGLE_SIZE):
+    """
+    Compute the MinHash signature of a text's word shingles.
+    
+    Args:
+        text: Text to sign, ideally already normalized
+        shingle_size: Number of words per shingle
+    
+    Returns:
+        Tuple of NUM_HASHES integers
+    """
+    words = text.split()
+    if len(words) <= shingle_size:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)}
+    
+    # Every digest yields one value per hash function; the signature keeps
+    # the minimum of each
+    digests = b"".join([hashlib.blake2b(shingle.encode("utf-8"), digest_size=64).digest() for shingle in shingles])
+    rows = np.frombuffer(digests, dtype=_HASH_DTYPE).reshape(-1, NUM_HASHES)
+    return tuple(rows.min(axis=0).tolist())
+
+def signature_similarity(first, second):
+    """
+    Estimate the Jaccard similarity of two texts from their signatures.
+    
+    Args:
+        first: MinHash signature of the first text
+        second: MinHash signature of the second text
+    
+    Returns:
+        Fraction of matching hash values, between 0 and 1
+    """
+    return sum(1 for a, b in zip(first, second) if a == b) / NUM_HASHES
+
+class NearDuplicateIndex:
+    """MinHash/LSH index for finding near-duplicate chunks"""
+    
+    def __init__(self, threshold=DEFAULT_THRESHOLD):
+        """
+        Initialize an empty index.
+        
+        Args:
+            threshold: Estimated Jaccard similarity above which two texts
+                are considered duplicates
+        """
+        self.threshold = threshold
+        self.signatures = {}
+        # Band key -> keys; None until built from the signatures of a
+        # loaded index
+        self.buckets = {}
+    
+    def _band_keys(self, signature):
+        """Return the LSH bucket keys of a signature"""
+        return [
+            (band, signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND])
+            for band in range(NUM_BANDS)
+        ]
+    
+    def _bucket_map(self):
+        """Return the LSH buckets, building them on first use after a load"""
+        if self.buckets is None:
+            self.buckets = {}
+            for key, signature in self.signatures.items():
+                for band_key in self._band_keys(signature):
+                    self.buckets.setdefault(band_key, []).append(key)
+        return self.buckets
+    
+    def find(self, signature, accept=None):
+        """
+        Find an indexed item that is a near duplicate of a signature.
+        
+        Args:
+            signature: MinHash signature to look up
+            accept: Optional function of an item key that returns False for
+                items that may not be matched
+        
+        Returns:
+            Key of the duplicate item, or None
+        """
+        buckets = self._bucket_map()
+        seen = set()
+        for band_key in self._band_keys(signature):
+            for key in buckets.get(band_key, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                if accept is not None and not accept(key):
+                    continue
+                if signature_similarity(signature, self.signatures[key]) >= self.threshold:
+                    return key
+        return None
+    
+    def add(self, key, signature):
+        """
+        Add an item to the index.
+        
+        Args:
+            key: Hashable key identifying the item
+            signature: MinHash signature of the item
+        """
+        buckets = self._bucket_map()
+        self.signatures[key] = signature
+        for band_key in self._band_keys(signature):
+            buckets.setdefault(band_key, []).append(key)
+    
+    def remove(self, key):
+        """
+        Remove an item from the index.
+        
+        Args:
+            key: Key of the item to remove
+        """
+        buckets = self._bucket_map()
+        signature = self.signatures.pop(key, None)
+        if signature is None:
+            return
+        for band_key in self._band_keys(signature):
+            bucket = buckets.get(band_key)
+            if bucket:
+                bucket.remove(key)
+                if not bucket:
+                    del buckets[band_key]
+    
+    def save(self, directory):
+        """
+        Save the signatures as .npy arrays. Only integer keys are supported.
+        
+        Args:
+            directory: Directory to write the index files to
+        """
+        os.makedirs(directory, exist_ok=True)
+        keys = list(self.signatures)
+        signatures = np.array([self.signatures[key] for key in keys], dtype=np.uint16).reshape(-1, NUM_HASHES)
+        np.save(os.path.join(directory, KEYS_FILE), np.array(keys, dtype=np.int64))
+        np.save(os.path.join(directory, SIGNATURES_FILE), signatures)
+    
+    @classmethod
+    def load(cls, directory, threshold=DEFAULT_THRESHOLD):
+        """
+        Load an index saved with save.
+        
+        Args:
+            directory: Directory the index was saved to
+            threshold: Estimated Jaccard similarity above which two texts
+                are considered duplicates
+        
+        Returns:
+            The loaded NearDuplicateIndex
+        """
+        index = cls(threshold)
+        keys = np.load(os.path.join(directory, KEYS_FILE)).tolist()
+        signatures = np.load(os.path.join(directory, SIGNATURES_FILE)).tolist()
+        index.signatures = {key: tuple(signature) for key, signature in zip(keys, signatures)}
+        # The buckets are only needed once documents are added or removed
+        index.buckets = None
+        return index
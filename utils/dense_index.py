@@ -0,0 +1,353 @@
+import os
+import json
+import hashlib
+from functools import lru_cache
+from collections import Counter
+import numpy as np
+from utils.search_filters import ranges_mask
+
+# Size of the vectors produced by the hashing encoder
+DEFAULT_DIMENSION = 256
+
+# Character n-gram sizes used by the hashing encoder
+NGRAM_SIZES = (3, 4, 5)
+
+# Rows converted to float32 at a time when scoring the float16 matrix
+BLOCK_ROWS = 16384
+
+# File names of a saved dense index
+EMBEDDINGS_FILE = "embeddings.npy"
+DOC_IDS_FILE = "doc_ids.npy"
+INFO_FILE = "dense_index.json"
+
+def normalize_rows(vectors):
+    """
+    Scale the rows of a matrix to unit length, leaving zero rows as they are.
+    
+    Args:
+        vectors: 2D float array
+    
+    Returns:
+        The normalized float32 array
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def select_top_k(doc_ids, scores, k):
+    """
+    Select the k best scored documents with argpartition.
+    
+    Args:
+        doc_ids: Array of document ids
+        scores: Array of their scores
+        k: Number of results to return
+    
+    Returns:
+        List of (doc_id, score) tuples, best first, ties broken by lower doc id
+    """
+    if not len(scores) or k <= 0:
+        return []
+    if len(scores) > k:
+        # Keep everything that scores at least the k-th best score, so ties
+        # at the cut are decided by doc id rather than by the partition order
+        kth_score = -np.partition(-scores, k - 1)[k - 1]
+        keep = scores >= kth_score
+        doc_ids = doc_ids[keep]
+        scores = scores[keep]
+    order = np.lexsort((doc_ids, -scores))[:k]
+    return [(int(doc_ids[i]), float(scores[i])) for i in order]
+
+class Encoder:
+    """
+    Base class of the encoders that turn texts into embedding vectors.
+    
+    Subclasses set dimension and implement encode.
+    """
+    
+    dimension = None
+    
+    def encode(self, texts):
+        """
+        Embed texts.
+        
+        Args:
+            texts: List of normalized texts
+        
+        Returns:
+            float32 array of shape (len(texts), dimension) with unit-length rows
+        """
+        raise NotImplementedError
+
+class HashingEncoder(Encoder):
+    """
+    Deterministic offline encoder that projects character n-grams into a
+    fixed number of buckets with a stable hash (the feature hashing trick).
+    Texts that share many n-grams, including inflected forms of the same
+    word, get similar vectors. No model or network access is needed.
+    """
+    
+    def __init__(self, dimension=DEFAULT_DIMENSION, ngram_sizes=NGRAM_SIZES):
+        """
+        Initialize the encoder.
+        
+        Args:
+            dimension: Number of buckets of the output vectors
+            ngram_sizes: Sizes of the character n-grams to hash
+        """
+        self.dimension = dimension
+        self.ngram_sizes = ngram_sizes
+        # Words repeat a lot, so their hashed n-grams are cached per word
+        self._word_features = lru_cache(maxsize=200000)(self._hash_word)
+    
+    def _hash_word(self, word):
+        """Return the (buckets, signs) arrays of the n-grams of a word"""
+        # Word boundaries are part of the n-grams
+        padded = f" {word} "
+        buckets = []
+        signs = []
+        for size in self.ngram_sizes:
+            for start in range(len(padded) - size + 1):
+                ngram = padded[start:start + size].encode("utf-8")
+                value = int.from_bytes(hashlib.blake2b(ngram, digest_size=8).digest(), "little")
+                buckets.append(value % self.dimension)
+                signs.append(1.0 if value >> 63 else -1.0)
+        return np.array(buckets, dtype=np.int64), np.array(signs, dtype=np.float32)
+    
+    def encode(self, texts):
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = Counter(text.split())
+            if not words:
+                continue
+            features = [self._word_features(word) for word in words]
+            counts = np.repeat(
+                np.fromiter(words.values(), dtype=np.float32, count=len(words)),
+                [len(buckets) for buckets, _ in features]
+            )
+            buckets = np.concatenate([buckets for buckets, _ in features])
+            signs = np.concatenate([signs for _, signs in features])
+            vectors[row] = np.bincount(buckets, weights=signs * counts, minlength=self.dimension)
+        return normalize_rows(vectors)
+
+class SentenceTransformerEncoder(Encoder):
+    """Encoder backed by a sentence-transformers model"""
+    
+    def __init__(self, model_name="paraphrase-multilingual-MiniLM-L12-v2"):
+        """
+        Load the model.
+        
+        Args:
+            model_name: Name or path of the sentence-transformers model
+        """
+        # Imported here so the package is only needed when this encoder is used
+        from sentence_transformers import SentenceTransformer
+        
+        self.model = SentenceTransformer(model_name)
+        self.dimension = self.model.get_sentence_embedding_dimension()
+    
+    def encode(self, texts):
+        return normalize_rows(self.model.encode(list(texts), convert_to_numpy=True))
+
+# Encoders that can be selected by name
+ENCODERS = {
+    "hashing": HashingEncoder,
+    "sentence-transformers": SentenceTransformerEncoder
+}
+
+def create_encoder(name):
+    """
+    Create an encoder by name.
+    
+    Args:
+        name: One of the ENCODERS names, or "none" to disable embeddings
+    
+    Returns:
+        The encoder, or None for "none"
+    """
+    if not name or name == "none":
+        return None
+    if name not in ENCODERS:
+        raise ValueError(f"Unknown encoder: {name}")
+    return ENCODERS[name]()
+
+class DenseIndex:
+    """
+    Brute-force dense vector index.
+    
+    Embeddings are rows of one contiguous float16 matrix, which halves the
+    memory of float32 and can be memory-mapped from disk. Queries are
+    scored against all rows with matrix products, one per block of
+    BLOCK_ROWS rows, instead of a Python loop over the chunks. Removed
+    documents leave dead rows that are dropped when the index is saved.
+    """
+    
+    def __init__(self, dimension):
+        """
+        Initialize an empty index.
+        
+        Args:
+            dimension: Size of the embedding vectors
+        """
+        self.dimension = dimension
+        self.matrix = np.empty((0, dimension), dtype=np.float16)
+        # Doc id and live flag of each matrix row
+        self.doc_ids = np.empty(0, dtype=np.int64)
+        self.live = np.empty(0, dtype=bool)
+        # doc_id -> matrix row of the live documents
+        self.rows = {}
+        # Incremented whenever rows are renumbered, so indexes built on top
+        # of the row numbers know they are stale
+        self.generation = 0
+    
+    def __len__(self):
+        """Return the number of indexed documents"""
+        return len(self.rows)
+    
+    def add(self, doc_ids, vectors):
+        """
+        Add documents to the index.
+        
+        Args:
+            doc_ids: List of integer document ids
+            vectors: Array of shape (len(doc_ids), dimension) of their embeddings
+        """
+        if not len(doc_ids):
+            return
+        for doc_id in doc_ids:
+            if doc_id in self.rows:
+                raise ValueError(f"Document {doc_id} is already indexed")
+        
+        first_row = len(self.doc_ids)
+        self.matrix = np.concatenate([self.matrix, np.asarray(vectors, dtype=np.float16)])
+        self.doc_ids = np.concatenate([self.doc_ids, np.asarray(doc_ids, dtype=np.int64)])
+        self.live = np.concatenate([self.live, np.ones(len(doc_ids), dtype=bool)])
+        for offset, doc_id in enumerate(doc_ids):
+            self.rows[doc_id] = first_row + offset
+    
+    def remove(self, doc_id):
+        """
+        Remove a document from the index.
+        
+        Args:
+            doc_id: Integer id of the document
+        """
+        row = self.rows.pop(doc_id, None)
+        if row is not None:
+            self.live[row] = False
+    
+    def compact(self):
+        """Drop the rows of removed documents"""
+        if self.live.all():
+            return
+        self.matrix = np.ascontiguousarray(self.matrix[self.live])
+        self.doc_ids = self.doc_ids[self.live]
+        self.live = np.ones(len(self.doc_ids), dtype=bool)
+        self.rows = {int(doc_id): row for row, doc_id in enumerate(self.doc_ids)}
+        self.generation += 1
+    
+    def scores(self, query_vectors):
+        """
+        Compute the similarity of every row with a set of queries.
+        
+        Args:
+            query_vectors: float array of shape (queries, dimension)
+        
+        Returns:
+            float32 array of shape (rows, queries); dead rows score -inf
+        """
+        query_vectors = np.asarray(query_vectors, dtype=np.float32)
+        scores = np.empty((len(self.matrix), len(query_vectors)), dtype=np.float32)
+        for start in range(0, len(self.matrix), BLOCK_ROWS):
+            block = self.matrix[start:start + BLOCK_ROWS].astype(np.float32)
+            scores[start:start + len(block)] = block @ query_vectors.T
+        scores[~self.live] = -np.inf
+        return scores
+    
+    def _top_k(self, scores, k):
+        """Return the k best (doc_id, score) pairs of a score column"""
+        candidates = np.flatnonzero(scores > 0)
+        return select_top_k(self.doc_ids[candidates], scores[candidates], k)
+    
+    def search(self, query_vector, k=5, doc_ranges=None):
+        """
+        Find the k documents most similar to a query.
+        
+        Args:
+            query_vector: Unit-length query embedding
+            k: Number of results to return
+            doc_ranges: Optional sorted list of half-open (start, end) doc id
+                ranges to restrict the search to
+        
+        Returns:
+            List of (doc_id, cosine similarity) tuples, best first; only
+            documents with a positive similarity are returned
+        """
+        return self.search_many([query_vector], k=k, doc_ranges=doc_ranges)[0]
+    
+    def search_many(self, query_vectors, k=5, doc_ranges=None):
+        """
+        Find the k most similar documents for many queries at once.
+        
+        Args:
+            query_vectors: Array of unit-length query embeddings
+            k: Number of results to return per query
+            doc_ranges: Optional sorted list of half-open (start, end) doc id
+                ranges to restrict the search to
+        
+        Returns:
+            List with the (doc_id, score) results of each query
+        """
+        if not len(query_vectors):
+            return []
+        
+        if doc_ranges is not None:
+            # Only the rows of the allowed documents are multiplied
+            rows = np.flatnonzero(self.live & ranges_mask(self.doc_ids, doc_ranges))
+            scores = self.matrix[rows].astype(np.float32) @ np.asarray(query_vectors, dtype=np.float32).T
+            results = []
+            for column in range(scores.shape[1]):
+                positive = scores[:, column] > 0
+                results.append(select_top_k(self.doc_ids[rows[positive]], scores[positive, column], k))
+            return results
+        
+        scores = self.scores(query_vectors)
+        return [self._top_k(scores[:, column], k) for column in range(scores.shape[1])]
+    
+    def save(self, directory):
+        """
+        Save the index as .npy files that load can memory-map.
+        
+        Args:
+            directory: Directory to write the index files to
+        """
+        self.compact()
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, EMBEDDINGS_FILE), self.matrix)
+        np.save(os.path.join(directory, DOC_IDS_FILE), self.doc_ids)
+        with open(os.path.join(directory, INFO_FILE), "w", encoding="utf-8") as f:
+            json.dump({"dimension": self.dimension, "count": len(self.doc_ids)}, f)
+    
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """
+        Load an index saved with save.
+        
+        Args:
+            directory: Directory the index was saved to
+            mmap: Memory-map the embedding matrix instead of reading it;
+                adding documents later copies it into memory
+        
+        Returns:
+            The loaded DenseIndex
+        """
+        with open(os.path.join(directory, INFO_FILE), "r", encoding="utf-8") as f:
+            info = json.load(f)
+        
+        index = cls(info["dimension"])
+        index.matrix = np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode="r" if mmap else None)
+        index.doc_ids = np.load(os.path.join(directory, DOC_IDS_FILE))
+        index.live = np.ones(len(index.doc_ids), dtype=bool)
+        index.rows = {int(doc_id): row for row, doc_id in enumerate(index.doc_ids)}
+        return index
@@ -0,0 +1,133 @@
+import os
+import json
+import hashlib
+import tempfile
+from langchain.schema import Document
+
+def compute_file_hash(file_path, block_size=1024 * 1024):
+    """
+    Compute the SHA-256 hash of a file's content.
+    
+    Args:
+        file_path: Path to the file
+        block_size: Number of bytes read at a time
+    
+    Returns:
+        Hex digest of the file content
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class DocumentCache:
+    """On-disk cache of processed PDF documents keyed by content hash"""
+    
+    def __init__(self, cache_dir, processor_version):
+        """
+        Initialize the cache.
+        
+        Args:
+            cache_dir: Directory where cache entries are stored
+            processor_version: Version of the processing pipeline. Entries
+                written by a different version are ignored.
+        """
+        self.cache_dir = cache_dir
+        self.processor_version = processor_version
+        os.makedirs(self.cache_dir, exist_ok=True)
+        
+        # Mapping of source path -> content hash, used to drop stale entries
+        self.sources_path = os.path.join(self.cache_dir, "sources.json")
+        self.sources = self._read_json(self.sources_path) or {}
+    
+    def _entry_path(self, file_hash):
+        """Return the path of the cache entry for a content hash"""
+        return os.path.join(self.cache_dir, f"v{self.processor_version}-{file_hash}.json")
+    
+    def _read_json(self, path):
+        """Read a JSON file, returning None if it is missing or corrupt"""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def _write_json(self, path, data):
+        """Atomically write a JSON file"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    
+    def contains(self, file_hash):
+        """
+        Check whether the cache has an entry for a content hash, without
+        reading it.
+        
+        Args:
+            file_hash: Content hash of a PDF file
+        
+        Returns:
+            True if an entry of this processor version exists
+        """
+        return os.path.exists(self._entry_path(file_hash))
+    
+    def get(self, pdf_path, file_hash):
+        """
+        Load the processed documents of a PDF from the cache.
+        
+        Args:
+            pdf_path: Path to the PDF file
+            file_hash: Content hash of the PDF file
+        
+        Returns:
+            List of LangChain Document objects, or None on a cache miss
+        """
+        entry = self._read_json(self._entry_path(file_hash))
+        if not entry or entry.get("processor_version") != self.processor_version:
+            return None
+        
+        documents = []
+        for page_content, metadata in entry["chunks"]:
+            # The same content may live under a different path
+            metadata["source"] = pdf_path
+            documents.append(Document(page_content=page_content, metadata=metadata))
+        return documents
+    
+    def put(self, pdf_path, file_hash, documents, metadata=None):
+        """
+        Store the processed documents of a PDF in the cache.
+        
+        Args:
+            pdf_path: Path to the PDF file
+            file_hash: Content hash of the PDF file
+            documents: List of LangChain Document objects for the file
+            metadata: Optional file-level metadata (law name, page count, ...)
+        """
+        entry = {
+            "processor_version": self.processor_version,
+            "file_hash": file_hash,
+            "metadata": metadata or {},
+            "chunks": [[doc.page_content, doc.metadata] for doc in documents]
+        }
+        self._write_json(self._entry_path(file_hash), entry)
+        
+        # Editing or replacing a PDF invalidates only its previous entry
+        previous_hash = self.sources.get(pdf_path)
+        if previous_hash and previous_hash != file_hash and previous_hash not in self._live_hashes(pdf_path):
+            previous_entry = self._entry_path(previous_hash)
+            if os.path.exists(previous_entry):
+                os.remove(previous_entry)
+        
+        self.sources[pdf_path] = file_hash
+        self._write_json(self.sources_path, self.sources)
+    
+    def _live_hashes(self, excluded_path):
+        """Return hashes still referenced by sources other than excluded_path"""
+        return {h for path, h in self.sources.items() if path != excluded_path}
@@ -1,16 +1,161 @@
 import os
 import fitz  # PyMuPDF
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
 import re
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import arabic_reshaper
 from bidi.algorithm import get_display
+from utils.document_cache import DocumentCache, compute_file_hash
+
+# Bump whenever extraction, article markup or chunking changes so that
+# previously cached results are no longer used
+PROCESSOR_VERSION = 7
+
+# Chunking parameters
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+# Number of characters an article may grow to while streaming before its
+# complete pieces are split off and emitted
+STREAM_BUFFER_SIZE = 4 * CHUNK_SIZE
+
+# All forms of article references in both English and Arabic, matched in
+# a single pass:
+#   Article 5, المادة 5, Art. 5, Section 5 and القسم 5
+ARTICLE_PATTERN = re.compile(r'(?:Article\s+|المادة\s+|Art\.\s*|Section\s+|القسم\s+)(\d+)')
+
+# Article marker inserted by identify_articles
+ARTICLE_MARKER_PATTERN = re.compile(r'\[ARTICLE_(\d+)\]')
+
+# Any character of the Arabic block
+ARABIC_CHAR_PATTERN = re.compile(r'[\u0600-\u06FF]')
+
+# Character mapping applied when building the search form of a text:
+# - alef with hamza/madda and alef wasla -> bare alef
+# - alef maqsura -> yaa, taa marbuta -> haa
+# - Arabic-Indic and Extended Arabic-Indic digits -> ASCII digits
+# - tashkeel (harakat, tanween, shadda, sukun, superscript alef) and
+#   tatweel are removed
+_NORMALIZATION_TABLE = str.maketrans(
+    {
+        **{c: "ا" for c in "أإآٱ"},
+        "ى": "ي",
+        "ة": "ه",
+        **{chr(0x0660 + i): str(i) for i in range(10)},
+        **{chr(0x06F0 + i): str(i) for i in range(10)},
+        **{chr(c): None for c in range(0x064B, 0x0653)},
+        "\u0670": None,
+        "\u0640": None
+    }
+)
+
+# Runs of whitespace collapsed to a single space in the search form
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
+# Default location of the on-disk document cache
+DEFAULT_CACHE_DIR = os.path.join(".cache", "documents")
+
+def has_arabic_text(text):
+    """
+    Check whether a text contains Arabic characters.
+    
+    Args:
+        text: Text to check
+    
+    Returns:
+        True if the text contains at least one Arabic character
+    """
+    return ARABIC_CHAR_PATTERN.search(text) is not None
+
+def normalize_text(text):
+    """
+    Build the search form of a text.
+    
+    Latin text is case-folded; Arabic letter variants, diacritics, tatweel
+    and Arabic-Indic digits are folded to a single form so that spelling
+    variants match each other. Used once per chunk at ingest time and on
+    the (short) query at search time.
+    
+    Args:
+        text: Text to normalize
+    
+    Returns:
+        Normalized text
+    """
+    text = text.casefold().translate(_NORMALIZATION_TABLE)
+    return _WHITESPACE_PATTERN.sub(" ", text).strip()
+
+def iter_pdf_pages(pdf_path):
+    """
+    Read a PDF file page by page.
+    
+    Args:
+        pdf_path: Path to the PDF file
+        
+    Yields:
+        (page_number, page_text) tuples, with 1-based page numbers
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        for page_num in range(len(doc)):
+            yield page_num + 1, doc.load_page(page_num).get_text()
+    finally:
+        doc.close()
+
+def detect_law_name(pdf_path, first_page_text):
+    """
+    Detect the name of a law from the text of its first page.
+    
+    Args:
+        pdf_path: Path to the PDF file, used as a fallback name
+        first_page_text: Text of the first page
+        
+    Returns:
+        The detected law name
+    """
+    # Extract the law name from the filename or first few pages
+    law_name = os.path.basename(pdf_path).replace('.pdf', '')
+    
+    # Look for a title in the first page
+    lines = first_page_text.strip().split('\n')
+    if len(lines) > 1:
+        potential_title = lines[0].strip()
+        if len(potential_title) > 5:  # Assume it's a title if it's long enough
+            law_name = potential_title
+    
+    return law_name
+
+def read_pdf_summary(pdf_path):
+    """
+    Read the basic details of a PDF file from its first page only.
+    
+    Args:
+        pdf_path: Path to the PDF file
+    
+    Returns:
+        Dictionary with the detected law name, page count and whether the
+        first page contains Arabic text
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        first_page_text = doc.load_page(0).get_text() if len(doc) else ""
+        return {
+            "law_name": detect_law_name(pdf_path, first_page_text),
+            "page_count": len(doc),
+            "has_arabic": has_arabic_text(first_page_text)
+        }
+    finally:
+        doc.close()
 
 def extract_text_from_pdf(pdf_path):
     """
     Extract text from a PDF file and maintain structural information.
     Handle Arabic text properly with reshaping and bidirectional support.
     
+    This loads the whole document into memory; ingestion uses the streaming
+    iter_document_chunks instead.
+    
     Args:
         pdf_path: Path to the PDF file
         
@@ -18,47 +163,37 @@ def extract_text_from_pdf(pdf_path):
         A dictionary with the extracted text, metadata, and structured information
     """
     try:
-        doc = fitz.open(pdf_path)
-        text = ""
-        
         # Extract basic metadata
         metadata = {
             "source": pdf_path,
             "title": os.path.basename(pdf_path),
-            "num_pages": len(doc)
+            "num_pages": 0
         }
         
-        # Extract the law name from the filename or first few pages
         law_name = os.path.basename(pdf_path).replace('.pdf', '')
         
         # Check if the document contains Arabic text
         has_arabic = False
         
-        # Iterate through pages and extract text
-        for page_num, page in enumerate(doc):
-            page_text = page.get_text()
-            
+        # Collect the pages and join them once instead of growing a string
+        page_texts = []
+        for page_num, page_text in iter_pdf_pages(pdf_path):
             # Check for Arabic characters
-            if any(ord(c) in range(0x0600, 0x06FF) for c in page_text):
+            if not has_arabic and has_arabic_text(page_text):
                 has_arabic = True
             
-            text += f"\n===== Page {page_num + 1} =====\n{page_text}"
+            page_texts.append(f"\n===== Page {page_num} =====\n{page_text}")
             
             # Try to extract the actual law name from the first page
-            if page_num == 0:
-                # Look for a title in the first page
-                first_page_text = page_text.strip()
-                lines = first_page_text.split('\n')
-                if len(lines) > 1:
-                    potential_title = lines[0].strip()
-                    if len(potential_title) > 5:  # Assume it's a title if it's long enough
-                        law_name = potential_title
+            if page_num == 1:
+                law_name = detect_law_name(pdf_path, page_text)
         
+        metadata["num_pages"] = len(page_texts)
         metadata["law_name"] = law_name
         metadata["has_arabic"] = has_arabic
         
         return {
-            "text": text,
+            "text": "".join(page_texts),
             "metadata": metadata
         }
     except Exception as e:
@@ -78,90 +213,515 @@ def identify_articles(text):
     Returns:
         Structured text with article identifiers
     """
-    # Various patterns for article identification in both English and Arabic
-    article_patterns = [
-        r'Article\s+(\d+)',  # English: Article 5
-        r'المادة\s+(\d+)',   # Arabic: المادة 5
-        r'Art\.\s*(\d+)',    # Abbreviated: Art. 5
-        r'Section\s+(\d+)',  # Section 5
-        r'القسم\s+(\d+)'     # Arabic section
-    ]
-    
-    structured_text = text
-    
-    # Identify and mark up articles
-    for pattern in article_patterns:
-        structured_text = re.sub(
-            pattern,
-            r'[ARTICLE_\1]',  # Mark up with a standardized format
-            structured_text
+    # Identify and mark up articles with a standardized format; numbers
+    # are written in ASCII digits without leading zeros, so "المادة ٥" and
+    # "Article 5" get the same [ARTICLE_5] marker
+    return ARTICLE_PATTERN.sub(lambda match: f"[ARTICLE_{int(match.group(1))}]", text)
+
+def split_offsets(text, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    """
+    Split text into overlapping pieces, preferring paragraph, line and
+    word boundaries.
+    
+    Args:
+        text: Text to split
+        chunk_size: Maximum length of a piece
+        chunk_overlap: Number of characters shared by consecutive pieces
+    
+    Returns:
+        List of (start, end) offsets into text
+    """
+    offsets = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            # Cut at the last separator in the second half of the window
+            for separator in ("\n\n", "\n", " "):
+                cut = text.rfind(separator, start + chunk_size // 2, end)
+                if cut >= 0:
+                    end = cut + len(separator)
+                    break
+        offsets.append((start, end))
+        if end >= len(text):
+            break
+        
+        # Start the next piece on a word boundary inside the overlap
+        next_start = max(end - chunk_overlap, start + 1)
+        boundary = text.find(" ", next_start, end)
+        start = boundary + 1 if boundary >= 0 else next_start
+    
+    return offsets
+
+class ArticleChunker:
+    """
+    Streaming chunker that aligns chunks with article boundaries.
+    
+    Text marked up by identify_articles is fed in pieces and cut into
+    segments at every [ARTICLE_n] marker. Short consecutive segments are
+    packed into one chunk and articles longer than a chunk are split into
+    overlapping pieces. Every chunk records where each article's text lies
+    inside it, so articles can be reassembled without searching, and its
+    offset in the stream, so it can be mapped back to pages.
+    """
+    
+    def __init__(self, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP,
+                 stream_buffer_size=STREAM_BUFFER_SIZE):
+        """
+        Initialize the chunker.
+        
+        Args:
+            chunk_size: Maximum length of a chunk
+            chunk_overlap: Overlap between the pieces of a split article
+            stream_buffer_size: Length an open article may reach before its
+                complete pieces are emitted
+        """
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.stream_buffer_size = stream_buffer_size
+        
+        # Number of characters fed so far
+        self.stream_position = 0
+        
+        # Segment currently being read: article number (None before the
+        # first article), text parts, stream offset and the number of
+        # leading characters that were already emitted as overlap
+        self.open_article = None
+        self.open_parts = []
+        self.open_length = 0
+        self.open_start = 0
+        self.open_emitted = 0
+        
+        # Completed segments waiting to be packed into a chunk
+        self.packed = []
+        self.packed_length = 0
+    
+    def feed(self, text):
+        """
+        Add marked-up text to the stream.
+        
+        Args:
+            text: The next piece of the document
+        
+        Yields:
+            (chunk_text, article_spans, stream_offset) tuples for every
+            completed chunk
+        """
+        base = self.stream_position
+        self.stream_position += len(text)
+        
+        position = 0
+        for match in ARTICLE_MARKER_PATTERN.finditer(text):
+            self._append(text[position:match.start()], base + position)
+            yield from self._close_segment()
+            self.open_article = match.group(1)
+            position = match.start()
+        self._append(text[position:], base + position)
+        
+        if self.open_length > self.stream_buffer_size:
+            yield from self._emit_open_pieces()
+    
+    def finish(self):
+        """
+        Flush the remaining text at the end of the document.
+        
+        Yields:
+            (chunk_text, article_spans, stream_offset) tuples for the
+            remaining chunks
+        """
+        yield from self._close_segment()
+        yield from self._flush_packed()
+    
+    def _append(self, text, stream_offset):
+        """Append text starting at stream_offset to the open segment"""
+        if text:
+            if not self.open_parts:
+                self.open_start = stream_offset
+            self.open_parts.append(text)
+            self.open_length += len(text)
+    
+    def _take_open_segment(self):
+        """Remove and return the open segment as (article, text, emitted, start)"""
+        segment = (self.open_article, "".join(self.open_parts), self.open_emitted, self.open_start)
+        self.open_parts = []
+        self.open_length = 0
+        self.open_emitted = 0
+        return segment
+    
+    def _close_segment(self):
+        """Close the open segment and pack or split it"""
+        article, text, emitted, start = self._take_open_segment()
+        if not text.strip():
+            return
+        
+        if len(text) > self.chunk_size:
+            # Long article: emit it as overlapping pieces of its own
+            yield from self._flush_packed()
+            yield from self._emit_pieces(article, text, emitted, start, keep_last=False)
+            return
+        
+        if self.packed_length + len(text) > self.chunk_size:
+            yield from self._flush_packed()
+        self.packed.append((article, text, emitted, start))
+        self.packed_length += len(text)
+    
+    def _emit_open_pieces(self):
+        """Emit the complete pieces of an open segment that grew too long"""
+        yield from self._flush_packed()
+        article, text, emitted, start = self._take_open_segment()
+        yield from self._emit_pieces(article, text, emitted, start, keep_last=True)
+    
+    def _emit_pieces(self, article, text, emitted, segment_start, keep_last):
+        """
+        Split a segment into pieces and emit them. With keep_last, the last
+        piece stays open because the segment continues.
+        """
+        offsets = split_offsets(text, self.chunk_size, self.chunk_overlap)
+        if keep_last:
+            offsets, (last_start, _) = offsets[:-1], offsets[-1]
+        
+        previous_end = emitted
+        for start, end in offsets:
+            piece = text[start:end]
+            new_from = max(previous_end - start, 0)
+            spans = [[article, new_from, len(piece)]] if article is not None else []
+            previous_end = end
+            yield piece, spans, segment_start + start
+        
+        if keep_last:
+            self.open_article = article
+            self._append(text[last_start:], segment_start + last_start)
+            self.open_emitted = max(previous_end - last_start, 0)
+    
+    def _flush_packed(self):
+        """Emit the packed segments as one chunk"""
+        if not self.packed:
+            return
+        
+        parts = []
+        spans = []
+        offset = 0
+        for article, text, emitted, _ in self.packed:
+            if article is not None:
+                spans.append([article, offset + emitted, offset + len(text)])
+            parts.append(text)
+            offset += len(text)
+        
+        chunk_start = self.packed[0][3]
+        self.packed = []
+        self.packed_length = 0
+        yield "".join(parts), spans, chunk_start
+
+def iter_document_chunks(pdf_path):
+    """
+    Stream a PDF file as chunked LangChain documents.
+    
+    Pages are read, marked up and chunked one at a time along article
+    boundaries. Only text that has not been turned into chunks yet is kept
+    in memory, so peak memory is bounded by a few pages regardless of the
+    document size.
+    
+    Args:
+        pdf_path: Path to the PDF file
+    
+    Yields:
+        LangChain Document objects in document order. The "has_arabic"
+        flag describes the chunk itself and "total_chunks" is not set,
+        since neither the whole document nor the final chunk count is
+        known while streaming.
+    """
+    chunker = ArticleChunker()
+    law_name = os.path.basename(pdf_path).replace('.pdf', '')
+    chunk_index = 0
+    
+    # Stream offset at which each page starts, in page order
+    page_offsets = []
+    
+    def make_document(chunk, article_spans, chunk_start):
+        # Map the chunk's first and last character to their pages
+        page_start = bisect_right(page_offsets, chunk_start)
+        page_end = bisect_right(page_offsets, chunk_start + len(chunk) - 1)
+        if page_start == page_end:
+            page_num = str(page_start)
+        else:
+            page_num = f"{page_start}-{page_end}"
+        
+        articles = [span[0] for span in article_spans]
+        return Document(
+            page_content=chunk,
+            metadata={
+                "source": pdf_path,
+                "law_name": law_name,
+                "has_arabic": has_arabic_text(chunk),
+                "chunk": chunk_index,
+                "page": page_num,
+                "page_start": page_start,
+                "page_end": page_end,
+                "article_start": articles[0] if articles else None,
+                "article_end": articles[-1] if articles else None,
+                "article_spans": article_spans,
+                # Offset of the chunk in the document's text stream
+                "offset": chunk_start,
+                # Normalized form of the chunk used for searching
+                "search_text": normalize_text(chunk)
+            }
         )
     
-    return structured_text
+    for page_num, page_text in iter_pdf_pages(pdf_path):
+        if page_num == 1:
+            law_name = detect_law_name(pdf_path, page_text)
+        
+        # Identify and structure articles on this page
+        page_offsets.append(chunker.stream_position)
+        for chunk, article_spans, chunk_start in chunker.feed(identify_articles(page_text) + "\n"):
+            yield make_document(chunk, article_spans, chunk_start)
+            chunk_index += 1
+    
+    for chunk, article_spans, chunk_start in chunker.finish():
+        yield make_document(chunk, article_spans, chunk_start)
+        chunk_index += 1
+
+def process_pdf(pdf_path):
+    """
+    Process a single PDF file into chunked LangChain documents.
+    
+    Args:
+        pdf_path: Path to the PDF file
+        
+    Returns:
+        List of LangChain Document objects for this file
+    """
+    documents = list(iter_document_chunks(pdf_path))
+    
+    # Once the whole file is known, record file-level metadata on every chunk
+    has_arabic = any(doc.metadata["has_arabic"] for doc in documents)
+    for doc in documents:
+        doc.metadata["has_arabic"] = has_arabic
+        doc.metadata["total_chunks"] = len(documents)
+    
+    return documents
+
+def discover_pdf_files(root_dir="."):
+    """
+    Find all PDF files below a directory, each file exactly once.
+    
+    Args:
+        root_dir: Directory to search recursively
+    
+    Returns:
+        Sorted list of PDF paths relative to root_dir
+    """
+    pdf_files = {}
+    real_root = os.path.realpath(root_dir)
+    for dir_path, dir_names, file_names in os.walk(root_dir, followlinks=True):
+        # Skip hidden directories such as .git and the cache
+        dir_names[:] = sorted(name for name in dir_names if not name.startswith("."))
+        for file_name in file_names:
+            if not file_name.lower().endswith(".pdf"):
+                continue
+            path = os.path.join(dir_path, file_name)
+            # Symlinks and repeated directories resolve to the same file
+            canonical_path = os.path.realpath(path)
+            if canonical_path in pdf_files:
+                continue
+            if canonical_path.startswith(real_root + os.sep):
+                pdf_files[canonical_path] = os.path.relpath(canonical_path, real_root)
+            else:
+                pdf_files[canonical_path] = os.path.normpath(os.path.relpath(path, root_dir))
+    
+    return sorted(pdf_files.values())
+
+def iter_processed_pdfs(pdf_paths, max_workers=None, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Process PDF files one after the other, yielding the documents of each
+    file as soon as it is done, so a caller that indexes them right away
+    never holds more than a few files' documents.
+    
+    Files are extracted and chunked in a pool of worker processes, with at
+    most two files per worker submitted ahead of the file being yielded.
+    Files are yielded in the order of pdf_paths regardless of which worker
+    finishes first, and a failure in one file does not affect the others.
+    Unchanged files are loaded from the on-disk cache instead, and files
+    with the same content as an earlier file are skipped.
+    
+    Args:
+        pdf_paths: List of paths to PDF files
+        max_workers: Number of worker processes. None uses one worker per
+            CPU core (capped at the number of files); 1 processes the files
+            sequentially in the current process.
+        cache_dir: Directory of the document cache, or None to disable caching
+        
+    Yields:
+        (pdf_path, documents) tuples; documents is empty for a file that
+        could not be read or processed, and skipped copies are not yielded
+    """
+    pdf_paths = list(pdf_paths)
+    cache = DocumentCache(cache_dir, PROCESSOR_VERSION) if cache_dir else None
+    
+    # (position, file hash) of every file to yield, with no hash for the
+    # unreadable ones; identical files are only processed once
+    files = []
+    seen_hashes = {}
+    for position, pdf_path in enumerate(pdf_paths):
+        try:
+            file_hash = compute_file_hash(pdf_path)
+        except OSError as e:
+            print(f"Error reading {pdf_path}: {e}")
+            files.append((position, None))
+            continue
+        if file_hash in seen_hashes:
+            print(f"Skipping {pdf_path}: same content as {seen_hashes[file_hash]}")
+            continue
+        seen_hashes[file_hash] = pdf_path
+        files.append((position, file_hash))
+    
+    if max_workers is None:
+        max_workers = min(os.cpu_count() or 1, len(files))
+    
+    executor = ProcessPoolExecutor(max_workers=max_workers) if max_workers > 1 and files else None
+    # Position -> future of the files submitted to the pool
+    futures = {}
+    try:
+        for index, (position, file_hash) in enumerate(files):
+            pdf_path = pdf_paths[position]
+            if file_hash is None:
+                yield pdf_path, []
+                continue
+            if executor is not None:
+                # Keep the pool busy with the next files missing from the cache
+                for ahead_position, ahead_hash in files[index:index + 2 * max_workers]:
+                    if ahead_hash is None or ahead_position in futures:
+                        continue
+                    if not (cache and cache.contains(ahead_hash)):
+                        futures[ahead_position] = executor.submit(process_pdf, pdf_paths[ahead_position])
+            
+            file_documents = cache.get(pdf_path, file_hash) if cache and position not in futures else None
+            cached = file_documents is not None
+            if not cached:
+                try:
+                    future = futures.pop(position, None)
+                    file_documents = future.result() if future is not None else process_pdf(pdf_path)
+                except Exception as e:
+                    # Isolate the failure to this file and keep going
+                    print(f"Error processing {pdf_path}: {e}")
+                    file_documents = []
+            
+            if cache and not cached and file_documents:
+                try:
+                    cache.put(
+                        pdf_path,
+                        file_hash,
+                        file_documents,
+                        metadata={
+                            "law_name": file_documents[0].metadata.get("law_name"),
+                            "has_arabic": file_documents[0].metadata.get("has_arabic", False)
+                        }
+                    )
+                except OSError as e:
+                    print(f"Error caching {pdf_path}: {e}")
+            
+            # Record the content hash so the corpus can be synced incrementally
+            for doc in file_documents:
+                doc.metadata["file_hash"] = file_hash
+            yield pdf_path, file_documents
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
 
-def process_pdfs(pdf_paths):
+def process_pdfs(pdf_paths, max_workers=None, cache_dir=DEFAULT_CACHE_DIR):
     """
     Process multiple PDF files for use with LangChain.
     Properly handle Arabic text with bidirectional support.
     
+    Collects the documents of iter_processed_pdfs; indexing the files as
+    they are yielded keeps memory bounded instead.
+    
     Args:
         pdf_paths: List of paths to PDF files
+        max_workers: Number of worker processes, as for iter_processed_pdfs
+        cache_dir: Directory of the document cache, or None to disable caching
         
     Returns:
         List of LangChain Document objects
     """
     documents = []
+    for _, file_documents in iter_processed_pdfs(pdf_paths, max_workers=max_workers, cache_dir=cache_dir):
+        documents.extend(file_documents)
+    return documents
+
+def sync_corpus(vector_store, pdf_paths, max_workers=None, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Bring an existing vector store in line with the PDF files on disk.
+    Only new or changed files are processed and deleted files are removed,
+    so the cost is proportional to the change rather than the corpus.
     
-    for pdf_path in pdf_paths:
-        extracted_data = extract_text_from_pdf(pdf_path)
+    A changed file that yields no documents (unreadable or corrupt) keeps
+    its previously indexed version and is reported as failed. It is not
+    processed again until its content changes.
+    
+    Args:
+        vector_store: VectorStore to update in place
+        pdf_paths: List of paths to the PDF files that should be indexed
+        max_workers: Number of worker processes used for changed files
+        cache_dir: Directory of the document cache, or None to disable caching
         
-        if extracted_data:
-            # Get the text and check if it contains Arabic
-            text = extracted_data["text"]
-            has_arabic = extracted_data["metadata"].get("has_arabic", False)
-            
-            # If document contains Arabic, ensure proper bidirectional text handling
-            if has_arabic:
-                # We don't reshape the entire document here as it might break structure
-                # but we'll mark it for later processing
-                extracted_data["metadata"]["has_arabic"] = True
-            
-            # Identify and structure articles
-            structured_text = identify_articles(text)
-            
-            # Create text splitter for chunking
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=200,
-                length_function=len,
-                separators=["\n\n", "\n", " ", ""]
-            )
-            
-            # Split the document into chunks
-            chunks = text_splitter.split_text(structured_text)
-            
-            # Create LangChain documents with metadata
-            for i, chunk in enumerate(chunks):
-                # Extract page number from the chunk if possible
-                page_num = "Unknown"
-                page_match = re.search(r'===== Page (\d+) =====', chunk)
-                if page_match:
-                    page_num = page_match.group(1)
-                
-                doc = Document(
-                    page_content=chunk,
-                    metadata={
-                        "source": extracted_data["metadata"]["source"],
-                        "law_name": extracted_data["metadata"]["law_name"],
-                        "has_arabic": has_arabic,
-                        "chunk": i,
-                        "total_chunks": len(chunks),
-                        "page": page_num
-                    }
-                )
-                documents.append(doc)
+    Returns:
+        Dictionary with lists of "added", "updated", "removed" and "failed"
+        sources
+    """
+    changes = {"added": [], "updated": [], "removed": [], "failed": []}
+    pdf_paths = list(dict.fromkeys(pdf_paths))
+    wanted = set(pdf_paths)
     
-    return documents
+    # Remove files that no longer exist
+    for source in list(vector_store.indexed_files):
+        if source not in wanted:
+            vector_store.remove_source(source)
+            changes["removed"].append(source)
+    for source in list(vector_store.failed_files):
+        if source not in wanted:
+            del vector_store.failed_files[source]
+    
+    # Find new and changed files
+    indexed_hashes = set(vector_store.indexed_files.values())
+    changed = []
+    changed_hashes = set()
+    for pdf_path in pdf_paths:
+        indexed_hash = vector_store.indexed_files.get(pdf_path)
+        try:
+            file_hash = compute_file_hash(pdf_path)
+        except OSError as e:
+            print(f"Error reading {pdf_path}: {e}")
+            continue
+        if file_hash == indexed_hash or vector_store.failed_files.get(pdf_path) == file_hash:
+            continue
+        # Copies of an already indexed or changed file are not indexed again
+        if pdf_path not in vector_store.indexed_files and (file_hash in indexed_hashes or file_hash in changed_hashes):
+            continue
+        changed.append((pdf_path, file_hash))
+        changed_hashes.add(file_hash)
+    
+    # Every changed file is indexed as soon as it is processed
+    file_hashes = dict(changed)
+    processed = iter_processed_pdfs(list(file_hashes), max_workers=max_workers, cache_dir=cache_dir)
+    for pdf_path, file_documents in processed:
+        if not file_documents:
+            continue
+        del file_hashes[pdf_path]
+        vector_store.failed_files.pop(pdf_path, None)
+        if pdf_path in vector_store.indexed_files:
+            vector_store.remove_source(pdf_path)
+            changes["updated"].append(pdf_path)
+        else:
+            changes["added"].append(pdf_path)
+        vector_store.add_documents(file_documents)
+    
+    # Files that produced no documents keep their indexed version, if any
+    for pdf_path, file_hash in file_hashes.items():
+        vector_store.failed_files[pdf_path] = file_hash
+        changes["failed"].append(pdf_path)
+    
+    return changes
 
 def get_available_laws(documents):
     """
@@ -181,7 +741,35 @@ def get_available_laws(documents):
     
     return sorted(list(law_names))
 
-def extract_article_by_number(documents, law_name, article_number):
+def build_article_index(documents):
+    """
+    Build an index of where every article's text lies in the chunks.
+    
+    Args:
+        documents: List of processed Document objects
+    
+    Returns:
+        Dictionary mapping (law_name, article_number) to a list of
+        (Document, start, end) spans in document order
+    """
+    article_index = {}
+    for doc in documents:
+        add_to_article_index(article_index, doc)
+    return article_index
+
+def add_to_article_index(article_index, doc):
+    """
+    Add the article spans of a single document to an article index.
+    
+    Args:
+        article_index: Index built by build_article_index
+        doc: Processed Document object
+    """
+    law_name = doc.metadata.get("law_name")
+    for article_number, start, end in doc.metadata.get("article_spans") or []:
+        article_index.setdefault((law_name, str(article_number)), []).append((doc, start, end))
+
+def extract_article_by_number(documents, law_name, article_number, article_index=None):
     """
     Extract a specific article from a law.
     Handle Arabic text properly with reshaping and bidirectional support.
@@ -190,47 +778,31 @@ def extract_article_by_number(documents, law_name, article_number):
         documents: List of processed Document objects
         law_name: Name of the law to search in
         article_number: Article number to extract
-        
+        article_index: Optional index built by build_article_index. Without
+            it the index is built from documents first.
+    
     Returns:
         Text of the specific article if found, None otherwise
     """
-    article_marker = f"[ARTICLE_{article_number}]"
-    
-    relevant_chunks = []
-    has_arabic = False
+    if article_index is None:
+        article_index = build_article_index(documents)
     
-    # Find chunks containing the article
-    for doc in documents:
-        if doc.metadata.get("law_name") == law_name and article_marker in doc.page_content:
-            relevant_chunks.append(doc)
-            if doc.metadata.get("has_arabic", False):
-                has_arabic = True
-    
-    if not relevant_chunks:
+    spans = article_index.get((law_name, str(article_number)))
+    if not spans:
         return None
     
-    # Combine chunks to get the full article
+    # Combine the spans to get the full article
     article_text = ""
-    for chunk in relevant_chunks:
-        text = chunk.page_content
-        
-        # Extract text starting from the article marker
-        start_pos = text.find(article_marker)
-        if start_pos >= 0:
-            # Find the next article marker if it exists
-            next_article_pos = -1
-            for match in re.finditer(r'\[ARTICLE_\d+\]', text[start_pos+len(article_marker):]):
-                next_article_pos = start_pos + len(article_marker) + match.start()
-                break
-            
-            if next_article_pos >= 0:
-                article_text += text[start_pos:next_article_pos] + " "
-            else:
-                article_text += text[start_pos:] + " "
+    has_arabic = False
+    for doc, start, end in spans:
+        article_text += doc.page_content[start:end] + " "
+        if doc.metadata.get("has_arabic", False):
+            has_arabic = True
     
     # Clean up the article marker
+    article_marker = f"[ARTICLE_{article_number}]"
     if has_arabic:
-        article_label = f"المادة {article_number}" 
+        article_label = f"المادة {article_number}"
     else:
         article_label = f"Article {article_number}"
     
@@ -0,0 +1,185 @@
+from array import array
+import numpy as np
+
+# Size of the character n-grams that index the terms
+NGRAM_SIZE = 3
+
+# Padding around a term before it is cut into n-grams, so its first and
+# last characters take part in as many n-grams as the inner ones
+NGRAM_PADDING = " " * (NGRAM_SIZE - 1)
+
+# Variants of a query term kept by fuzzy expansion, closest first
+MAX_EXPANSIONS = 10
+
+def auto_max_edits(term):
+    """
+    Return the edit distance allowed for a term by its length: none for
+    terms of up to two characters, one up to five and two beyond.
+    
+    Args:
+        term: Index term
+    
+    Returns:
+        Largest allowed edit distance
+    """
+    if len(term) < 3:
+        return 0
+    if len(term) < 6:
+        return 1
+    return 2
+
+def term_ngrams(term):
+    """Return the set of padded character n-grams of a term"""
+    padded = f"{NGRAM_PADDING}{term}{NGRAM_PADDING}"
+    return {padded[start:start + NGRAM_SIZE] for start in range(len(padded) - NGRAM_SIZE + 1)}
+
+def bounded_edit_distance(first, second, max_distance):
+    """
+    Compute the edit distance of two strings, counting insertions,
+    deletions, substitutions and swaps of adjacent characters (which OCR
+    produces often) as one edit each. Only the diagonal band of width
+    max_distance is computed, and the computation stops as soon as the
+    distance is known to exceed max_distance.
+    
+    Args:
+        first: First string
+        second: Second string
+        max_distance: Largest distance of interest
+    
+    Returns:
+        The distance, or max_distance + 1 if it is larger than max_distance
+    """
+    if abs(len(first) - len(second)) > max_distance:
+        return max_distance + 1
+    if first == second:
+        return 0
+    
+    beyond = max_distance + 1
+    # Rows of the dynamic programming table: two rows back, previous, current
+    before = None
+    previous = list(range(len(second) + 1))
+    for row in range(1, len(first) + 1):
+        current = [beyond] * (len(second) + 1)
+        if row <= max_distance:
+            current[0] = row
+        low = max(1, row - max_distance)
+        high = min(len(second), row + max_distance)
+        for column in range(low, high + 1):
+            cost = 0 if first[row - 1] == second[column - 1] else 1
+            distance = min(previous[column] + 1, current[column - 1] + 1, previous[column - 1] + cost)
+            if (row > 1 and column > 1 and first[row - 1] == second[column - 2]
+                    and first[row - 2] == second[column - 1]):
+                distance = min(distance, before[column - 2] + 1)
+            current[column] = min(distance, beyond)
+        if min(current[low - 1:high + 1]) > max_distance:
+            return beyond
+        before, previous = previous, current
+    return previous[len(second)]
+
+class TrigramIndex:
+    """
+    Character trigram index over a term vocabulary, used to find the
+    indexed terms within a small edit distance of a query term without
+    comparing it to the whole vocabulary.
+    
+    Every term is listed under each of its padded trigrams. An edit
+    changes at most 4 trigrams (a swap of adjacent characters touches
+    every trigram that covers either of them), so a term within d edits
+    of the query term shares all but at most 4 * d of the query term's
+    trigrams. Only the terms found under enough of those trigrams, and
+    with a length at most d apart, are compared exactly.
+    """
+    
+    def __init__(self, terms=()):
+        """
+        Initialize the index.
+        
+        Args:
+            terms: Iterable of the terms to index
+        """
+        # term id -> term and term length
+        self.terms = []
+        self.lengths = array("i")
+        # term -> term id
+        self.term_ids = {}
+        # trigram -> ids of the terms that contain it
+        self.postings = {}
+        self.add_terms(terms)
+    
+    def __len__(self):
+        """Return the number of indexed terms"""
+        return len(self.terms)
+    
+    def add_terms(self, terms):
+        """
+        Index the terms that are not indexed yet.
+        
+        Args:
+            terms: Iterable of terms
+        """
+        for term in terms:
+            if term in self.term_ids:
+                continue
+            term_id = len(self.terms)
+            self.term_ids[term] = term_id
+            self.terms.append(term)
+            self.lengths.append(len(term))
+            for ngram in term_ngrams(term):
+                postings = self.postings.get(ngram)
+                if postings is None:
+                    postings = self.postings[ngram] = array("i")
+                postings.append(term_id)
+    
+    def candidates(self, term, max_edits):
+        """
+        Find the indexed terms that may be within max_edits of a term.
+        
+        Terms sharing no trigram with the term are never candidates, so a
+        large max_edits on a short term can miss matches.
+        
+        Args:
+            term: Query term
+            max_edits: Largest allowed edit distance
+        
+        Returns:
+            List of candidate terms
+        """
+        ngrams = term_ngrams(term)
+        lists = [np.array(self.postings[ngram], dtype=np.int64) for ngram in ngrams if ngram in self.postings]
+        if not lists:
+            return []
+        
+        # Count the shared trigrams of every term found under any of them;
+        # one edit removes up to NGRAM_SIZE + 1 of them
+        term_ids, shared = np.unique(np.concatenate(lists), return_counts=True)
+        term_ids = term_ids[shared >= max(1, len(ngrams) - (NGRAM_SIZE + 1) * max_edits)]
+        lengths = np.frombuffer(self.lengths, dtype=np.int32)[term_ids]
+        term_ids = term_ids[np.abs(lengths - len(term)) <= max_edits]
+        return [self.terms[term_id] for term_id in term_ids.tolist()]
+    
+    def expand(self, term, max_edits=None, limit=MAX_EXPANSIONS):
+        """
+        Find the indexed variants of a term.
+        
+        Args:
+            term: Query term
+            max_edits: Largest allowed edit distance (default: by term
+                length, see auto_max_edits)
+            limit: Largest number of variants to return
+        
+        Returns:
+            List of (variant, edit distance) tuples, closest first; the
+            term itself comes first when it is indexed
+        """
+        if max_edits is None:
+            max_edits = auto_max_edits(term)
+        if max_edits <= 0:
+            return [(term, 0)] if term in self.term_ids else []
+        
+        variants = []
+        for candidate in self.candidates(term, max_edits):
+            distance = bounded_edit_distance(term, candidate, max_edits)
+            if distance <= max_edits:
+                variants.append((distance, candidate))
+        variants.sort()
+        return [(candidate, distance) for distance, candidate in variants[:limit]]
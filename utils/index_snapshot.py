@@ -0,0 +1,125 @@
+import os
+import json
+import shutil
+import hashlib
+
+# On-disk format of saved search indexes. The version is bumped whenever
+# the layout of the files or the way their contents are built changes;
+# snapshots of other versions are rejected and have to be rebuilt.
+# Version 2: near duplicates are only merged within a law.
+# Version 3: article markers are written in ASCII digits.
+SNAPSHOT_FORMAT = "ankaa-search-index"
+SNAPSHOT_VERSION = 3
+
+# Lists the snapshot's files with their sizes, modification times and
+# checksums
+MANIFEST_FILE = "manifest.json"
+
+def file_checksum(path, block_size=1024 * 1024):
+    """
+    Compute the BLAKE2b checksum of a file's content.
+    
+    Args:
+        path: Path to the file
+        block_size: Number of bytes read at a time
+    
+    Returns:
+        Hex digest of the file content
+    """
+    digest = hashlib.blake2b()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def write_manifest(directory, info):
+    """
+    Write the manifest of a snapshot directory, with the checksum of every
+    file already in it.
+    
+    Args:
+        directory: Snapshot directory
+        info: JSON-serializable dictionary stored with the manifest
+    """
+    files = {}
+    for root, _, names in os.walk(directory):
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, directory).replace(os.sep, "/")
+            if relative == MANIFEST_FILE:
+                continue
+            stat = os.stat(path)
+            files[relative] = {"bytes": stat.st_size, "mtime_ns": stat.st_mtime_ns, "blake2b": file_checksum(path)}
+    
+    with open(os.path.join(directory, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump({
+            "format": SNAPSHOT_FORMAT,
+            "version": SNAPSHOT_VERSION,
+            "info": info,
+            "files": files
+        }, f, ensure_ascii=False)
+
+def read_manifest(directory, verify=True):
+    """
+    Read and check the manifest of a snapshot directory.
+    
+    Args:
+        directory: Snapshot directory
+        verify: Also compare files with their recorded checksums. Only
+            the files whose modification time changed since the snapshot
+            was written are read, so an untouched snapshot loads without
+            reading it; "full" reads and checks every file
+    
+    Returns:
+        The info dictionary stored with the manifest
+    
+    Raises:
+        ValueError: If the snapshot has another format or version, or a
+            file is missing, truncated or corrupt
+    """
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ValueError(f"Unreadable index snapshot manifest in {directory}: {e}")
+    
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"{directory} is not an index snapshot")
+    if manifest.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(
+            f"Index snapshot version {manifest.get('version')} is not supported "
+            f"(expected {SNAPSHOT_VERSION}); rebuild the index"
+        )
+    
+    for relative, expected in manifest["files"].items():
+        path = os.path.join(directory, *relative.split("/"))
+        if not os.path.isfile(path):
+            raise ValueError(f"Index snapshot file {relative} is missing or truncated")
+        stat = os.stat(path)
+        if stat.st_size != expected["bytes"]:
+            raise ValueError(f"Index snapshot file {relative} is missing or truncated")
+        # Manifests without modification times have every file checked
+        unchanged = verify != "full" and stat.st_mtime_ns == expected.get("mtime_ns")
+        if verify and not unchanged and file_checksum(path) != expected["blake2b"]:
+            raise ValueError(f"Index snapshot file {relative} is corrupt")
+    
+    return manifest["info"]
+
+def replace_directory(new_directory, directory):
+    """
+    Move a freshly written snapshot into place. The old snapshot is moved
+    aside first, so processes that have it memory-mapped keep reading
+    consistent files, and a crash never leaves a half-written snapshot
+    under the final name.
+    
+    Args:
+        new_directory: Directory holding the new snapshot
+        directory: Final snapshot directory
+    """
+    old_directory = f"{directory}.old"
+    if os.path.exists(old_directory):
+        shutil.rmtree(old_directory)
+    if os.path.exists(directory):
+        os.replace(directory, old_directory)
+    os.replace(new_directory, directory)
+    shutil.rmtree(old_directory, ignore_errors=True)
@@ -0,0 +1,930 @@
+import os
+import math
+import json
+import heapq
+from array import array
+from bisect import bisect_left
+from collections.abc import MutableMapping
+import numpy as np
+from utils.search_filters import ranges_mask
+
+# BM25 parameters
+DEFAULT_K1 = 1.5
+DEFAULT_B = 0.75
+
+# Relative slack of the pruning tests of top_k, so that rounding in the
+# partial sums never prunes a document that ties the k-th best score
+PRUNING_TOLERANCE = 1e-9
+
+# Multiplier that packs a (doc_id, position) pair into one int64 key;
+# positions are term offsets inside a document and stay below it
+POSITION_STRIDE = 1 << 32
+
+# File names of a saved inverted index
+VOCABULARY_FILE = "vocabulary.json"
+INDEX_INFO_FILE = "inverted_index.json"
+INDEX_ARRAYS = (
+    "postings_offsets", "doc_ids", "frequencies",
+    "position_offsets", "positions", "doc_lengths"
+)
+
+def bm25_idf(document_count, document_frequency):
+    """Return the BM25 inverse document frequency of a term found in document_frequency of document_count documents"""
+    return math.log(1 + (document_count - document_frequency + 0.5) / (document_frequency + 0.5))
+
+def _writable(postings):
+    """Return postings as growable arrays, copying read-only views of a loaded index"""
+    if type(postings[0]) is array:
+        return postings
+    doc_ids, frequencies, positions = postings
+    return (array("q", doc_ids), array("l", frequencies), array("i", positions))
+
+class MappedPostings(MutableMapping):
+    """
+    term -> postings mapping backed by flat postings arrays (see
+    InvertedIndex.flatten), either memory-mapped from saved files or built
+    in memory for a sealed segment.
+    
+    The postings of a term are served as read-only memoryview slices of
+    the arrays, so nothing is copied at load time and processes that load
+    the same files share their pages. Terms that are written afterwards
+    are kept in memory and shadow the flat ones.
+    """
+    
+    def __init__(self, vocabulary, postings_offsets, doc_ids, frequencies, position_offsets, positions):
+        """
+        Initialize the mapping from the flat arrays.
+        
+        Args:
+            vocabulary: Dictionary of term -> row
+            postings_offsets: Start of every row's postings, plus the end
+            doc_ids: int64 array of the doc ids of all rows
+            frequencies: int64 array of the term frequencies of all rows
+            position_offsets: Start of every row's positions, plus the end
+            positions: int32 array of the positions of all rows
+        """
+        self.vocabulary = vocabulary
+        self.arrays = (postings_offsets, doc_ids, frequencies, position_offsets, positions)
+        # memoryviews index and iterate as plain Python ints
+        self.postings_offsets = memoryview(postings_offsets)
+        self.doc_ids = memoryview(doc_ids)
+        self.frequencies = memoryview(frequencies)
+        self.position_offsets = memoryview(position_offsets)
+        self.positions = memoryview(positions)
+        # Terms written since loading, and saved terms deleted since
+        self.changed = {}
+        self.removed = set()
+        # Running sum of the frequencies, which is where every posting's
+        # positions start; built on the first positional lookup
+        self.frequency_sums = None
+    
+    def get(self, term, default=None):
+        postings = self.changed.get(term)
+        if postings is not None:
+            return postings
+        row = self.vocabulary.get(term)
+        if row is None or term in self.removed:
+            return default
+        start, end = self.postings_offsets[row], self.postings_offsets[row + 1]
+        position_start, position_end = self.position_offsets[row], self.position_offsets[row + 1]
+        return (
+            self.doc_ids[start:end],
+            self.frequencies[start:end],
+            self.positions[position_start:position_end]
+        )
+    
+    def position_starts(self, term, rows):
+        """
+        Find where the positions of some of a term's postings start, without
+        reading the term's other postings.
+        
+        Args:
+            term: Term of the flat arrays that was not written since
+            rows: int64 array of indexes into the term's postings
+        
+        Returns:
+            int64 array with the offset of every row's positions in the
+            term's positions
+        """
+        if self.frequency_sums is None:
+            frequencies = np.asarray(self.arrays[2], dtype=np.int64)
+            self.frequency_sums = np.concatenate([[0], np.cumsum(frequencies)])
+        start = self.postings_offsets[self.vocabulary[term]]
+        return self.frequency_sums[start + rows] - self.frequency_sums[start]
+    
+    def __getitem__(self, term):
+        postings = self.get(term)
+        if postings is None:
+            raise KeyError(term)
+        return postings
+    
+    def __contains__(self, term):
+        return term in self.changed or (term in self.vocabulary and term not in self.removed)
+    
+    def __setitem__(self, term, postings):
+        self.changed[term] = postings
+        self.removed.discard(term)
+    
+    def __delitem__(self, term):
+        if term not in self:
+            raise KeyError(term)
+        self.changed.pop(term, None)
+        if term in self.vocabulary:
+            self.removed.add(term)
+    
+    def __iter__(self):
+        for term in self.vocabulary:
+            if term not in self.removed and term not in self.changed:
+                yield term
+        yield from self.changed
+    
+    def __len__(self):
+        new_terms = sum(1 for term in self.changed if term not in self.vocabulary)
+        return len(self.vocabulary) - len(self.removed) + new_terms
+
+class InvertedIndex:
+    """
+    Inverted index with BM25 scoring.
+    
+    Every term maps to a postings list of (doc_id, term frequency) pairs
+    kept sorted by doc_id in two parallel arrays. Query cost depends on the
+    length of the postings lists of the query terms, not on the number of
+    indexed documents.
+    
+    The postings also store where the term occurs: a third array holds the
+    term positions of every posting back to back, in doc_id order, so a
+    posting's positions start at the sum of the frequencies before it.
+    Positions count index terms, so stopwords dropped by the analyzer do
+    not take part in phrase and proximity matching.
+    
+    For top-k search every term also keeps its largest frequency and the
+    shortest document it occurs in, which bound the score it can add to a
+    document (see top_k).
+    """
+    
+    def __init__(self, k1=DEFAULT_K1, b=DEFAULT_B):
+        """
+        Initialize an empty index.
+        
+        Args:
+            k1: BM25 term frequency saturation
+            b: BM25 document length normalization
+        """
+        self.k1 = k1
+        self.b = b
+        
+        # term -> (doc_ids, term_frequencies, positions)
+        self.postings = {}
+        # doc_id -> number of terms in the document
+        self.doc_lengths = {}
+        self.total_length = 0
+        # term -> (largest term frequency, shortest document length); kept
+        # for the terms whose bound was computed, and only ever loosened
+        # by updates, so it stays an upper bound
+        self.term_bounds = {}
+    
+    def __len__(self):
+        """Return the number of indexed documents"""
+        return len(self.doc_lengths)
+    
+    def add(self, doc_id, terms):
+        """
+        Add a document to the index. Documents should be added in
+        increasing doc_id order, which keeps appends cheap.
+        
+        Args:
+            doc_id: Integer id of the document
+            terms: List of the document's terms, in order
+        """
+        if doc_id in self.doc_lengths:
+            raise ValueError(f"Document {doc_id} is already indexed")
+        
+        term_positions = {}
+        for position, term in enumerate(terms):
+            term_positions.setdefault(term, []).append(position)
+        
+        for term, positions in term_positions.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = (array("q"), array("l"), array("i"))
+            elif type(postings[0]) is not array:
+                postings = self.postings[term] = _writable(postings)
+            doc_ids, frequencies, all_positions = postings
+            
+            if not doc_ids or doc_ids[-1] < doc_id:
+                doc_ids.append(doc_id)
+                frequencies.append(len(positions))
+                all_positions.extend(positions)
+            else:
+                index = bisect_left(doc_ids, doc_id)
+                offset = sum(frequencies[:index])
+                doc_ids.insert(index, doc_id)
+                frequencies.insert(index, len(positions))
+                all_positions[offset:offset] = array("i", positions)
+            
+            bound = self.term_bounds.get(term)
+            if bound is not None:
+                self.term_bounds[term] = (max(bound[0], len(positions)), min(bound[1], len(terms)))
+        
+        self.doc_lengths[doc_id] = len(terms)
+        self.total_length += len(terms)
+    
+    def remove(self, doc_id, terms):
+        """
+        Remove a document from the index.
+        
+        Args:
+            doc_id: Integer id of the document
+            terms: The terms the document was indexed with
+        """
+        length = self.doc_lengths.pop(doc_id, None)
+        if length is None:
+            return
+        self.total_length -= length
+        
+        for term in set(terms):
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            doc_ids, frequencies, positions = postings
+            index = bisect_left(doc_ids, doc_id)
+            if index < len(doc_ids) and doc_ids[index] == doc_id:
+                if type(doc_ids) is not array:
+                    doc_ids, frequencies, positions = self.postings[term] = _writable(postings)
+                offset = sum(frequencies[:index])
+                del positions[offset:offset + frequencies[index]]
+                del doc_ids[index]
+                del frequencies[index]
+            if not doc_ids:
+                del self.postings[term]
+                self.term_bounds.pop(term, None)
+    
+    def idf(self, term):
+        """
+        Return the BM25 inverse document frequency of a term.
+        
+        Args:
+            term: Index term
+        
+        Returns:
+            The idf, 0 for unknown terms
+        """
+        postings = self.postings.get(term)
+        if not postings:
+            return 0.0
+        return bm25_idf(len(self.doc_lengths), len(postings[0]))
+    
+    def max_score(self, query_terms):
+        """
+        Return the highest BM25 score any document could reach for a query.
+        Used to normalize scores to the 0-1 range.
+        
+        Args:
+            query_terms: List of query terms
+        
+        Returns:
+            Upper bound of the query score
+        """
+        return sum(self.idf(term) for term in set(query_terms)) * (self.k1 + 1)
+    
+    def _postings_slices(self, doc_ids, doc_ranges):
+        """Yield the (start, end) positions of a postings list inside doc_ranges"""
+        if doc_ranges is None:
+            yield 0, len(doc_ids)
+            return
+        for range_start, range_end in doc_ranges:
+            start = bisect_left(doc_ids, range_start)
+            end = bisect_left(doc_ids, range_end, start)
+            if start < end:
+                yield start, end
+    
+    def _length_factors(self):
+        """Return the constant and per-term-count parts of the BM25 length normalization"""
+        average_length = self.total_length / len(self.doc_lengths) or 1
+        return self.k1 * (1 - self.b), self.k1 * self.b / average_length
+    
+    def score(self, query_terms, doc_ranges=None):
+        """
+        Score all documents that contain at least one query term.
+        
+        Args:
+            query_terms: List of query terms
+            doc_ranges: Optional sorted list of half-open (start, end) doc id
+                ranges; only the matching slices of the postings lists are
+                visited
+        
+        Returns:
+            Dictionary of doc_id -> BM25 score
+        """
+        scores = {}
+        if not self.doc_lengths:
+            return scores
+        
+        k1 = self.k1
+        length_base, length_weight = self._length_factors()
+        doc_lengths = self.doc_lengths
+        
+        # Terms in sorted order, so a score sums the same floats in the same
+        # order as score_many and ties compare equal
+        for term in sorted(set(query_terms)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf(term)
+            doc_ids, frequencies, _ = postings
+            for start, end in self._postings_slices(doc_ids, doc_ranges):
+                for doc_id, frequency in zip(doc_ids[start:end], frequencies[start:end]):
+                    denominator = frequency + length_base + length_weight * doc_lengths[doc_id]
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (k1 + 1) / denominator
+        
+        return scores
+    
+    def search(self, query_terms, k=5, doc_ranges=None, pool=0, headroom=0.0):
+        """
+        Find the k best matching documents for a query.
+        
+        Args:
+            query_terms: List of query terms
+            k: Number of results to return
+            doc_ranges: Optional sorted list of half-open (start, end) doc id
+                ranges to restrict the search to
+            pool: Number of results to return for rescoring, if more than k
+            headroom: Largest share of the gap to the maximum score that
+                rescoring can add to a score, see top_k
+        
+        Returns:
+            List of (doc_id, score) tuples, best first, with scores
+            normalized to the 0-1 range
+        """
+        top = self.top_k(query_terms, k, doc_ranges, pool=pool, headroom=headroom)
+        max_score = self.max_score(query_terms) or 1.0
+        return [(doc_id, score / max_score) for doc_id, score in top]
+    
+    def _term_bound(self, term):
+        """Return the (largest frequency, shortest document length) of a term's postings"""
+        bound = self.term_bounds.get(term)
+        if bound is None:
+            doc_ids, frequencies, _ = self.postings[term]
+            doc_lengths = self.doc_lengths
+            bound = self.term_bounds[term] = (max(frequencies), min(doc_lengths[doc_id] for doc_id in doc_ids))
+        return bound
+    
+    def top_k(self, query_terms, k, doc_ranges=None, collection=None, threshold=0.0, pool=0, headroom=0.0,
+              floor=0.0):
+        """
+        Find the k best scored documents without scoring every document
+        that contains a query term (MaxScore dynamic pruning).
+        
+        The score a term can add to any document is bounded by its idf and
+        its largest frequency in the shortest document it occurs in. Terms
+        are processed from the largest bound down, with their whole
+        postings lists, until the bounds of the remaining terms add up to
+        less than the k-th best score so far; a document that has none of
+        the processed terms can then not reach the top k. The remaining
+        terms, typically the very common ones, are only looked up for the
+        candidates that can still reach the top k, by binary search in
+        their postings lists, and candidates are dropped as their bounds
+        fall below the k-th best score.
+        
+        The results are exactly those of exhaustive scoring: final scores
+        are summed in the same term order as score, and ties are broken by
+        lower doc id.
+        
+        For results that are rescored afterwards, up to pool documents are
+        returned, but pruning still follows the k-th best score: a document
+        is only dropped once it could not pass that score even if rescoring
+        added headroom of the gap between its score and max_score.
+        
+        Args:
+            query_terms: List of query terms
+            k: Number of results to return
+            doc_ranges: Optional sorted list of half-open (start, end) doc id
+                ranges to restrict the search to
+            collection: Index whose statistics are used, as for score_many
+            threshold: Score the results have to reach, e.g. the k-th best
+                score found in other segments; documents below it may be
+                left out
+            pool: Number of results to return, if more than k
+            headroom: Largest share of the gap to max_score that rescoring
+                can add to a score, between 0 and 1
+            floor: Score below which documents are not needed at all, e.g.
+                the pool-th best score found in other segments
+        
+        Returns:
+            List of (doc_id, BM25 score) tuples, best first
+        """
+        collection = collection or self
+        if k <= 0 or not self.doc_lengths or not collection.doc_lengths:
+            return []
+        
+        k1 = collection.k1
+        length_base, length_weight = collection._length_factors()
+        doc_lengths = collection.doc_lengths
+        
+        # Terms in the order of score, with their idf and score bound
+        terms = []
+        for term in sorted(set(query_terms)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = collection.idf(term)
+            max_frequency, min_length = self._term_bound(term)
+            bound = idf * max_frequency * (k1 + 1) / (max_frequency + length_base + length_weight * min_length)
+            terms.append((postings, idf, bound))
+        
+        order = sorted(range(len(terms)), key=lambda position: -terms[position][2])
+        remaining = sum(bound for _, _, bound in terms)
+        slack = 1.0 - PRUNING_TOLERANCE
+        # A score s can be rescored up to s + headroom * (max_score - s)
+        reach = headroom * collection.max_score(query_terms) if headroom else 0.0
+        
+        size = max(k, pool)
+        
+        def kth_score(scores):
+            if len(scores) < k:
+                return max(floor, (threshold - reach) / (1.0 - headroom))
+            best = heapq.nlargest(size, scores)
+            kth = (max(threshold, best[k - 1]) - reach) / (1.0 - headroom)
+            # Documents below the pool-th best score are not returned either
+            return max(floor, kth, best[-1] if len(best) == size else 0.0)
+        
+        # Term position -> doc_id -> weight; the final scores are summed
+        # from these in term order
+        weights = {}
+        scores = {}
+        
+        # Whole postings lists, while a document with none of the processed
+        # terms could still reach the top k
+        processed = 0
+        while processed < len(order) and remaining >= kth_score(scores.values()) * slack:
+            position = order[processed]
+            (doc_ids, frequencies, _), idf, bound = terms[position]
+            term_weights = weights[position] = {}
+            for start, end in self._postings_slices(doc_ids, doc_ranges):
+                for doc_id, frequency in zip(doc_ids[start:end], frequencies[start:end]):
+                    length = doc_lengths.get(doc_id)
+                    if length is None:
+                        continue
+                    weight = idf * frequency * (k1 + 1) / (frequency + length_base + length_weight * length)
+                    term_weights[doc_id] = weight
+                    scores[doc_id] = scores.get(doc_id, 0.0) + weight
+            remaining -= bound
+            processed += 1
+        
+        # The other terms are looked up for the remaining candidates only
+        cutoff = kth_score(scores.values()) * slack
+        candidates = sorted(doc_id for doc_id, score in scores.items() if score + remaining >= cutoff)
+        for position in order[processed:]:
+            (doc_ids, frequencies, _), idf, bound = terms[position]
+            term_weights = weights[position] = {}
+            index = 0
+            for doc_id in candidates:
+                index = bisect_left(doc_ids, doc_id, index)
+                if index == len(doc_ids):
+                    break
+                if doc_ids[index] == doc_id:
+                    frequency = frequencies[index]
+                    weight = idf * frequency * (k1 + 1) / (
+                        frequency + length_base + length_weight * doc_lengths[doc_id]
+                    )
+                    term_weights[doc_id] = weight
+                    scores[doc_id] += weight
+            remaining -= bound
+            cutoff = kth_score([scores[doc_id] for doc_id in candidates]) * slack
+            candidates = [doc_id for doc_id in candidates if scores[doc_id] + remaining >= cutoff]
+        
+        final = [
+            (doc_id, sum(weights[position].get(doc_id, 0.0) for position in sorted(weights)))
+            for doc_id in candidates
+        ]
+        return heapq.nlargest(size, final, key=lambda item: (item[1], -item[0]))
+    
+    def _top_k(self, scores, query_terms, k):
+        """Select the k best of a query's scores and normalize them"""
+        if not scores:
+            return []
+        
+        max_score = self.max_score(query_terms) or 1.0
+        top = heapq.nlargest(k, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [(doc_id, score / max_score) for doc_id, score in top]
+    
+    def score_many(self, queries, doc_ranges=None, collection=None):
+        """
+        Score many queries in one walk over the postings lists. A term shared
+        by several queries has its postings read and its BM25 weights
+        computed once.
+        
+        Args:
+            queries: List of query term lists
+            doc_ranges: Optional sorted list of half-open (start, end) doc id
+                ranges to restrict the search to
+            collection: Index whose statistics (idf, length normalization
+                and document lengths) are used instead of this index's own,
+                when this index is one segment of it; documents missing from
+                its doc_lengths are skipped as deleted
+        
+        Returns:
+            List with the doc_id -> BM25 score dictionary of each query
+        """
+        scores = [{} for _ in queries]
+        collection = collection or self
+        if not self.doc_lengths or not collection.doc_lengths:
+            return scores
+        
+        # term -> score dictionaries of the queries that contain it
+        term_queries = {}
+        for position, query_terms in enumerate(queries):
+            for term in set(query_terms):
+                term_queries.setdefault(term, []).append(scores[position])
+        
+        k1 = collection.k1
+        length_base, length_weight = collection._length_factors()
+        doc_lengths = collection.doc_lengths
+        
+        # Same term order as score
+        for term, query_scores in sorted(term_queries.items()):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = collection.idf(term)
+            doc_ids, frequencies, _ = postings
+            for start, end in self._postings_slices(doc_ids, doc_ranges):
+                for doc_id, frequency in zip(doc_ids[start:end], frequencies[start:end]):
+                    length = doc_lengths.get(doc_id)
+                    if length is None:
+                        continue
+                    denominator = frequency + length_base + length_weight * length
+                    weight = idf * frequency * (k1 + 1) / denominator
+                    for doc_scores in query_scores:
+                        doc_scores[doc_id] = doc_scores.get(doc_id, 0.0) + weight
+        
+        return scores
+    
+    def search_many(self, queries, k=5, doc_ranges=None):
+        """
+        Find the k best matching documents for many queries at once.
+        
+        Args:
+            queries: List of query term lists
+            k: Number of results to return per query
+            doc_ranges: Optional sorted list of half-open (start, end) doc id
+                ranges to restrict the search to
+        
+        Returns:
+            List with the (doc_id, score) results of each query
+        """
+        return [
+            self._top_k(scores, query_terms, k)
+            for scores, query_terms in zip(self.score_many(queries, doc_ranges), queries)
+        ]
+    
+    def _candidate_docs(self, terms, doc_ranges=None):
+        """
+        Return the sorted ids of the documents that contain every term.
+        
+        Args:
+            terms: List of index terms
+            doc_ranges: Optional sorted list of half-open (start, end) doc id
+                ranges to restrict the documents to
+        
+        Returns:
+            int64 array of doc ids
+        """
+        if any(term not in self.postings for term in terms):
+            return np.empty(0, dtype=np.int64)
+        
+        # Intersect from the rarest term up, so the candidates only shrink
+        candidates = None
+        for term in sorted(set(terms), key=lambda term: len(self.postings[term][0])):
+            doc_ids = np.asarray(self.postings[term][0], dtype=np.int64)
+            candidates = doc_ids if candidates is None else _sorted_intersection(candidates, doc_ids)
+        if doc_ranges is not None:
+            candidates = candidates[ranges_mask(candidates, doc_ranges)]
+        return candidates
+    
+    def occurrences(self, term, doc_ids):
+        """
+        Find the positions of a term in a set of documents.
+        
+        Args:
+            term: Index term
+            doc_ids: Sorted int64 array of doc ids
+        
+        Returns:
+            Tuple of (doc_ids, positions) int64 arrays with one entry per
+            occurrence, sorted by doc id and then position
+        """
+        postings = self.postings.get(term)
+        if not postings or not len(doc_ids):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        
+        # The requested documents are found by binary search in a view of
+        # the postings, so only their entries are read
+        term_docs = np.asarray(postings[0], dtype=np.int64)
+        rows = np.minimum(np.searchsorted(term_docs, doc_ids), len(term_docs) - 1)
+        rows = rows[term_docs[rows] == doc_ids]
+        
+        lengths = np.asarray(postings[1], dtype=np.int64)[rows]
+        starts = self._position_starts(term, postings, rows)
+        total = lengths.sum()
+        # Indexes starts[row] .. starts[row] + frequency - 1 of every row
+        offsets = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+        positions = np.asarray(postings[2])[offsets + np.arange(total)].astype(np.int64)
+        return np.repeat(term_docs[rows], lengths), positions
+    
+    def _position_starts(self, term, postings, rows):
+        """Return where the positions of the given rows of a term's postings start"""
+        if isinstance(self.postings, MappedPostings) and term not in self.postings.changed:
+            return self.postings.position_starts(term, rows)
+        # Postings kept in memory arrays (the write buffer and terms written
+        # since loading) sum their frequencies on the spot
+        frequencies = np.asarray(postings[1], dtype=np.int64)
+        return (np.cumsum(frequencies) - frequencies)[rows]
+    
+    def phrase_doc_ids(self, phrase_terms, doc_ranges=None):
+        """
+        Find the documents that contain the terms of a phrase next to each
+        other and in order.
+        
+        Args:
+            phrase_terms: Non-empty list of the phrase's index terms
+            doc_ranges: Optional sorted list of half-open (start, end) doc id
+                ranges to restrict the search to
+        
+        Returns:
+            Sorted int64 array of the matching doc ids
+        """
+        candidates = self._candidate_docs(phrase_terms, doc_ranges)
+        
+        # Every occurrence of the offset-th phrase term votes for a phrase
+        # starting offset positions earlier; a phrase matches where all
+        # terms vote for the same (doc_id, start) key
+        keys = None
+        for offset, term in enumerate(phrase_terms):
+            if not len(candidates):
+                break
+            doc_ids, positions = self.occurrences(term, candidates)
+            valid = positions >= offset
+            term_keys = doc_ids[valid] * POSITION_STRIDE + positions[valid] - offset
+            keys = term_keys if keys is None else _sorted_intersection(keys, term_keys)
+            # Later terms only need to be looked up in the remaining documents
+            candidates = _sorted_distinct(keys // POSITION_STRIDE)
+        return candidates
+    
+    def near_doc_ids(self, left_term, right_term, distance, doc_ranges=None):
+        """
+        Find the documents where two terms occur at most distance terms
+        apart, in either order.
+        
+        Args:
+            left_term: First index term
+            right_term: Second index term
+            distance: Largest allowed difference of the term positions
+            doc_ranges: Optional sorted list of half-open (start, end) doc id
+                ranges to restrict the search to
+        
+        Returns:
+            Sorted int64 array of the matching doc ids
+        """
+        candidates = self._candidate_docs([left_term, right_term], doc_ranges)
+        left_docs, left_positions = self.occurrences(left_term, candidates)
+        right_docs, right_positions = self.occurrences(right_term, candidates)
+        if not len(left_docs) or not len(right_docs):
+            return np.empty(0, dtype=np.int64)
+        
+        left_keys = left_docs * POSITION_STRIDE + left_positions
+        right_keys = right_docs * POSITION_STRIDE + right_positions
+        # The closest right occurrences of each left occurrence are next to
+        # its insertion point; the one at the point itself is the same
+        # occurrence when both terms are equal, hence the non-zero check
+        insert_at = np.searchsorted(right_keys, left_keys)
+        near = np.zeros(len(left_keys), dtype=bool)
+        for shift in (-1, 0, 1):
+            index = np.clip(insert_at + shift, 0, len(right_keys) - 1)
+            gaps = np.abs(right_keys[index] - left_keys)
+            near |= (gaps > 0) & (gaps <= distance)
+        return _sorted_distinct(left_docs[near])
+    
+    def proximity(self, query_terms, doc_ids):
+        """
+        Measure how close together the query terms occur in documents.
+        
+        Args:
+            query_terms: List of query terms
+            doc_ids: Doc ids to measure
+        
+        Returns:
+            Dictionary of doc_id -> (matched, width) for the documents that
+            contain at least two distinct query terms, where width is the
+            length in terms of the shortest text window that contains every
+            query term the document has
+        """
+        doc_ids = np.unique(np.asarray(doc_ids, dtype=np.int64))
+        terms = sorted({term for term in query_terms if term in self.postings})
+        if len(terms) < 2 or not len(doc_ids):
+            return {}
+        
+        parts = [self.occurrences(term, doc_ids) + (term_index,) for term_index, term in enumerate(terms)]
+        occurrence_docs = np.concatenate([docs for docs, _, _ in parts])
+        occurrence_positions = np.concatenate([positions for _, positions, _ in parts])
+        occurrence_terms = np.concatenate([np.full(len(docs), term_index) for docs, _, term_index in parts])
+        order = np.lexsort((occurrence_positions, occurrence_docs))
+        occurrence_docs = occurrence_docs[order].tolist()
+        occurrence_positions = occurrence_positions[order].tolist()
+        occurrence_terms = occurrence_terms[order].tolist()
+        
+        spans = {}
+        start = 0
+        while start < len(occurrence_docs):
+            end = start
+            while end < len(occurrence_docs) and occurrence_docs[end] == occurrence_docs[start]:
+                end += 1
+            positions = occurrence_positions[start:end]
+            term_ids = occurrence_terms[start:end]
+            matched = len(set(term_ids))
+            if matched >= 2:
+                spans[occurrence_docs[start]] = (matched, _shortest_window(positions, term_ids, matched))
+            start = end
+        return spans
+    
+    def flatten(self):
+        """
+        Lay the index out as flat arrays: the postings of all terms back to
+        back, with the start of every term's postings and positions. This
+        is the format of saved indexes and of sealed segments.
+        
+        Returns:
+            Tuple of (terms, arrays), where arrays maps every INDEX_ARRAYS
+            name to a NumPy array and row i of the arrays belongs to terms[i]
+        """
+        # (doc_id, length) rows
+        doc_lengths = np.array(list(self.doc_lengths.items()), dtype=np.int64).reshape(-1, 2)
+        if isinstance(self.postings, MappedPostings) and not self.postings.changed and not self.postings.removed:
+            arrays = dict(zip(INDEX_ARRAYS, self.postings.arrays))
+            arrays["doc_lengths"] = doc_lengths
+            return list(self.postings.vocabulary), arrays
+        
+        terms = list(self.postings)
+        postings = [self.postings[term] for term in terms]
+        
+        def concatenate(part, dtype):
+            if not postings:
+                return np.empty(0, dtype=dtype)
+            return np.concatenate([np.asarray(entry[part], dtype=dtype) for entry in postings])
+        
+        def offsets(part):
+            result = np.zeros(len(postings) + 1, dtype=np.int64)
+            result[1:] = np.cumsum([len(entry[part]) for entry in postings])
+            return result
+        
+        arrays = {
+            "postings_offsets": offsets(0),
+            "doc_ids": concatenate(0, np.int64),
+            "frequencies": concatenate(1, np.int64),
+            "position_offsets": offsets(2),
+            "positions": concatenate(2, np.int32),
+            "doc_lengths": doc_lengths
+        }
+        return terms, arrays
+    
+    @classmethod
+    def from_flat(cls, terms, arrays, k1=DEFAULT_K1, b=DEFAULT_B):
+        """
+        Build an index over flat arrays produced by flatten, without
+        copying them.
+        
+        Args:
+            terms: List of the terms of the array rows
+            arrays: Dictionary of the INDEX_ARRAYS arrays
+            k1: BM25 term frequency saturation
+            b: BM25 document length normalization
+        
+        Returns:
+            A new InvertedIndex
+        """
+        index = cls(k1=k1, b=b)
+        index.postings = MappedPostings(
+            {term: row for row, term in enumerate(terms)},
+            *(arrays[name] for name in INDEX_ARRAYS[:5])
+        )
+        doc_lengths = arrays["doc_lengths"]
+        index.doc_lengths = dict(zip(doc_lengths[:, 0].tolist(), doc_lengths[:, 1].tolist()))
+        index.total_length = int(doc_lengths[:, 1].sum())
+        
+        # Score bounds of all terms at once: the length of every posting's
+        # document, reduced per term
+        if terms:
+            by_id = np.argsort(doc_lengths[:, 0])
+            posting_lengths = doc_lengths[by_id, 1][
+                np.searchsorted(doc_lengths[by_id, 0], np.asarray(arrays["doc_ids"]))
+            ]
+            starts = np.asarray(arrays["postings_offsets"][:-1])
+            max_frequencies = np.maximum.reduceat(np.asarray(arrays["frequencies"]), starts)
+            min_lengths = np.minimum.reduceat(posting_lengths, starts)
+            index.term_bounds = dict(zip(terms, zip(max_frequencies.tolist(), min_lengths.tolist())))
+        return index
+    
+    def save(self, directory):
+        """
+        Save the index as flat .npy arrays that load can memory-map.
+        
+        Args:
+            directory: Directory to write the index files to
+        """
+        save_flat(directory, *self.flatten(), k1=self.k1, b=self.b)
+    
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """
+        Load an index saved with save. The postings are read from the saved
+        arrays on demand; terms that are written later are copied into
+        memory first.
+        
+        Args:
+            directory: Directory the index was saved to
+            mmap: Memory-map the postings arrays instead of reading them
+        
+        Returns:
+            The loaded InvertedIndex
+        """
+        terms, arrays, info = load_flat(directory, mmap)
+        return cls.from_flat(terms, arrays, k1=info["k1"], b=info["b"])
+
+def save_flat(directory, terms, arrays, k1, b):
+    """
+    Write flat index arrays (see InvertedIndex.flatten) to a directory.
+    
+    Args:
+        directory: Directory to write the index files to
+        terms: List of the terms of the array rows
+        arrays: Dictionary of the INDEX_ARRAYS arrays
+        k1: BM25 term frequency saturation
+        b: BM25 document length normalization
+    """
+    os.makedirs(directory, exist_ok=True)
+    for name in INDEX_ARRAYS:
+        np.save(os.path.join(directory, f"{name}.npy"), arrays[name])
+    with open(os.path.join(directory, VOCABULARY_FILE), "w", encoding="utf-8") as f:
+        json.dump(terms, f, ensure_ascii=False)
+    with open(os.path.join(directory, INDEX_INFO_FILE), "w", encoding="utf-8") as f:
+        json.dump({"k1": k1, "b": b}, f)
+
+def load_flat(directory, mmap=True):
+    """
+    Read flat index arrays written by save_flat.
+    
+    Args:
+        directory: Directory the index was saved to
+        mmap: Memory-map the arrays instead of reading them
+    
+    Returns:
+        Tuple of (terms, arrays, info), info holding the BM25 parameters
+    """
+    with open(os.path.join(directory, INDEX_INFO_FILE), "r", encoding="utf-8") as f:
+        info = json.load(f)
+    with open(os.path.join(directory, VOCABULARY_FILE), "r", encoding="utf-8") as f:
+        terms = json.load(f)
+    arrays = {
+        name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r" if mmap else None)
+        for name in INDEX_ARRAYS
+    }
+    return terms, arrays, info
+
+def _sorted_intersection(first, second):
+    """Intersect two sorted arrays of distinct values with binary search"""
+    if len(first) > len(second):
+        first, second = second, first
+    if not len(first):
+        return first
+    index = np.minimum(np.searchsorted(second, first), len(second) - 1)
+    return first[second[index] == first]
+
+def _sorted_distinct(values):
+    """Drop the repeated values of a sorted array"""
+    if not len(values):
+        return values
+    return values[np.concatenate([[True], values[1:] != values[:-1]])]
+
+def _shortest_window(positions, term_ids, matched):
+    """
+    Return the length of the shortest window that contains matched distinct
+    terms, given the occurrences of a document sorted by position.
+    """
+    counts = {}
+    covered = 0
+    best = None
+    left = 0
+    for right, term_id in enumerate(term_ids):
+        counts[term_id] = counts.get(term_id, 0) + 1
+        if counts[term_id] == 1:
+            covered += 1
+        # Shrink from the left while the window still covers every term
+        while covered == matched:
+            width = positions[right] - positions[left] + 1
+            if best is None or width < best:
+                best = width
+            counts[term_ids[left]] -= 1
+            if not counts[term_ids[left]]:
+                covered -= 1
+            left += 1
+    return best
@@ -0,0 +1,166 @@
+import os
+import json
+import tempfile
+from utils.document_cache import compute_file_hash
+from utils.document_processor import read_pdf_summary
+
+# Default location of the persisted catalog manifest
+DEFAULT_CATALOG_PATH = os.path.join(".cache", "law_catalog.json")
+
+class LawCatalog:
+    """Persisted manifest of the law PDFs, available before full processing"""
+    
+    def __init__(self, catalog_path=DEFAULT_CATALOG_PATH):
+        """
+        Initialize the catalog and load the manifest if it exists.
+        
+        Args:
+            catalog_path: Path of the JSON manifest
+        """
+        self.catalog_path = catalog_path
+        self.entries = {}
+        
+        try:
+            with open(self.catalog_path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f).get("entries", {})
+        except (OSError, ValueError):
+            self.entries = {}
+    
+    def refresh(self, pdf_paths):
+        """
+        Bring the catalog in line with the PDF files on disk. Only files
+        whose size or modification time changed are hashed and re-read,
+        and only their first page is read.
+        
+        Args:
+            pdf_paths: List of paths to the PDF files
+        
+        Returns:
+            True if the catalog changed
+        """
+        changed = False
+        wanted = set(pdf_paths)
+        
+        for path in list(self.entries):
+            if path not in wanted:
+                del self.entries[path]
+                changed = True
+        
+        for pdf_path in wanted:
+            try:
+                stat = os.stat(pdf_path)
+            except OSError as e:
+                print(f"Error reading {pdf_path}: {e}")
+                continue
+            
+            entry = self.entries.get(pdf_path)
+            if entry and entry["byte_size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+                continue
+            
+            try:
+                file_hash = compute_file_hash(pdf_path)
+                if entry and entry["file_hash"] == file_hash:
+                    # Touched but not modified
+                    entry["mtime"] = stat.st_mtime
+                    changed = True
+                    continue
+                
+                summary = read_pdf_summary(pdf_path)
+            except Exception as e:
+                print(f"Error reading {pdf_path}: {e}")
+                continue
+            
+            self.entries[pdf_path] = {
+                "path": pdf_path,
+                "file_hash": file_hash,
+                "law_name": summary["law_name"],
+                "page_count": summary["page_count"],
+                # Only known once the whole file has been processed
+                "article_count": None,
+                "language": "Arabic" if summary["has_arabic"] else "English",
+                "byte_size": stat.st_size,
+                "mtime": stat.st_mtime
+            }
+            changed = True
+        
+        if changed:
+            self.save()
+        return changed
+    
+    def update_from_documents(self, documents):
+        """
+        Fill in the details that are only known after processing.
+        
+        Args:
+            documents: List of processed Document objects
+        """
+        articles_by_source = {}
+        arabic_sources = set()
+        law_names = {}
+        for doc in documents:
+            source = doc.metadata.get("source")
+            articles = articles_by_source.setdefault(source, set())
+            for article_number, _, _ in doc.metadata.get("article_spans") or []:
+                articles.add(str(article_number))
+            if doc.metadata.get("has_arabic", False):
+                arabic_sources.add(source)
+            law_names[source] = doc.metadata.get("law_name")
+        
+        for source, articles in articles_by_source.items():
+            entry = self.entries.get(source)
+            if not entry:
+                continue
+            entry["article_count"] = len(articles)
+            entry["language"] = "Arabic" if source in arabic_sources else "English"
+            entry["law_name"] = law_names[source] or entry["law_name"]
+        
+        self.save()
+    
+    def update_from_store(self, vector_store):
+        """
+        Fill in the details of the indexed files that the catalog does not
+        know yet, reading only their chunk records. Files that were
+        already filled in are skipped, so the cost follows the number of
+        new and changed files rather than the corpus.
+        
+        Args:
+            vector_store: VectorStore holding the processed files
+        """
+        changed = False
+        for source, entry in self.entries.items():
+            if entry["article_count"] is not None:
+                continue
+            law = vector_store.chunks.source_law(source)
+            if law is None:
+                continue
+            entry["article_count"] = len(vector_store.chunks.source_articles(source))
+            entry["language"] = "Arabic" if law["has_arabic"] else "English"
+            entry["law_name"] = law["law_name"] or entry["law_name"]
+            changed = True
+        
+        if changed:
+            self.save()
+    
+    def law_names(self):
+        """
+        Return the names of the laws in the catalog.
+        
+        Returns:
+            Sorted list of unique law names
+        """
+        return sorted({entry["law_name"] for entry in self.entries.values()})
+    
+    def save(self):
+        """Atomically write the manifest to disk"""
+        directory = os.path.dirname(self.catalog_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"entries": self.entries}, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.catalog_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
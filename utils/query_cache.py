@@ -0,0 +1,121 @@
+import time
+import threading
+from collections import OrderedDict
+
+# Default number of cached queries and their lifetime in seconds
+DEFAULT_CACHE_SIZE = 512
+DEFAULT_CACHE_TTL = 600
+
+def freeze_filters(filters):
+    """
+    Turn a filters dictionary into a hashable, order-independent value.
+    
+    Args:
+        filters: Dictionary of search filters, or None
+    
+    Returns:
+        A tuple usable as part of a cache key
+    """
+    if not filters:
+        return ()
+    frozen = []
+    for key, value in sorted(filters.items()):
+        if isinstance(value, (list, set, frozenset)):
+            value = tuple(sorted(value))
+        elif isinstance(value, tuple):
+            value = tuple(value)
+        frozen.append((key, value))
+    return tuple(frozen)
+
+class QueryCache:
+    """
+    Bounded cache of search results with LRU and TTL eviction.
+    
+    When the cache is full the least recently used entry is dropped, and
+    entries older than the TTL are treated as missing. Access is guarded by
+    a lock, so the cache can be shared between threads.
+    """
+    
+    def __init__(self, max_entries=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL):
+        """
+        Initialize an empty cache.
+        
+        Args:
+            max_entries: Maximum number of cached results; 0 disables caching
+            ttl: Seconds a result stays valid; None keeps results until evicted
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # key -> (expiry time, value), least recently used first
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def __len__(self):
+        """Return the number of cached results"""
+        return len(self.entries)
+    
+    def get(self, key):
+        """
+        Look up a cached result.
+        
+        Args:
+            key: Hashable cache key
+        
+        Returns:
+            The cached value, or None on a miss
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] is not None and entry[0] <= time.monotonic():
+                # Expired
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    
+    def put(self, key, value):
+        """
+        Store a result.
+        
+        Args:
+            key: Hashable cache key
+            value: Result to cache
+        """
+        if self.max_entries <= 0:
+            return
+        expiry = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self.lock:
+            self.entries[key] = (expiry, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        """Drop all cached results, e.g. after the corpus changed"""
+        with self.lock:
+            self.entries.clear()
+    
+    def stats(self):
+        """
+        Return the cache counters.
+        
+        Returns:
+            Dictionary with hits, misses, evictions, size and hit_rate
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self.entries),
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,56 @@
+import re
+
+# Quoted phrases, with straight, curly or Arabic (guillemet) quotes
+PHRASE_PATTERN = re.compile(r'["“”«»]([^"“”«»]*)["“”«»]')
+
+# Proximity clauses: two words at most n terms apart, e.g. "bank NEAR/3 permit"
+# (queries are case-folded before parsing)
+NEAR_PATTERN = re.compile(r'(\w+)\s+near/(\d+)\s+(\w+)')
+
+# Quote characters left over from unbalanced quotes
+QUOTE_PATTERN = re.compile(r'["“”«»]')
+
+class ParsedQuery:
+    """
+    A search query split into its free text and its positional clauses.
+    
+    Attributes:
+        text: Query text with the quotes and NEAR operators removed; every
+            word of the query, including the words of phrases and NEAR
+            clauses, is in it and takes part in scoring
+        phrases: List of the texts of the quoted phrases
+        near: List of (left word, right word, distance) NEAR clauses
+    """
+    
+    def __init__(self, text, phrases=None, near=None):
+        self.text = text
+        self.phrases = phrases or []
+        self.near = near or []
+    
+    @property
+    def has_constraints(self):
+        """Whether the query has phrases or NEAR clauses that documents must match"""
+        return bool(self.phrases or self.near)
+
+def parse_query(query):
+    """
+    Parse the phrase and proximity syntax of a normalized query.
+    
+    "central bank permit" with quotes only matches documents containing
+    the words next to each other and in order; "bank NEAR/3 permit" only
+    matches documents where the two words are at most 3 terms apart.
+    
+    Args:
+        query: Query normalized with normalize_text
+    
+    Returns:
+        ParsedQuery
+    """
+    phrases = [phrase.strip() for phrase in PHRASE_PATTERN.findall(query) if phrase.strip()]
+    text = PHRASE_PATTERN.sub(lambda match: f" {match.group(1)} ", query)
+    
+    near = [(left, right, int(distance)) for left, distance, right in NEAR_PATTERN.findall(text)]
+    text = NEAR_PATTERN.sub(lambda match: f"{match.group(1)} {match.group(3)}", text)
+    
+    text = " ".join(QUOTE_PATTERN.sub(" ", text).split())
+    return ParsedQuery(text, phrases, near)
@@ -0,0 +1,267 @@
+import time
+import numpy as np
+from utils.document_processor import normalize_text, ARTICLE_MARKER_PATTERN
+from utils.query_parser import parse_query
+from utils.analyzers import ARTICLE_REFERENCE_PATTERN
+
+# Retrieval candidates rescored by the reranker
+RERANK_CANDIDATES = 100
+
+# Seconds the reranker may spend per query; the cheap features are always
+# computed, the cross-scorer only scores the candidates that fit in the
+# time left
+DEFAULT_LATENCY_BUDGET = 0.05
+
+# Weights of the cheap features, each in the 0-1 range:
+# - retrieval: first-stage score relative to the best candidate
+# - proximity: how close together the query terms occur in the chunk
+# - heading: the chunk holds an article the query names, or the query terms
+#   appear in the chunk's article headings
+# - law_title: share of the distinctive terms of the law title (those in
+#   at most half of the titles, so not "law" or "قانون") found in the query
+FEATURE_WEIGHTS = {"retrieval": 0.4, "proximity": 0.25, "heading": 0.2, "law_title": 0.15}
+
+# Share of the final score taken from the cross-scorer, when one is set
+CROSS_SCORER_WEIGHT = 0.5
+
+# Most candidates scored per cross-scorer call
+CROSS_SCORER_BATCH = 16
+
+# Reranked results scoring below this share of the best one are dropped,
+# so weak matches are not sent to the language model
+MIN_RELATIVE_SCORE = 0.5
+
+# Characters read after an article marker as the article heading
+HEADING_CHARS = 120
+
+# Default local cross-encoder; multilingual, so it handles Arabic queries
+DEFAULT_CROSS_ENCODER = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+
+class CrossEncoderScorer:
+    """
+    Cross-scorer backed by a local sentence-transformers CrossEncoder
+    model, which reads the query and a chunk together. More accurate than
+    the cheap features but far slower, so the reranker only runs it on the
+    best candidates that fit in its latency budget.
+    """
+    
+    def __init__(self, model_name=DEFAULT_CROSS_ENCODER):
+        """
+        Load the model.
+        
+        Args:
+            model_name: Name or path of the cross-encoder model
+        """
+        # Imported here so the package is only needed when a cross-scorer is used
+        from sentence_transformers import CrossEncoder
+        
+        self.model = CrossEncoder(model_name)
+    
+    def score(self, query, texts):
+        """
+        Score chunks against a query.
+        
+        Args:
+            query: Query text
+            texts: List of chunk texts
+        
+        Returns:
+            Array of relevance scores in the 0-1 range
+        """
+        # Single-label models end in a sigmoid, so predictions are 0-1
+        scores = self.model.predict([(query, text) for text in texts])
+        return np.clip(np.asarray(scores, dtype=np.float64), 0.0, 1.0)
+
+def create_cross_scorer(name):
+    """
+    Create a cross-scorer by model name.
+    
+    Args:
+        name: Cross-encoder model name or path, "default" for
+            DEFAULT_CROSS_ENCODER, or "none" to disable the cross-scorer
+    
+    Returns:
+        The cross-scorer, or None for "none"
+    """
+    if not name or name == "none":
+        return None
+    return CrossEncoderScorer(DEFAULT_CROSS_ENCODER if name == "default" else name)
+
+class Reranker:
+    """
+    Second retrieval stage that rescores the top candidates of a search
+    with features that are cheaper than asking the language model: term
+    proximity, article heading and law title matches, and optionally a
+    local cross-scorer.
+    """
+    
+    def __init__(self, cross_scorer=None, latency_budget=DEFAULT_LATENCY_BUDGET, weights=None,
+                 cross_weight=CROSS_SCORER_WEIGHT, min_relative_score=MIN_RELATIVE_SCORE):
+        """
+        Initialize the reranker.
+        
+        Args:
+            cross_scorer: Optional object whose score(query, texts) method
+                returns 0-1 relevance scores (e.g. CrossEncoderScorer)
+            latency_budget: Seconds the cross-scorer may use per query;
+                None removes the limit
+            weights: Dictionary of cheap feature weights (default:
+                FEATURE_WEIGHTS)
+            cross_weight: Share of the final score taken from the cross-scorer
+            min_relative_score: Results below this share of the best
+                reranked score are dropped
+        """
+        self.cross_scorer = cross_scorer
+        self.latency_budget = latency_budget
+        self.weights = weights or FEATURE_WEIGHTS
+        self.cross_weight = cross_weight
+        self.min_relative_score = min_relative_score
+        # Latest measured cross-scorer seconds per candidate, which sizes
+        # the batches to the time left
+        self.candidate_seconds = None
+    
+    def features(self, store, query, candidates):
+        """
+        Compute the cheap features of the candidates.
+        
+        Args:
+            store: VectorStore the candidates come from
+            query: Normalized query
+            candidates: List of (chunk_id, score) tuples
+        
+        Returns:
+            Dictionary of feature name -> list with the value of every candidate
+        """
+        query_terms = set(store.analyze(parse_query(query).text))
+        # Numbers written as in the article markup
+        query_articles = {str(int(number)) for number in ARTICLE_REFERENCE_PATTERN.findall(query)}
+        chunk_ids = [chunk_id for chunk_id, _ in candidates]
+        
+        best_score = max((score for _, score in candidates), default=0.0) or 1.0
+        features = {"retrieval": [score / best_score for _, score in candidates]}
+        
+        # Same window measure as the proximity boost of lexical search
+        spans = store.index.proximity(list(query_terms), chunk_ids)
+        proximity = []
+        for chunk_id in chunk_ids:
+            span = spans.get(chunk_id)
+            if span is None:
+                proximity.append(0.0)
+                continue
+            matched, width = span
+            proximity.append((matched - 1) / (width - 1) * (matched - 1) / (len(query_terms) - 1))
+        features["proximity"] = proximity
+        
+        headings = []
+        for chunk_id in chunk_ids:
+            article_spans = store.chunks.spans(chunk_id)
+            if query_articles and any(article in query_articles for article, _, _ in article_spans):
+                headings.append(1.0)
+                continue
+            heading_terms = set()
+            if query_terms and article_spans:
+                text = store.chunks.text(chunk_id)
+                for _, start, _ in article_spans:
+                    # Spans that continue an article from the previous
+                    # chunk do not start with its heading
+                    marker = ARTICLE_MARKER_PATTERN.match(text, start)
+                    if marker is not None:
+                        heading = text[marker.end():marker.end() + HEADING_CHARS].split("\n")[0]
+                        heading_terms.update(store.analyze(normalize_text(heading)))
+            headings.append(len(query_terms & heading_terms) / len(query_terms) if query_terms else 0.0)
+        features["heading"] = headings
+        
+        # Terms shared by most titles say nothing about which law is meant
+        titles = {law_name: set(store.analyze(normalize_text(law_name))) for law_name in store.law_names()}
+        title_counts = {}
+        for title_terms in titles.values():
+            for term in title_terms:
+                title_counts[term] = title_counts.get(term, 0) + 1
+        title_matches = {}
+        for law_name, title_terms in titles.items():
+            distinctive = {term for term in title_terms if title_counts[term] * 2 <= len(titles)}
+            title_matches[law_name] = len(query_terms & distinctive) / len(distinctive) if distinctive else 0.0
+        law_titles = [title_matches.get(store.chunks.law(chunk_id)["law_name"], 0.0) for chunk_id in chunk_ids]
+        features["law_title"] = law_titles
+        return features
+    
+    def rerank(self, store, query, candidates, k, timings=None):
+        """
+        Rescore search candidates and keep the best k.
+        
+        Args:
+            store: VectorStore the candidates come from
+            query: Normalized query
+            candidates: List of (chunk_id, score) tuples from the first stage
+            k: Number of results to return
+            timings: Optional dictionary that receives the seconds spent
+                ("rerank") and the number of cross-scored candidates
+                ("cross_scored")
+        
+        Returns:
+            List of (chunk_id, score) tuples, best first, with scores in
+            the 0-1 range
+        """
+        start = time.perf_counter()
+        if not candidates:
+            return []
+        
+        features = self.features(store, query, candidates)
+        total_weight = sum(self.weights.values()) or 1.0
+        cheap_scores = [
+            sum(self.weights[name] * features[name][position] for name in self.weights) / total_weight
+            for position in range(len(candidates))
+        ]
+        order = sorted(range(len(candidates)), key=lambda position: (-cheap_scores[position], candidates[position][0]))
+        
+        # The cross-scorer reads the best candidates first, a batch at a
+        # time. Every batch, the first one included, only holds as many
+        # candidates as the time left allows at the measured speed; before
+        # any measurement, a single candidate is scored to take one
+        cross_scores = {}
+        if self.cross_scorer is not None:
+            deadline = None if self.latency_budget is None else start + self.latency_budget
+            batch_start = 0
+            while batch_start < len(order):
+                now = time.perf_counter()
+                size = CROSS_SCORER_BATCH
+                if deadline is not None:
+                    if now >= deadline:
+                        break
+                    if self.candidate_seconds is None:
+                        size = 1
+                    elif self.candidate_seconds > 0:
+                        size = min(size, int((deadline - now) / self.candidate_seconds))
+                    if size <= 0:
+                        break
+                batch = order[batch_start:batch_start + size]
+                texts = [store.chunks.text(candidates[position][0]) for position in batch]
+                try:
+                    scores = self.cross_scorer.score(query, texts)
+                except Exception as e:
+                    print(f"Error in cross-scorer: {str(e)}")
+                    break
+                cross_scores.update(zip(batch, scores))
+                self.candidate_seconds = (time.perf_counter() - now) / len(batch)
+                batch_start += len(batch)
+        
+        # Cross-scored candidates are ranked among themselves, ahead of the
+        # ones the budget did not reach
+        scored = []
+        for position in order:
+            score = cheap_scores[position]
+            if position in cross_scores:
+                score = (1.0 - self.cross_weight) * score + self.cross_weight * float(cross_scores[position])
+            scored.append((position not in cross_scores, -score, candidates[position][0], score))
+        scored.sort()
+        
+        best_score = scored[0][3]
+        results = [
+            (chunk_id, score)
+            for _, _, chunk_id, score in scored[:k]
+            if score >= best_score * self.min_relative_score
+        ]
+        
+        if timings is not None:
+            timings.update({"rerank": time.perf_counter() - start, "cross_scored": len(cross_scores)})
+        return results
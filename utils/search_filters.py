@@ -0,0 +1,106 @@
+import numpy as np
+
+# Metadata filters supported by VectorStore searches:
+#   law_name: law name or list of law names
+#   has_arabic: True or False
+#   page_range: (first_page, last_page), chunks overlapping the pages
+#   article_range: (first_article, last_article), chunks containing one of
+#       the articles
+FILTER_KEYS = ("law_name", "has_arabic", "page_range", "article_range")
+
+def _int_view(values):
+    """View an array.array of integers as a NumPy array without copying"""
+    if not len(values):
+        return np.empty(0, dtype=np.int64)
+    return np.frombuffer(values, dtype=f"i{values.itemsize}")
+
+def id_ranges(doc_ids):
+    """
+    Collapse sorted document ids into runs of consecutive ids.
+    
+    Args:
+        doc_ids: Sorted array of distinct document ids
+    
+    Returns:
+        List of half-open (start, end) ranges covering exactly doc_ids
+    """
+    doc_ids = np.asarray(doc_ids, dtype=np.int64)
+    if not len(doc_ids):
+        return []
+    breaks = np.flatnonzero(np.diff(doc_ids) != 1) + 1
+    starts = doc_ids[np.concatenate([[0], breaks])]
+    ends = doc_ids[np.concatenate([breaks - 1, [len(doc_ids) - 1]])] + 1
+    return list(zip(starts.tolist(), ends.tolist()))
+
+def ranges_mask(doc_ids, doc_ranges):
+    """
+    Check which document ids fall inside a set of ranges.
+    
+    Args:
+        doc_ids: Array of document ids
+        doc_ranges: Sorted list of half-open (start, end) ranges
+    
+    Returns:
+        Boolean array, True for the ids inside one of the ranges
+    """
+    doc_ids = np.asarray(doc_ids, dtype=np.int64)
+    if not doc_ranges:
+        return np.zeros(len(doc_ids), dtype=bool)
+    starts = np.array([start for start, _ in doc_ranges], dtype=np.int64)
+    ends = np.array([end for _, end in doc_ranges], dtype=np.int64)
+    position = np.searchsorted(starts, doc_ids, side="right") - 1
+    return (position >= 0) & (doc_ids < ends[np.maximum(position, 0)])
+
+def select_chunk_ids(store, filters):
+    """
+    Find the live chunks of a ChunkStore that match metadata filters.
+    
+    Law-level filters pick whole per-law partitions of chunk ids; page and
+    article ranges are then checked on the chunk records of those
+    partitions only.
+    
+    Args:
+        store: ChunkStore to filter
+        filters: Dictionary with any of the FILTER_KEYS
+    
+    Returns:
+        Sorted int64 array of the matching chunk ids
+    """
+    unknown = set(filters) - set(FILTER_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown search filters: {', '.join(sorted(unknown))}")
+    
+    if "law_name" in filters or "has_arabic" in filters:
+        law_names = filters.get("law_name")
+        if isinstance(law_names, str):
+            law_names = {law_names}
+        partitions = [
+            store.law_chunk_ids[law_id]
+            for law_id, law in enumerate(store.laws)
+            if law is not None
+            and (law_names is None or law["law_name"] in law_names)
+            and ("has_arabic" not in filters or bool(law["has_arabic"]) == bool(filters["has_arabic"]))
+        ]
+        chunk_ids = np.empty(0, dtype=np.int64)
+        if partitions:
+            chunk_ids = np.sort(np.concatenate([np.asarray(ids, dtype=np.int64) for ids in partitions]))
+    else:
+        chunk_ids = np.asarray(store.live_ids(), dtype=np.int64)
+    
+    if filters.get("page_range") is not None and len(chunk_ids):
+        first_page, last_page = filters["page_range"]
+        page_starts = _int_view(store.chunk_page_starts)[chunk_ids]
+        page_ends = _int_view(store.chunk_page_ends)[chunk_ids]
+        chunk_ids = chunk_ids[(page_starts > 0) & (page_starts <= last_page) & (page_ends >= first_page)]
+    
+    if filters.get("article_range") is not None and len(chunk_ids):
+        first_article, last_article = filters["article_range"]
+        span_offsets = _int_view(store.span_offsets)
+        span_articles = _int_view(store.span_articles)
+        # Running count of spans in the range, so the number of matching
+        # spans of a chunk is a difference of two counts
+        in_range = (span_articles >= int(first_article)) & (span_articles <= int(last_article))
+        counts = np.concatenate([[0], np.cumsum(in_range)])
+        chunk_ids = chunk_ids[counts[span_offsets[chunk_ids + 1]] > counts[span_offsets[chunk_ids]]]
+    
+    return chunk_ids
@@ -0,0 +1,527 @@
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from utils.inverted_index import (
+    InvertedIndex, DEFAULT_K1, DEFAULT_B, bm25_idf, save_flat, load_flat
+)
+
+# Documents held in the in-memory write buffer before it is sealed into a
+# segment
+DEFAULT_BUFFER_DOCS = 1000
+
+# Number of adjacent segments of the same size tier that are merged into one
+MERGE_FACTOR = 8
+
+# Share of deleted documents above which a segment is rewritten without them
+MAX_DELETED_RATIO = 0.3
+
+def merge_flat(parts, deleted=()):
+    """
+    Merge the flat arrays of several segments (see InvertedIndex.flatten)
+    into one, dropping deleted documents. Everything is done with array
+    operations: the postings of all segments are concatenated, sorted by
+    (term, doc_id) and cut into terms again.
+    
+    Args:
+        parts: List of (terms, arrays) tuples of segments with disjoint
+            documents
+        deleted: Doc ids to leave out
+    
+    Returns:
+        Tuple of (terms, arrays, expunged), where expunged is the set of
+        deleted doc ids that were found in the segments
+    """
+    # Union vocabulary; every posting is tagged with the id of its term
+    vocabulary = {}
+    term_ids = []
+    for terms, arrays in parts:
+        rows = np.array([vocabulary.setdefault(term, len(vocabulary)) for term in terms], dtype=np.int64)
+        term_ids.append(np.repeat(rows, np.diff(arrays["postings_offsets"])))
+    term_ids = np.concatenate(term_ids)
+    doc_ids = np.concatenate([arrays["doc_ids"] for _, arrays in parts]).astype(np.int64)
+    frequencies = np.concatenate([arrays["frequencies"] for _, arrays in parts]).astype(np.int64)
+    positions = np.concatenate([arrays["positions"] for _, arrays in parts]).astype(np.int32)
+    doc_lengths = np.concatenate([arrays["doc_lengths"] for _, arrays in parts]).astype(np.int64).reshape(-1, 2)
+    # Start of every posting's positions in the concatenated positions
+    position_starts = np.cumsum(frequencies) - frequencies
+    
+    deleted = np.fromiter(deleted, dtype=np.int64, count=len(deleted))
+    expunged = set(np.intersect1d(doc_lengths[:, 0], deleted).tolist())
+    order = np.lexsort((doc_ids, term_ids))
+    if expunged:
+        order = order[~np.isin(doc_ids[order], deleted)]
+        doc_lengths = doc_lengths[~np.isin(doc_lengths[:, 0], deleted)]
+    term_ids = term_ids[order]
+    doc_ids = doc_ids[order]
+    frequencies = frequencies[order]
+    
+    # Gather the positions of the kept postings in their new order: indexes
+    # position_starts[i] .. position_starts[i] + frequency - 1 of every one
+    lengths_before = np.cumsum(frequencies) - frequencies
+    offsets = np.repeat(position_starts[order] - lengths_before, frequencies)
+    positions = positions[offsets + np.arange(len(offsets))]
+    
+    # Terms whose postings were all deleted are dropped
+    posting_counts = np.bincount(term_ids, minlength=len(vocabulary))
+    position_counts = np.bincount(term_ids, weights=frequencies, minlength=len(vocabulary)).astype(np.int64)
+    rows = np.flatnonzero(posting_counts)
+    all_terms = list(vocabulary)
+    
+    def offsets_of(counts):
+        result = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(counts[rows], out=result[1:])
+        return result
+    
+    arrays = {
+        "postings_offsets": offsets_of(posting_counts),
+        "doc_ids": doc_ids,
+        "frequencies": frequencies,
+        "position_offsets": offsets_of(position_counts),
+        "positions": positions,
+        "doc_lengths": doc_lengths
+    }
+    return [all_terms[row] for row in rows.tolist()], arrays, expunged
+
+class SegmentedIndex:
+    """
+    BM25 inverted index that is updated without rebuilding it.
+    
+    New documents go to a small in-memory write buffer, an ordinary
+    InvertedIndex. When the buffer is full it is sealed into an immutable
+    segment held as flat arrays. Deleting a document from a sealed segment
+    only records a tombstone; the postings stay until a merge rewrites the
+    segment. Merges run in a background thread: MERGE_FACTOR adjacent
+    segments of the same size tier are merged into one, and segments with
+    more than MAX_DELETED_RATIO deleted documents are rewritten on their
+    own, so the number of segments grows logarithmically with the corpus.
+    
+    Searches fan out over the segments and the buffer and merge their top k
+    results. Every segment scores with the statistics of the whole index
+    (live document count, average length and document frequencies), so
+    the scores are the same as those of one InvertedIndex over the live
+    documents.
+    
+    Updates are expected from one thread at a time; searches may run
+    alongside them and alongside the background merges.
+    """
+    
+    def __init__(self, k1=DEFAULT_K1, b=DEFAULT_B, buffer_docs=DEFAULT_BUFFER_DOCS,
+                 merge_factor=MERGE_FACTOR, background_merges=True):
+        """
+        Initialize an empty index.
+        
+        Args:
+            k1: BM25 term frequency saturation
+            b: BM25 document length normalization
+            buffer_docs: Documents held in the write buffer before it is sealed
+            merge_factor: Number of same-tier segments merged at once
+            background_merges: Merge segments in a background thread instead
+                of during the update that made the merge due
+        """
+        self.k1 = k1
+        self.b = b
+        self.buffer_docs = buffer_docs
+        self.merge_factor = merge_factor
+        
+        # Sealed segments, oldest first; the tuple is replaced, never
+        # changed, so a search sees a consistent set of segments
+        self.segments = ()
+        self.buffer = InvertedIndex(k1=k1, b=b)
+        
+        # doc_id -> number of terms of the live documents of all segments
+        self.doc_lengths = {}
+        self.total_length = 0
+        # term -> number of live documents containing it
+        self.document_frequencies = {}
+        # Deleted documents whose postings are still in a sealed segment
+        self.deleted = set()
+        
+        # Guards the segments and tombstones against the merge thread
+        self.lock = threading.RLock()
+        self.merge_executor = ThreadPoolExecutor(max_workers=1) if background_merges else None
+        self.merge_future = None
+        self.merging = False
+    
+    def __len__(self):
+        """Return the number of indexed documents"""
+        return len(self.doc_lengths)
+    
+    def _parts(self):
+        """Return the sealed segments followed by the write buffer"""
+        return self.segments + (self.buffer,)
+    
+    def add(self, doc_id, terms):
+        """
+        Add a document to the write buffer, sealing it when it is full.
+        
+        Args:
+            doc_id: Integer id of the document
+            terms: List of the document's terms, in order
+        """
+        with self.lock:
+            if doc_id in self.doc_lengths or doc_id in self.deleted:
+                raise ValueError(f"Document {doc_id} is already indexed")
+            self.buffer.add(doc_id, terms)
+            self.doc_lengths[doc_id] = len(terms)
+            self.total_length += len(terms)
+            for term in set(terms):
+                self.document_frequencies[term] = self.document_frequencies.get(term, 0) + 1
+        
+        if len(self.buffer) >= self.buffer_docs:
+            self.flush()
+    
+    def remove(self, doc_id, terms):
+        """
+        Remove a document. Documents still in the write buffer are removed
+        from it; documents of sealed segments get a tombstone.
+        
+        Args:
+            doc_id: Integer id of the document
+            terms: The terms the document was indexed with
+        """
+        with self.lock:
+            length = self.doc_lengths.pop(doc_id, None)
+            if length is None:
+                return
+            self.total_length -= length
+            for term in set(terms):
+                count = self.document_frequencies.get(term, 0) - 1
+                if count > 0:
+                    self.document_frequencies[term] = count
+                else:
+                    self.document_frequencies.pop(term, None)
+            
+            if doc_id in self.buffer.doc_lengths:
+                self.buffer.remove(doc_id, terms)
+            else:
+                self.deleted.add(doc_id)
+    
+    def flush(self):
+        """Seal the write buffer into a segment and start the merges that are due"""
+        with self.lock:
+            if len(self.buffer):
+                terms, arrays = self.buffer.flatten()
+                segment = InvertedIndex.from_flat(terms, arrays, k1=self.k1, b=self.b)
+                self.segments = self.segments + (segment,)
+                self.buffer = InvertedIndex(k1=self.k1, b=self.b)
+        self.schedule_merges()
+    
+    def _tier(self, segment):
+        """Return the size tier of a segment: 0 for a sealed buffer, +1 per merge_factor times larger"""
+        tier = 0
+        size = self.buffer_docs * self.merge_factor
+        while len(segment) >= size:
+            tier += 1
+            size *= self.merge_factor
+        return tier
+    
+    def _merge_plan(self):
+        """
+        Pick the next segments to merge. Called with the lock held.
+        
+        Returns:
+            (start, end) slice of self.segments to merge, or None
+        """
+        segments = self.segments
+        if self.deleted:
+            for position, segment in enumerate(segments):
+                deleted = sum(1 for doc_id in self.deleted if doc_id in segment.doc_lengths)
+                if deleted > MAX_DELETED_RATIO * len(segment):
+                    return position, position + 1
+        
+        tiers = [self._tier(segment) for segment in segments]
+        for start in range(len(segments) - self.merge_factor + 1):
+            if len(set(tiers[start:start + self.merge_factor])) == 1:
+                return start, start + self.merge_factor
+        return None
+    
+    def _run_merges(self):
+        """Merge segments until no merge is due"""
+        try:
+            while True:
+                with self.lock:
+                    plan = self._merge_plan()
+                    if plan is None:
+                        self.merging = False
+                        return
+                    start, end = plan
+                    segments = self.segments[start:end]
+                    deleted = frozenset(self.deleted)
+                
+                # The segments are immutable, so they are merged without
+                # holding the lock
+                terms, arrays, expunged = merge_flat([segment.flatten() for segment in segments], deleted)
+                merged = ()
+                if len(arrays["doc_lengths"]):
+                    merged = (InvertedIndex.from_flat(terms, arrays, k1=self.k1, b=self.b),)
+                
+                with self.lock:
+                    # Sealing only appends and merges run one at a time, so
+                    # the merged segments are still in place
+                    current = self.segments
+                    self.segments = current[:start] + merged + current[end:]
+                    self.deleted = self.deleted - expunged
+        except Exception as e:
+            print(f"Error merging index segments: {str(e)}")
+            with self.lock:
+                self.merging = False
+    
+    def schedule_merges(self):
+        """Start merging segments if a merge is due and none is running"""
+        if self.merge_executor is None:
+            self._run_merges()
+            return
+        with self.lock:
+            if not self.merging:
+                self.merging = True
+                self.merge_future = self.merge_executor.submit(self._run_merges)
+    
+    def wait_for_merges(self):
+        """Block until the running background merges are done"""
+        future = self.merge_future
+        if future is not None:
+            future.result()
+    
+    def idf(self, term):
+        """
+        Return the BM25 inverse document frequency of a term over the live
+        documents.
+        
+        Args:
+            term: Index term
+        
+        Returns:
+            The idf, 0 for unknown terms
+        """
+        document_frequency = self.document_frequencies.get(term)
+        if not document_frequency:
+            return 0.0
+        return bm25_idf(len(self.doc_lengths), document_frequency)
+    
+    def max_score(self, query_terms):
+        """
+        Return the highest BM25 score any document could reach for a query.
+        Used to normalize scores to the 0-1 range.
+        
+        Args:
+            query_terms: List of query terms
+        
+        Returns:
+            Upper bound of the query score
+        """
+        return sum(self.idf(term) for term in set(query_terms)) * (self.k1 + 1)
+    
+    def _length_factors(self):
+        """Return the constant and per-term-count parts of the BM25 length normalization"""
+        average_length = self.total_length / len(self.doc_lengths) or 1
+        return self.k1 * (1 - self.b), self.k1 * self.b / average_length
+    
+    def score(self, query_terms, doc_ranges=None):
+        """
+        Score all documents that contain at least one query term.
+        
+        Args:
+            query_terms: List of query terms
+            doc_ranges: Optional sorted list of half-open (start, end) doc id
+                ranges to restrict the search to
+        
+        Returns:
+            Dictionary of doc_id -> BM25 score
+        """
+        return self.score_many([query_terms], doc_ranges)[0]
+    
+    def _part_scores(self, queries, doc_ranges):
+        """Score queries on every segment; returns one list of score dictionaries per part"""
+        return [part.score_many(queries, doc_ranges, collection=self) for part in self._parts()]
+    
+    def score_many(self, queries, doc_ranges=None):
+        """
+        Score many queries on every segment.
+        
+        Args:
+            queries: List of query term lists
+            doc_ranges: Optional sorted list of half-open (start, end) doc id
+                ranges to restrict the search to
+        
+        Returns:
+            List with the doc_id -> BM25 score dictionary of each query
+        """
+        scores = [{} for _ in queries]
+        # Segments hold disjoint documents, so their scores never overlap
+        for part_scores in self._part_scores(queries, doc_ranges):
+            for query_scores, segment_scores in zip(scores, part_scores):
+                query_scores.update(segment_scores)
+        return scores
+    
+    def search(self, query_terms, k=5, doc_ranges=None, pool=0, headroom=0.0):
+        """
+        Find the k best matching documents for a query.
+        
+        Args:
+            query_terms: List of query terms
+            k: Number of results to return
+            doc_ranges: Optional sorted list of half-open (start, end) doc id
+                ranges to restrict the search to
+            pool: Number of results to return for rescoring, if more than k
+            headroom: Largest share of the gap to the maximum score that
+                rescoring can add to a score, see InvertedIndex.top_k
+        
+        Returns:
+            List of (doc_id, score) tuples, best first, with scores
+            normalized to the 0-1 range
+        """
+        # Every segment selects its top k with dynamic pruning; the largest
+        # segments go first, so the k-th best score found so far lets the
+        # smaller ones prune more
+        rank = lambda item: (item[1], -item[0])
+        size = max(k, pool)
+        top = []
+        for part in sorted(self._parts(), key=len, reverse=True):
+            threshold = top[k - 1][1] if len(top) >= k else 0.0
+            floor = top[-1][1] if len(top) >= size else 0.0
+            candidates = part.top_k(query_terms, k, doc_ranges, collection=self, threshold=threshold,
+                                    pool=pool, headroom=headroom, floor=floor)
+            top = heapq.nlargest(size, top + candidates, key=rank)
+        
+        max_score = self.max_score(query_terms) or 1.0
+        return [(doc_id, score / max_score) for doc_id, score in top]
+    
+    def search_many(self, queries, k=5, doc_ranges=None):
+        """
+        Find the k best matching documents for many queries at once. Every
+        segment selects its own top k, and the best k of those are returned.
+        
+        Args:
+            queries: List of query term lists
+            k: Number of results to return per query
+            doc_ranges: Optional sorted list of half-open (start, end) doc id
+                ranges to restrict the search to
+        
+        Returns:
+            List with the (doc_id, score) results of each query
+        """
+        part_scores = self._part_scores(queries, doc_ranges)
+        rank = lambda item: (item[1], -item[0])
+        
+        results = []
+        for position, query_terms in enumerate(queries):
+            candidates = []
+            for scores in part_scores:
+                candidates.extend(heapq.nlargest(k, scores[position].items(), key=rank))
+            max_score = self.max_score(query_terms) or 1.0
+            top = heapq.nlargest(k, candidates, key=rank)
+            results.append([(doc_id, score / max_score) for doc_id, score in top])
+        return results
+    
+    def _live(self, doc_ids):
+        """Return the sorted ids of the live documents among doc ids of several segments"""
+        doc_lengths = self.doc_lengths
+        doc_ids = np.sort(doc_ids)
+        live = np.fromiter((doc_id in doc_lengths for doc_id in doc_ids.tolist()), dtype=bool, count=len(doc_ids))
+        return doc_ids[live]
+    
+    def phrase_doc_ids(self, phrase_terms, doc_ranges=None):
+        """
+        Find the documents that contain the terms of a phrase next to each
+        other and in order.
+        
+        Args:
+            phrase_terms: Non-empty list of the phrase's index terms
+            doc_ranges: Optional sorted list of half-open (start, end) doc id
+                ranges to restrict the search to
+        
+        Returns:
+            Sorted int64 array of the matching doc ids
+        """
+        return self._live(np.concatenate([
+            part.phrase_doc_ids(phrase_terms, doc_ranges) for part in self._parts()
+        ]))
+    
+    def near_doc_ids(self, left_term, right_term, distance, doc_ranges=None):
+        """
+        Find the documents where two terms occur at most distance terms
+        apart, in either order.
+        
+        Args:
+            left_term: First index term
+            right_term: Second index term
+            distance: Largest allowed difference of the term positions
+            doc_ranges: Optional sorted list of half-open (start, end) doc id
+                ranges to restrict the search to
+        
+        Returns:
+            Sorted int64 array of the matching doc ids
+        """
+        return self._live(np.concatenate([
+            part.near_doc_ids(left_term, right_term, distance, doc_ranges) for part in self._parts()
+        ]))
+    
+    def proximity(self, query_terms, doc_ids):
+        """
+        Measure how close together the query terms occur in documents.
+        
+        Args:
+            query_terms: List of query terms
+            doc_ids: Doc ids to measure
+        
+        Returns:
+            Dictionary of doc_id -> (matched, width), see
+            InvertedIndex.proximity
+        """
+        doc_ids = [doc_id for doc_id in doc_ids if doc_id in self.doc_lengths]
+        spans = {}
+        for part in self._parts():
+            spans.update(part.proximity(query_terms, doc_ids))
+        return spans
+    
+    def flatten(self):
+        """
+        Lay the live documents of all segments out as the flat arrays of
+        one segment (see InvertedIndex.flatten).
+        
+        Returns:
+            Tuple of (terms, arrays)
+        """
+        parts = [part for part in self._parts() if len(part)]
+        deleted = frozenset(self.deleted)
+        if len(parts) == 1 and not deleted:
+            return parts[0].flatten()
+        if not parts:
+            return InvertedIndex(k1=self.k1, b=self.b).flatten()
+        terms, arrays, _ = merge_flat([part.flatten() for part in parts], deleted)
+        return terms, arrays
+    
+    def save(self, directory):
+        """
+        Save the live documents as one segment, in the file layout of
+        InvertedIndex.save.
+        
+        Args:
+            directory: Directory to write the index files to
+        """
+        save_flat(directory, *self.flatten(), k1=self.k1, b=self.b)
+    
+    @classmethod
+    def load(cls, directory, mmap=True, **kwargs):
+        """
+        Load an index saved with save (or InvertedIndex.save) as a single
+        segment.
+        
+        Args:
+            directory: Directory the index was saved to
+            mmap: Memory-map the postings arrays instead of reading them
+            **kwargs: Further SegmentedIndex arguments
+        
+        Returns:
+            The loaded SegmentedIndex
+        """
+        terms, arrays, info = load_flat(directory, mmap)
+        index = cls(k1=info["k1"], b=info["b"], **kwargs)
+        segment = InvertedIndex.from_flat(terms, arrays, k1=index.k1, b=index.b)
+        if len(segment):
+            index.segments = (segment,)
+        index.doc_lengths = dict(segment.doc_lengths)
+        index.total_length = segment.total_length
+        index.document_frequencies = dict(zip(terms, np.diff(arrays["postings_offsets"]).tolist()))
+        return index
@@ -0,0 +1,213 @@
+import numpy as np
+from scipy import sparse
+
+class SparseIndex:
+    """
+    BM25 scoring as sparse matrix products.
+    
+    The corpus is held as a CSR term-document matrix whose entries are the
+    precomputed BM25 weight of a term in a document, so a query is scored
+    with one sparse vector-matrix product that only touches the rows of the
+    query terms, and many queries are scored with one matrix-matrix product.
+    The top k results are selected with numpy.argpartition.
+    
+    The matrix is a read-only snapshot of an InvertedIndex or SegmentedIndex;
+    build a new one after the index changes.
+    """
+    
+    def __init__(self, matrix, doc_ids, vocabulary, idfs, k1):
+        """
+        Initialize the index from its parts. Use from_inverted_index to
+        build one.
+        
+        Args:
+            matrix: CSR matrix of terms x documents holding BM25 weights
+            doc_ids: Array of the doc id of each matrix column
+            vocabulary: Dictionary of term -> matrix row
+            idfs: Array of the idf of each matrix row
+            k1: BM25 term frequency saturation, used to normalize scores
+        """
+        self.matrix = matrix
+        self.doc_ids = doc_ids
+        self.vocabulary = vocabulary
+        self.idfs = idfs
+        self.k1 = k1
+    
+    @classmethod
+    def from_inverted_index(cls, index):
+        """
+        Build the matrix from the postings of an inverted index.
+        
+        Args:
+            index: InvertedIndex or SegmentedIndex to snapshot
+        
+        Returns:
+            A new SparseIndex with the same scores as the inverted index
+        """
+        # The flat layout holds the postings of every term back to back,
+        # sorted by doc id, so they are the CSR rows as they are
+        terms, arrays = index.flatten()
+        doc_lengths = arrays["doc_lengths"][np.argsort(arrays["doc_lengths"][:, 0])]
+        doc_ids = doc_lengths[:, 0]
+        average_length = (index.total_length / len(doc_ids) if len(doc_ids) else 0) or 1
+        # Per-document part of the BM25 denominator
+        length_norms = index.k1 * (1 - index.b + index.b * doc_lengths[:, 1].astype(np.float64) / average_length)
+        
+        vocabulary = {term: row for row, term in enumerate(terms)}
+        idfs = np.array([index.idf(term) for term in terms], dtype=np.float64)
+        
+        indptr = np.asarray(arrays["postings_offsets"], dtype=np.int64)
+        rows = np.repeat(np.arange(len(terms)), np.diff(indptr))
+        columns = np.searchsorted(doc_ids, np.asarray(arrays["doc_ids"], dtype=np.int64))
+        frequencies = np.asarray(arrays["frequencies"], dtype=np.float64)
+        weights = idfs[rows] * frequencies * (index.k1 + 1) / (frequencies + length_norms[columns])
+        
+        matrix = sparse.csr_matrix((weights, columns, indptr), shape=(len(terms), len(doc_ids)))
+        return cls(matrix, doc_ids, vocabulary, idfs, index.k1)
+    
+    def __len__(self):
+        """Return the number of indexed documents"""
+        return len(self.doc_ids)
+    
+    def _query_rows(self, query_terms):
+        """Return the matrix rows of the distinct known query terms"""
+        return sorted({self.vocabulary[term] for term in query_terms if term in self.vocabulary})
+    
+    def _query_matrix(self, queries):
+        """Build the CSR matrix of queries x terms with a 1 per query term"""
+        indptr = [0]
+        rows = []
+        for query_terms in queries:
+            rows.extend(self._query_rows(query_terms))
+            indptr.append(len(rows))
+        data = np.ones(len(rows), dtype=np.float64)
+        return sparse.csr_matrix(
+            (data, np.array(rows, dtype=np.int64), np.array(indptr, dtype=np.int64)),
+            shape=(len(queries), len(self.vocabulary))
+        )
+    
+    def _top_k(self, columns, scores, k, max_score):
+        """
+        Select the k best of the scored columns, ties broken by lower doc id.
+        
+        Args:
+            columns: Array of matrix columns with a non-zero score
+            scores: Array of the scores of those columns
+            k: Number of results to return
+            max_score: Score that maps to 1.0
+        
+        Returns:
+            List of (doc_id, score) tuples, best first
+        """
+        if not len(scores) or k <= 0:
+            return []
+        
+        if len(scores) > k:
+            # Keep everything that scores at least the k-th best score, so
+            # ties at the cut are decided by doc id rather than by the
+            # partition order
+            kth_score = -np.partition(-scores, k - 1)[k - 1]
+            keep = np.flatnonzero(scores >= kth_score)
+            columns = columns[keep]
+            scores = scores[keep]
+        
+        doc_ids = self.doc_ids[columns]
+        order = np.lexsort((doc_ids, -scores))[:k]
+        return [(int(doc_ids[i]), float(scores[i] / max_score)) for i in order]
+    
+    def search(self, query_terms, k=5, doc_ranges=None, pool=0, headroom=0.0):
+        """
+        Find the k best matching documents for a query.
+        
+        Args:
+            query_terms: List of query terms
+            k: Number of results to return
+            doc_ranges: Optional sorted list of half-open (start, end) doc id
+                ranges to restrict the search to
+            pool: Number of results to return for rescoring, if more than k
+            headroom: Accepted for compatibility with InvertedIndex.search;
+                every document is scored anyway
+        
+        Returns:
+            List of (doc_id, score) tuples, best first, with scores
+            normalized to the 0-1 range
+        """
+        return self.search_many([query_terms], k=max(k, pool), doc_ranges=doc_ranges)[0]
+    
+    def search_many(self, queries, k=5, doc_ranges=None):
+        """
+        Find the k best matching documents for many queries at once.
+        
+        Args:
+            queries: List of query term lists
+            k: Number of results to return per query
+            doc_ranges: Optional sorted list of half-open (start, end) doc id
+                ranges to restrict the search to
+        
+        Returns:
+            List with the (doc_id, score) results of each query
+        """
+        if not queries:
+            return []
+        
+        results = []
+        if doc_ranges is not None:
+            column_ranges = self._column_ranges(doc_ranges)
+            for query_terms in queries:
+                columns, column_scores = self._filtered_scores(query_terms, column_ranges)
+                results.append(self._top_k(columns, column_scores, k, self._max_score(query_terms)))
+            return results
+        
+        # One matrix-matrix product scores every query
+        scores = (self._query_matrix(queries) @ self.matrix).tocsr()
+        
+        for position, query_terms in enumerate(queries):
+            start, end = scores.indptr[position], scores.indptr[position + 1]
+            columns = scores.indices[start:end]
+            column_scores = scores.data[start:end]
+            results.append(self._top_k(columns, column_scores, k, self._max_score(query_terms)))
+        return results
+    
+    def _max_score(self, query_terms):
+        """Return the score that maps to 1.0 for a query"""
+        return self.idfs[self._query_rows(query_terms)].sum() * (self.k1 + 1) or 1.0
+    
+    def _column_ranges(self, doc_ranges):
+        """Translate doc id ranges into (starts, ends) arrays of matrix column ranges"""
+        starts = np.array([start for start, _ in doc_ranges], dtype=np.int64)
+        ends = np.array([end for _, end in doc_ranges], dtype=np.int64)
+        return np.searchsorted(self.doc_ids, starts), np.searchsorted(self.doc_ids, ends)
+    
+    def _filtered_scores(self, query_terms, column_ranges):
+        """
+        Score a query on a subset of the columns. Rows are sorted by column,
+        so the entries inside each column range are found by binary search
+        and only those are read.
+        
+        Args:
+            query_terms: List of query terms
+            column_ranges: (starts, ends) arrays of half-open column ranges
+        
+        Returns:
+            Tuple of (columns, scores) arrays of the matching columns
+        """
+        range_starts, range_ends = column_ranges
+        indptr, indices, data = self.matrix.indptr, self.matrix.indices, self.matrix.data
+        positions = []
+        for row in self._query_rows(query_terms):
+            row_start, row_end = indptr[row], indptr[row + 1]
+            row_columns = indices[row_start:row_end]
+            lows = row_start + np.searchsorted(row_columns, range_starts)
+            highs = row_start + np.searchsorted(row_columns, range_ends)
+            lengths = highs - lows
+            total = lengths.sum()
+            if total:
+                # Entry positions lows[i] .. highs[i] - 1 of every range
+                offsets = np.repeat(lows - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+                positions.append(offsets + np.arange(total))
+        
+        if not positions:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        positions = np.concatenate(positions)
+        columns, inverse = np.unique(indices[positions], return_inverse=True)
+        return columns, np.bincount(inverse, weights=data[positions])
@@ -1,110 +1,914 @@
 import os
-import re
+import time
+import heapq
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from langchain.schema import Document
+from utils.document_processor import normalize_text
+from utils.chunk_store import ChunkStore, DocumentsView, ArticleIndexView
+from utils.deduplication import NearDuplicateIndex, minhash_signature
+from utils.segmented_index import SegmentedIndex
+from utils.sparse_index import SparseIndex
+from utils.dense_index import DenseIndex
+from utils.ann_index import IVFIndex, DEFAULT_NPROBE
+from utils.analyzers import MultilingualAnalyzer
+from utils.query_parser import parse_query
+from utils.search_filters import select_chunk_ids, id_ranges
+from utils.query_cache import QueryCache, freeze_filters, DEFAULT_CACHE_SIZE, DEFAULT_CACHE_TTL
+from utils.reranker import Reranker, RERANK_CANDIDATES
+from utils.fuzzy_index import TrigramIndex, auto_max_edits
+from utils.index_snapshot import write_manifest, read_manifest, replace_directory
+
+# Scoring engines: "inverted" walks the postings lists in Python, "sparse"
+# scores with sparse matrix products over a snapshot of the same index
+SEARCH_ENGINES = ("inverted", "sparse")
+
+# Results taken from each retriever before hybrid fusion
+HYBRID_CANDIDATES = 50
+
+# Lexical results rescored by term proximity, and the largest share of the
+# gap to a perfect score that close query terms can add
+PROXIMITY_CANDIDATES = 50
+PROXIMITY_WEIGHT = 0.3
+
+# Factor applied to the score of a fuzzy match for every edit between it
+# and the query term
+FUZZY_EDIT_WEIGHT = 0.7
+
+# (duplicate chunk id, original chunk id) pairs of a saved vector store
+DUPLICATE_OF_FILE = "duplicate_of.npy"
+
+# Rank offset of reciprocal rank fusion; larger values flatten the
+# difference between top and lower ranks
+RRF_K = 60
+
+def reciprocal_rank_fusion(result_lists, rrf_k=RRF_K):
+    """
+    Fuse ranked result lists with reciprocal rank fusion.
+    
+    Every document scores the sum of 1 / (rrf_k + rank) over the lists it
+    appears in. Scores are divided by the best possible score, so a
+    document ranked first by every list scores 1.0.
+    
+    Args:
+        result_lists: List of ranked lists of (doc_id, score) tuples
+        rrf_k: Rank offset
+    
+    Returns:
+        List of (doc_id, fused score) tuples, best first, ties broken by
+        lower doc id
+    """
+    fused = {}
+    for results in result_lists:
+        for rank, (doc_id, _) in enumerate(results, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+    
+    best_score = len(result_lists) / (rrf_k + 1) or 1.0
+    ranked = sorted(fused.items(), key=lambda item: (-item[1], item[0]))
+    return [(doc_id, score / best_score) for doc_id, score in ranked]
+
+def _timed(function, *args, **kwargs):
+    """Call a function and return its result with the elapsed seconds"""
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
 
 class VectorStore:
-    """Simple search class for document retrieval using keyword matching"""
+    """Search class for document retrieval using a BM25 inverted index"""
     
-    def __init__(self, documents, use_huggingface=True):
+    def __init__(self, documents, use_huggingface=True, analyzer=None, engine="inverted", encoder=None,
+                 cache_size=DEFAULT_CACHE_SIZE, cache_ttl=DEFAULT_CACHE_TTL, reranker=None):
         """
         Initialize the search engine with documents.
         
         Args:
             documents: List of LangChain Document objects
             use_huggingface: Not used, kept for backward compatibility
+            analyzer: Analyzer that turns normalized text into index terms,
+                used for both documents and queries (default: MultilingualAnalyzer)
+            engine: Scoring engine, one of SEARCH_ENGINES
+            encoder: Encoder that embeds chunks and queries for semantic
+                search (see utils.dense_index); semantic search is disabled
+                without one
+            cache_size: Number of query results kept in the result cache,
+                0 to disable it
+            cache_ttl: Seconds a cached result stays valid
+            reranker: Reranker of reranked_search (default: Reranker with
+                the cheap features only)
         """
-        self.documents = documents
+        if engine not in SEARCH_ENGINES:
+            raise ValueError(f"Unknown search engine: {engine}")
+        self.engine = engine
+        self.analyzer = analyzer or MultilingualAnalyzer()
+        self.encoder = encoder
+        self.reranker = reranker or Reranker()
+        # Runs the lexical and dense retrievers of hybrid search side by side
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        # Results of recent queries, keyed by normalized query, k and filters;
+        # cleared whenever the indexed corpus changes
+        self.query_cache = QueryCache(cache_size, cache_ttl)
+        
+        # Chunks are kept in a compact store and only materialized as
+        # Document objects when requested
+        self.chunks = ChunkStore()
         self.use_huggingface = True  # Always use simple search
+        # Source path -> content hash of the PDF files that produced no
+        # chunks; sync_corpus skips them until their content changes
+        self.failed_files = {}
         
         # Pre-process documents for search
         self.process_documents()
+        self.add_documents(documents)
+    
+    @property
+    def documents(self):
+        """Sequence of the indexed chunks as LangChain Document objects"""
+        return DocumentsView(self.chunks)
+    
+    @property
+    def article_index(self):
+        """Mapping of (law_name, article_number) -> article spans in the chunks"""
+        return ArticleIndexView(self.chunks)
+    
+    @property
+    def indexed_files(self):
+        """Mapping of indexed source path -> content hash"""
+        return self.chunks.sources()
+    
+    def law_names(self):
+        """Return the sorted unique names of the indexed laws"""
+        return self.chunks.law_names()
+    
+    def law_text(self, law_name, max_length=None):
+        """
+        Return the text of a law's chunks, one chunk per line. Only the
+        chunks of the law are read, and none once max_length is reached.
+        
+        Args:
+            law_name: Name of the law
+            max_length: Optional number of characters after which the
+                text is cut
+        
+        Returns:
+            The text of the law's chunks
+        """
+        parts = []
+        length = 0
+        for chunk_id in select_chunk_ids(self.chunks, {"law_name": law_name}).tolist():
+            if max_length is not None and length >= max_length:
+                break
+            text = self.chunks.text(chunk_id)
+            parts.append(text)
+            length += len(text) + 1
+        text = "\n".join(parts)
+        return text if max_length is None else text[:max_length]
+    
+    def save(self, path):
+        """
+        Save the chunks and search indexes as a snapshot directory.
+        
+        The snapshot holds the chunk texts and records, the postings,
+        vocabulary and document lengths of the inverted index, the
+        near-duplicate signatures and, with an encoder, the embedding
+        matrix and ANN index, all as .npy arrays, JSON and text; nothing
+        is pickled. A manifest records the format version and a checksum
+        of every file. The snapshot is written to a temporary directory and
+        moved into place when complete.
+        
+        Args:
+            path: Snapshot directory
+        """
+        temp_path = f"{path}.tmp"
+        if os.path.exists(temp_path):
+            shutil.rmtree(temp_path)
+        
+        self._embed_pending()
+        self.chunks.save(os.path.join(temp_path, "chunks"))
+        self.index.save(os.path.join(temp_path, "index"))
+        self.near_duplicates.save(os.path.join(temp_path, "duplicates"))
+        np.save(
+            os.path.join(temp_path, "duplicates", DUPLICATE_OF_FILE),
+            np.array(list(self.duplicate_of.items()), dtype=np.int64).reshape(-1, 2)
+        )
+        if self.dense_index is not None:
+            self.dense_index.save(os.path.join(temp_path, "dense"))
+            # Saved after the dense index, which drops removed rows first
+            if self.ann_index is not None:
+                self.ann_index.save(os.path.join(temp_path, "ann"))
+        
+        encoder = None
+        if self.encoder is not None:
+            encoder = {"name": type(self.encoder).__name__, "dimension": self.encoder.dimension}
+        write_manifest(temp_path, {
+            "engine": self.engine,
+            "analyzer": type(self.analyzer).__name__,
+            "encoder": encoder,
+            "chunks": len(self.chunks)
+        })
+        replace_directory(temp_path, path)
+    
+    @classmethod
+    def load(cls, path, mmap=True, analyzer=None, engine=None, encoder=None, verify=True,
+             cache_size=DEFAULT_CACHE_SIZE, cache_ttl=DEFAULT_CACHE_TTL, reranker=None):
+        """
+        Load a vector store saved with save.
+        
+        The postings and embedding matrix are memory-mapped, so loading
+        does not read them and processes that load the same snapshot share
+        their pages. The store can be updated afterwards; changed postings
+        are copied into memory.
+        
+        Args:
+            path: Snapshot directory
+            mmap: Memory-map the large arrays instead of reading them
+            analyzer: Analyzer the snapshot was built with (default:
+                MultilingualAnalyzer)
+            engine: Scoring engine (default: the engine of the saved store)
+            encoder: Encoder for semantic search; embeddings saved by
+                another encoder are recomputed
+            verify: Check the checksums of the snapshot files modified
+                since it was saved before loading, or of all of them with
+                "full" (see read_manifest)
+            cache_size: Number of query results kept in the result cache
+            cache_ttl: Seconds a cached result stays valid
+            reranker: Reranker of reranked_search
+        
+        Returns:
+            The loaded VectorStore
+        
+        Raises:
+            ValueError: If the snapshot is invalid or was built with a
+                different analyzer
+        """
+        info = read_manifest(path, verify=verify)
+        analyzer = analyzer or MultilingualAnalyzer()
+        if type(analyzer).__name__ != info["analyzer"]:
+            raise ValueError(f"The index was built with {info['analyzer']}, not {type(analyzer).__name__}")
+        
+        store = cls([], analyzer=analyzer, engine=engine or info["engine"], encoder=encoder,
+                    cache_size=cache_size, cache_ttl=cache_ttl, reranker=reranker)
+        store.chunks = ChunkStore.load(os.path.join(path, "chunks"))
+        store.index = SegmentedIndex.load(os.path.join(path, "index"), mmap=mmap)
+        store.near_duplicates = NearDuplicateIndex.load(os.path.join(path, "duplicates"))
+        duplicate_of = np.load(os.path.join(path, "duplicates", DUPLICATE_OF_FILE))
+        for duplicate_id, original_id in duplicate_of.tolist():
+            store.duplicate_of[duplicate_id] = original_id
+            store.duplicates.setdefault(original_id, []).append(duplicate_id)
+        
+        if encoder is not None:
+            saved_encoder = info["encoder"]
+            if saved_encoder == {"name": type(encoder).__name__, "dimension": encoder.dimension}:
+                store.dense_index = DenseIndex.load(os.path.join(path, "dense"), mmap=mmap)
+                if os.path.isdir(os.path.join(path, "ann")):
+                    store.ann_index = IVFIndex.load(os.path.join(path, "ann"), store.dense_index, mmap=mmap)
+            else:
+                # Embed the searchable chunks with the new encoder
+                store.pending_embeddings = [
+                    (chunk_id, normalize_text(store.chunks.text(chunk_id)))
+                    for chunk_id in sorted(store.index.doc_lengths)
+                ]
+                store._embed_pending()
+        return store
     
     def process_documents(self):
         """Process documents to prepare them for search"""
-        # Create a mapping of document content to document objects
-        self.doc_contents = {}
-        for doc in self.documents:
-            # Get content and tokenize into lowercase words
-            content = doc.page_content.lower()
-            # Create mapping from content to document
-            self.doc_contents[content] = doc
+        self.query_cache.clear()
+        # Inverted index over the terms of every chunk that takes part in
+        # search, updated through a write buffer and merged segments
+        self.index = SegmentedIndex()
+        # Matrix snapshot of the index for the sparse engine, built on demand
+        self.sparse_index = None
+        # Trigram index over the index terms for fuzzy search, built on demand
+        self.fuzzy_index = None
+        # Near-duplicate chunks are kept out of search; they are tracked per
+        # original so they can take its place if the original is removed
+        self.near_duplicates = NearDuplicateIndex()
+        self.duplicates = {}
+        self.duplicate_of = {}
+        # Chunk embeddings for semantic search; chunks are queued as
+        # (chunk_id, search_text) and embedded in batches
+        self.dense_index = DenseIndex(self.encoder.dimension) if self.encoder else None
+        self.pending_embeddings = []
+        # Optional approximate nearest neighbour index over the embeddings
+        self.ann_index = None
+        for chunk_id in self.chunks.live_ids():
+            self._add_searchable(chunk_id)
+        self._embed_pending()
     
-    def text_similarity(self, query, text):
+    def analyze(self, text):
         """
-        Calculate a simple similarity score between query and text.
+        Turn a normalized text into index terms with the store's analyzer.
         
         Args:
-            query: The search query
-            text: The text to compare against
-            
+            text: Normalized text
+        
         Returns:
-            A similarity score (higher is better)
+            List of terms in text order
         """
-        query = query.lower()
-        text = text.lower()
+        return self.analyzer.analyze(text)
+    
+    def _chunk_terms(self, chunk_id, search_text=None):
+        """Return the index terms of a chunk"""
+        # Documents normally carry the search form computed at ingest
+        if search_text is None:
+            search_text = normalize_text(self.chunks.text(chunk_id))
+        return self.analyze(search_text)
+    
+    def _add_searchable(self, chunk_id, search_text=None):
+        """Add a chunk to search unless it duplicates an indexed chunk of its law"""
+        # Documents normally carry the search form computed at ingest
+        if search_text is None:
+            search_text = normalize_text(self.chunks.text(chunk_id))
+        signature = minhash_signature(search_text)
         
-        # Count how many query terms appear in the text
-        query_terms = re.findall(r'\b\w+\b', query)
-        matches = sum(1 for term in query_terms if term in text)
+        # Only chunks of the same law are merged, so filtering or searching
+        # by law still finds text that other laws repeat
+        law_id = self.chunks.chunk_laws[chunk_id]
+        original_id = self.near_duplicates.find(
+            signature, accept=lambda key: self.chunks.chunk_laws[key] == law_id
+        )
+        if original_id is not None:
+            self.duplicates.setdefault(original_id, []).append(chunk_id)
+            self.duplicate_of[chunk_id] = original_id
+            return
         
-        # Calculate a score between 0 and 1
-        if not query_terms:
-            return 0
+        self.near_duplicates.add(chunk_id, signature)
+        terms = self.analyze(search_text)
+        self.index.add(chunk_id, terms)
+        self.sparse_index = None
+        if self.fuzzy_index is not None:
+            self.fuzzy_index.add_terms(terms)
+        if self.dense_index is not None:
+            self.pending_embeddings.append((chunk_id, search_text))
+    
+    def _embed_pending(self):
+        """Embed the queued chunks with one encoder call"""
+        if not self.pending_embeddings:
+            return
+        chunk_ids, texts = zip(*self.pending_embeddings)
+        self.pending_embeddings = []
+        self.dense_index.add(list(chunk_ids), self.encoder.encode(list(texts)))
+    
+    def _remove_searchable(self, chunk_id, removed_ids):
+        """
+        Remove a chunk from search. Near duplicates of a removed original
+        that are themselves kept are indexed again in its place.
+        """
+        original_id = self.duplicate_of.pop(chunk_id, None)
+        if original_id is not None:
+            self.duplicates[original_id].remove(chunk_id)
+            return
         
-        score = matches / len(query_terms)
+        self.index.remove(chunk_id, self._chunk_terms(chunk_id))
+        self.sparse_index = None
+        if self.dense_index is not None:
+            self.dense_index.remove(chunk_id)
+        self.near_duplicates.remove(chunk_id)
+        for duplicate_id in self.duplicates.pop(chunk_id, []):
+            self.duplicate_of.pop(duplicate_id, None)
+            if duplicate_id not in removed_ids:
+                self._add_searchable(duplicate_id)
+    
+    def add_documents(self, documents):
+        """
+        Add documents to the index without reprocessing the existing ones.
         
-        # Boost score if the exact query appears in the text
-        if query in text:
-            score += 0.5
-            
-        # Cap at 1.0
-        return min(score, 1.0)
+        Args:
+            documents: List of LangChain Document objects
+        """
+        chunk_ids = self.chunks.add_documents(documents)
+        for chunk_id, doc in zip(chunk_ids, documents):
+            self._add_searchable(chunk_id, doc.metadata.get("search_text"))
+        self._embed_pending()
+        self.query_cache.clear()
+    
+    def remove_source(self, source):
+        """
+        Remove all documents of a source file from the index.
+        
+        Args:
+            source: Source path of the documents to remove
+        
+        Returns:
+            Number of removed documents
+        """
+        # Unindex while the chunk text is still available
+        removed = list(self.chunks.chunk_ids_for_source(source))
+        removed_ids = set(removed)
+        for chunk_id in removed:
+            self._remove_searchable(chunk_id, removed_ids)
+        # Segments that are now mostly tombstones are rewritten in the background
+        self.index.schedule_merges()
+        # Terms of the removed chunks may be gone from the index
+        self.fuzzy_index = None
+        self.chunks.remove_source(source)
+        # Promoted near duplicates still need their embeddings
+        self._embed_pending()
+        self.query_cache.clear()
+        
+        return len(removed)
+    
+    def _scoring_index(self):
+        """Return the index that scores queries for the selected engine"""
+        if self.engine == "sparse":
+            if self.sparse_index is None:
+                self.sparse_index = SparseIndex.from_inverted_index(self.index)
+            return self.sparse_index
+        return self.index
+    
+    def _doc_ranges(self, filters):
+        """
+        Turn metadata filters into the chunk id ranges the indexes search.
+        
+        Args:
+            filters: Dictionary of metadata filters (see utils.search_filters),
+                or None
+        
+        Returns:
+            Sorted list of half-open (start, end) chunk id ranges, or None
+            when there is nothing to filter
+        """
+        if not filters:
+            return None
+        return id_ranges(select_chunk_ids(self.chunks, filters))
+    
+    def cache_stats(self):
+        """Return the hit, miss and eviction counters of the result cache"""
+        return self.query_cache.stats()
+    
+    def _cached(self, key, compute):
+        """Return the cached result for key, computing and storing it on a miss"""
+        results = self.query_cache.get(key)
+        if results is None:
+            results = compute()
+            self.query_cache.put(key, results)
+        return results
+    
+    def _constrained_ranges(self, parsed, doc_ranges):
+        """
+        Restrict the searched chunk ids to the chunks that match the quoted
+        phrases and NEAR clauses of a query.
+        
+        Args:
+            parsed: ParsedQuery
+            doc_ranges: Chunk id ranges allowed by the filters, or None
+        
+        Returns:
+            Sorted list of half-open (start, end) chunk id ranges, or
+            doc_ranges when the query has no positional clauses
+        """
+        if not parsed.has_constraints:
+            return doc_ranges
+        
+        chunk_ids = None
+        for phrase in parsed.phrases:
+            phrase_terms = self.analyze(phrase)
+            # A phrase of stopwords only constrains nothing
+            if phrase_terms:
+                matches = self.index.phrase_doc_ids(phrase_terms, doc_ranges)
+                chunk_ids = matches if chunk_ids is None else np.intersect1d(chunk_ids, matches)
+        for left, right, distance in parsed.near:
+            left_terms = self.analyze(left)
+            right_terms = self.analyze(right)
+            if left_terms and right_terms:
+                matches = self.index.near_doc_ids(left_terms[0], right_terms[0], distance, doc_ranges)
+                chunk_ids = matches if chunk_ids is None else np.intersect1d(chunk_ids, matches)
+        
+        if chunk_ids is None:
+            return doc_ranges
+        return id_ranges(chunk_ids)
+    
+    def _proximity_boost(self, query_terms, results):
+        """
+        Raise the scores of results whose query terms occur close together.
+        
+        A result gains up to PROXIMITY_WEIGHT of the gap between its score
+        and 1.0, in proportion to how densely the shortest window holding
+        its query terms is filled and to the share of query terms in it.
+        
+        Args:
+            query_terms: Terms of the query
+            results: List of (chunk_id, score) tuples
+        
+        Returns:
+            The results with boosted scores, best first, ties broken by
+            lower chunk id
+        """
+        distinct_terms = len(set(query_terms))
+        if distinct_terms < 2 or not results:
+            return results
+        
+        spans = self.index.proximity(query_terms, [chunk_id for chunk_id, _ in results])
+        boosted = []
+        for chunk_id, score in results:
+            span = spans.get(chunk_id)
+            if span is not None:
+                matched, width = span
+                density = (matched - 1) / (width - 1)
+                coverage = (matched - 1) / (distinct_terms - 1)
+                score += (1.0 - score) * PROXIMITY_WEIGHT * density * coverage
+            boosted.append((chunk_id, score))
+        boosted.sort(key=lambda item: (-item[1], item[0]))
+        return boosted
+    
+    def _ranked_results(self, query_terms, k, doc_ranges=None):
+        """Return the k best (chunk_id, score) lexical matches of analyzed query terms"""
+        # Multi-term queries rescore a larger pool by proximity; the index
+        # still prunes by the k-th best score, leaving out the documents
+        # the proximity boost could not lift past it
+        if len(set(query_terms)) > 1:
+            pool, headroom = PROXIMITY_CANDIDATES, PROXIMITY_WEIGHT
+        else:
+            pool, headroom = 0, 0.0
+        # Only the postings of the query terms are visited
+        results = self._scoring_index().search(query_terms, k=k, doc_ranges=doc_ranges,
+                                               pool=pool, headroom=headroom)
+        return self._proximity_boost(query_terms, results)[:k]
+    
+    def _lexical_results(self, query, k, doc_ranges=None):
+        """Return the k best (chunk_id, score) lexical matches of a normalized query"""
+        parsed = parse_query(query)
+        doc_ranges = self._constrained_ranges(parsed, doc_ranges)
+        return self._ranked_results(self.analyze(parsed.text), k, doc_ranges)
     
-    def search(self, query, k=5):
+    def _dense_results(self, query, k, nprobe=None, doc_ranges=None):
+        """Return the k best (chunk_id, similarity) embedding matches of a normalized query"""
+        query_vector = self.encoder.encode([query])[0]
+        # A filtered search scores the allowed rows exactly, which is cheaper
+        # than probing clusters that may hold none of them
+        if self.ann_index is not None and doc_ranges is None:
+            return self.ann_index.search(query_vector, k=k, nprobe=nprobe)
+        return self.dense_index.search(query_vector, k=k, doc_ranges=doc_ranges)
+    
+    def search(self, query, k=5, filters=None):
         """
         Search for relevant documents.
         
+        Quoted phrases ("central bank") only match chunks containing the
+        words next to each other and in order, and "permit NEAR/3 bank"
+        only matches chunks where the two words are at most 3 terms apart.
+        Chunks where the query terms occur close together rank higher.
+        
         Args:
             query: Query string
             k: Number of results to return
-            
+            filters: Optional metadata filters, e.g. {"law_name": ...,
+                "has_arabic": True, "page_range": (1, 10),
+                "article_range": (5, 12)}
+        
         Returns:
             List of (Document, score) tuples
         """
-        results = []
+        # Normalize the query once; documents were normalized at ingest
+        query = normalize_text(query)
+        results = self._cached(
+            ("lexical", query, k, freeze_filters(filters)),
+            lambda: self._lexical_results(query, k, self._doc_ranges(filters))
+        )
+        
+        # Return top k results
+        return [(self.chunks.document(chunk_id), score) for chunk_id, score in results]
+    
+    def _fuzzy_results(self, query_terms, k, doc_ranges=None, max_edits=None):
+        """
+        Score chunks by the indexed variants of the query terms.
         
-        # Score each document
-        for content, doc in self.doc_contents.items():
-            score = self.text_similarity(query, content)
-            if score > 0:  # Only include results with some match
-                results.append((doc, score))
+        Every query term is expanded to the index terms within max_edits
+        of it, found through the trigram index. A chunk is credited, per
+        query term, with the BM25 score of its best variant, reduced by
+        FUZZY_EDIT_WEIGHT for every edit.
         
-        # Sort by score (descending)
-        results.sort(key=lambda x: x[1], reverse=True)
+        Args:
+            query_terms: Terms of the query
+            k: Number of results to return
+            doc_ranges: Optional chunk id ranges to restrict the search to
+            max_edits: Largest edit distance of a variant (default: by
+                term length)
         
-        # Return top k results
-        return results[:k]
+        Returns:
+            List of (chunk_id, score) tuples, best first, with scores in
+            the 0-1 range
+        """
+        if self.fuzzy_index is None:
+            self.fuzzy_index = TrigramIndex(self.index.document_frequencies)
+        
+        groups = []
+        for term in sorted(set(query_terms)):
+            edits = auto_max_edits(term) if max_edits is None else max_edits
+            variants = [
+                (variant, distance) for variant, distance in self.fuzzy_index.expand(term, edits)
+                if variant in self.index.document_frequencies
+            ]
+            if variants:
+                groups.append(variants)
+        if not groups:
+            return []
+        
+        # Every variant is scored once, in one walk over the postings
+        variant_terms = sorted({variant for variants in groups for variant, _ in variants})
+        variant_scores = dict(zip(
+            variant_terms, self.index.score_many([[variant] for variant in variant_terms], doc_ranges)
+        ))
+        
+        scores = {}
+        max_score = 0.0
+        for variants in groups:
+            best = {}
+            for variant, distance in variants:
+                weight = FUZZY_EDIT_WEIGHT ** distance
+                for chunk_id, score in variant_scores[variant].items():
+                    score *= weight
+                    if score > best.get(chunk_id, 0.0):
+                        best[chunk_id] = score
+            for chunk_id, score in best.items():
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + score
+            max_score += max(FUZZY_EDIT_WEIGHT ** distance * self.index.idf(variant) for variant, distance in variants)
+        
+        max_score = max_score * (self.index.k1 + 1) or 1.0
+        top = heapq.nlargest(k, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [(chunk_id, score / max_score) for chunk_id, score in top]
     
-    def search_by_law(self, query, law_name, k=5):
+    def fuzzy_search(self, query, k=5, max_edits=None, filters=None):
         """
-        Search for relevant documents within a specific law.
+        Search tolerating misspelled and OCR-damaged words.
+        
+        Query terms also match index terms a few edits away (insertions,
+        deletions, substitutions or swapped neighbours), such as words with
+        broken ligatures in noisy PDF text layers. Exact matches score
+        highest. Candidates are found through a character trigram index
+        over the vocabulary, not by comparing every term. Quoted phrases
+        and NEAR clauses are matched exactly.
         
         Args:
             query: Query string
-            law_name: Name of the law to search within
             k: Number of results to return
-            
+            max_edits: Largest number of edits between a query term and its
+                matches (default: 0 for terms of up to two characters, 1 up
+                to five and 2 beyond)
+            filters: Optional metadata filters, as for search
+        
         Returns:
             List of (Document, score) tuples
         """
-        # Filter documents by law name
-        filtered_docs = [doc for doc in self.documents if doc.metadata.get("law_name") == law_name]
+        query = normalize_text(query)
+        parsed = parse_query(query)
+        results = self._cached(
+            ("fuzzy", query, k, max_edits, freeze_filters(filters)),
+            lambda: self._fuzzy_results(
+                self.analyze(parsed.text), k,
+                self._constrained_ranges(parsed, self._doc_ranges(filters)), max_edits
+            )
+        )
+        return [(self.chunks.document(chunk_id), score) for chunk_id, score in results]
+    
+    def search_many(self, queries, k=5, filters=None, workers=1):
+        """
+        Search for many queries in one pass.
+        
+        Each distinct query is analyzed once, and all queries missing from
+        the result cache are scored together by the index, so shared terms
+        are only read once. Results match calling search per query.
+        
+        Args:
+            queries: List of query strings
+            k: Number of results to return per query
+            filters: Optional metadata filters applied to every query
+            workers: Number of threads to split the queries across; only
+                useful with the sparse engine, whose NumPy and SciPy
+                products release the GIL
+        
+        Returns:
+            List with the (Document, score) results of each query
+        """
+        normalized = [normalize_text(query) for query in queries]
+        frozen = freeze_filters(filters)
+        
+        results = {}
+        missing = []
+        for query in normalized:
+            if query in results:
+                continue
+            cached = self.query_cache.get(("lexical", query, k, frozen))
+            results[query] = cached
+            if cached is None:
+                missing.append(query)
+        
+        if missing:
+            doc_ranges = self._doc_ranges(filters)
+            index = self._scoring_index()
+            
+            # Queries with phrases or NEAR clauses search their own chunk
+            # ranges, so only the plain ones are scored together
+            batched = []
+            for query in missing:
+                parsed = parse_query(query)
+                if parsed.has_constraints:
+                    results[query] = self._lexical_results(query, k, doc_ranges)
+                else:
+                    batched.append((query, self.analyze(parsed.text)))
+            analyzed = [query_terms for _, query_terms in batched]
+            # The whole proximity pool, which holds every candidate
+            # _ranked_results keeps, so the boost ranks the same top k
+            pool_size = max(k, PROXIMITY_CANDIDATES)
+            
+            if workers > 1 and len(analyzed) > 1:
+                # Contiguous batches, one per thread
+                batch_size = -(-len(analyzed) // workers)
+                batches = [analyzed[start:start + batch_size] for start in range(0, len(analyzed), batch_size)]
+                with ThreadPoolExecutor(max_workers=len(batches)) as pool:
+                    futures = [pool.submit(index.search_many, batch, pool_size, doc_ranges) for batch in batches]
+                    batched_results = [result for future in futures for result in future.result()]
+            else:
+                batched_results = index.search_many(analyzed, k=pool_size, doc_ranges=doc_ranges)
+            
+            for (query, query_terms), query_results in zip(batched, batched_results):
+                results[query] = self._proximity_boost(query_terms, query_results)[:k]
+            for query in missing:
+                self.query_cache.put(("lexical", query, k, frozen), results[query])
+        
+        return [
+            [(self.chunks.document(chunk_id), score) for chunk_id, score in results[query]]
+            for query in normalized
+        ]
+    
+    def build_ann_index(self, n_lists=None, nprobe=DEFAULT_NPROBE, pq_subspaces=0):
+        """
+        Build an approximate nearest neighbour (IVF) index over the chunk
+        embeddings. semantic_search uses it from then on.
+        
+        Args:
+            n_lists: Number of k-means clusters (default: about sqrt(chunks))
+            nprobe: Number of clusters searched per query; more is slower
+                with better recall
+            pq_subspaces: Number of product quantization subspaces, 0 to
+                score candidates with the exact vectors only
+        
+        Returns:
+            The IVFIndex, or None if there is nothing to index
+        """
+        if self.dense_index is None or not len(self.dense_index):
+            print("Error building ANN index: no chunk embeddings")
+            return None
+        
+        self.ann_index = IVFIndex.build(
+            self.dense_index, n_lists=n_lists, nprobe=nprobe, pq_subspaces=pq_subspaces
+        )
+        self.query_cache.clear()
+        return self.ann_index
+    
+    def semantic_search(self, query, k=5, nprobe=None, filters=None):
+        """
+        Search for chunks whose embeddings are closest to the query's.
         
-        if not filtered_docs:
+        Args:
+            query: Query string
+            k: Number of results to return
+            nprobe: Number of clusters searched when an ANN index is built
+            filters: Optional metadata filters, as for search
+        
+        Returns:
+            List of (Document, cosine similarity) tuples
+        """
+        if self.dense_index is None:
+            print("Error in semantic search: the vector store has no encoder")
             return []
         
-        # Create temporary search instance with filtered documents
-        temp_search = VectorStore(filtered_docs)
+        query = normalize_text(query)
+        parsed = parse_query(query)
+        results = self._cached(
+            ("dense", query, k, nprobe, freeze_filters(filters)),
+            lambda: self._dense_results(
+                parsed.text, k, nprobe, self._constrained_ranges(parsed, self._doc_ranges(filters))
+            )
+        )
+        
+        return [(self.chunks.document(chunk_id), score) for chunk_id, score in results]
+    
+    def hybrid_search(self, query, k=5, candidates=HYBRID_CANDIDATES, timings=None, filters=None):
+        """
+        Search with the lexical and dense retrievers at the same time and
+        fuse their rankings with reciprocal rank fusion. Exact tokens such
+        as article and decree numbers are found by the lexical side,
+        paraphrases by the dense side. Without an encoder only the lexical
+        ranking is used.
+        
+        Args:
+            query: Query string
+            k: Number of results to return
+            candidates: Number of results taken from each retriever
+            timings: Optional dictionary that receives the seconds spent in
+                each stage ("filter", "lexical", "dense", "fusion", "total")
+                and whether the result came from the cache ("cache_hit")
+            filters: Optional metadata filters, as for search
+        
+        Returns:
+            List of (Document, fused score) tuples, with scores in the 0-1 range
+        """
+        start = time.perf_counter()
+        query = normalize_text(query)
+        key = ("hybrid", query, k, candidates, freeze_filters(filters))
+        fused = self.query_cache.get(key)
+        if fused is not None:
+            if timings is not None:
+                timings.update({"cache_hit": True, "total": time.perf_counter() - start})
+            return [(self.chunks.document(chunk_id), score) for chunk_id, score in fused]
+        
+        fused = self._hybrid_results(query, k, candidates, filters, timings)
+        self.query_cache.put(key, fused)
+        results = [(self.chunks.document(chunk_id), score) for chunk_id, score in fused]
+        
+        if timings is not None:
+            timings.update({"cache_hit": False, "total": time.perf_counter() - start})
+        return results
+    
+    def _hybrid_results(self, query, k, candidates, filters=None, timings=None):
+        """
+        Return the k best fused (chunk_id, score) results of a normalized
+        query, uncached. See hybrid_search.
+        """
+        # Phrases and NEAR clauses restrict both retrievers
+        parsed = parse_query(query)
+        doc_ranges, filter_time = _timed(
+            lambda: self._constrained_ranges(parsed, self._doc_ranges(filters))
+        )
+        
+        lexical_future = self.executor.submit(
+            _timed, self._ranked_results, self.analyze(parsed.text), candidates, doc_ranges
+        )
+        dense_future = None
+        if self.dense_index is not None:
+            dense_future = self.executor.submit(
+                _timed, self._dense_results, parsed.text, candidates, None, doc_ranges
+            )
+        
+        lexical_results, lexical_time = lexical_future.result()
+        result_lists = [lexical_results]
+        dense_time = 0.0
+        if dense_future is not None:
+            dense_results, dense_time = dense_future.result()
+            result_lists.append(dense_results)
+        
+        fused, fusion_time = _timed(reciprocal_rank_fusion, result_lists)
         
-        # Search within the filtered documents
-        return temp_search.search(query, k=k)
+        if timings is not None:
+            timings.update({
+                "filter": filter_time,
+                "lexical": lexical_time,
+                "dense": dense_time,
+                "fusion": fusion_time
+            })
+        return fused[:k]
+    
+    def reranked_search(self, query, k=5, candidates=RERANK_CANDIDATES, timings=None, filters=None):
+        """
+        Hybrid search followed by a second stage that rescores the best
+        candidates with the store's reranker (term proximity, article
+        heading and law title matches, and an optional cross-scorer within
+        a latency budget). Returns fewer, better chunks than hybrid_search:
+        results far below the best one are dropped.
+        
+        Args:
+            query: Query string
+            k: Largest number of results to return
+            candidates: Number of hybrid search results that are reranked
+            timings: Optional dictionary that receives the seconds spent in
+                each stage, as for hybrid_search, plus "rerank"
+            filters: Optional metadata filters, as for search
+        
+        Returns:
+            List of (Document, score) tuples, best first, with scores in
+            the 0-1 range
+        """
+        start = time.perf_counter()
+        query = normalize_text(query)
+        key = ("reranked", query, k, candidates, freeze_filters(filters))
+        reranked = self.query_cache.get(key)
+        if reranked is not None:
+            if timings is not None:
+                timings.update({"cache_hit": True, "total": time.perf_counter() - start})
+            return [(self.chunks.document(chunk_id), score) for chunk_id, score in reranked]
+        
+        fused = self._hybrid_results(query, candidates, candidates, filters, timings)
+        reranked = self.reranker.rerank(self, query, fused, k, timings)
+        self.query_cache.put(key, reranked)
+        results = [(self.chunks.document(chunk_id), score) for chunk_id, score in reranked]
+        
+        if timings is not None:
+            timings.update({"cache_hit": False, "total": time.perf_counter() - start})
+        return results
+    
+    def search_by_law(self, query, law_name, k=5):
+        """
+        Search for relevant documents within a specific law.
+        
+        Args:
+            query: Query string
+            law_name: Name of the law to search within
+            k: Number of results to return
+            
+        Returns:
+            List of (Document, score) tuples
+        """
+        # Only the postings of the law's chunks are scored
+        return self.search(query, k=k, filters={"law_name": law_name})